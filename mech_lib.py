@@ -9,11 +9,52 @@
 import sys
 import os
 import math
-from solid import *
-from solid.utils import *
-from solid import screw_thread
+import struct
+import time
+import types
+import functools
+import subprocess
+import tempfile
 import pickle
-import numpy as np
+import weakref
+import operator
+
+# The geometry layer - SolidPython, numpy and everything built on them,
+# down to the shapes of the stock parts - is in mech_lib_geometry.  It
+# is imported the first time a part generates or is placed, and its
+# names are then bound here too so the part classes below can use them,
+# so calculation and BOM runs import neither library.  Use
+# "from mech_lib_geometry import *" for everything at once.
+
+_geometry = None
+
+
+def _load_geometry():
+    global _geometry
+    if _geometry is None:
+        import mech_lib_geometry
+        g = globals()
+        for k, v in vars(mech_lib_geometry).items():
+            if not k.startswith('__'):
+                g.setdefault(k, v)
+        _geometry = mech_lib_geometry
+    return _geometry
+
+
+class _Geometric(type):
+    # wraps each class's generate() so the geometry layer is loaded
+    # before it runs
+    def __new__(mcs, name, bases, d):
+        gen = d.get('generate', None)
+        if isinstance(gen, types.FunctionType):
+            @functools.wraps(gen)
+            def generate(self, *args, **kwargs):
+                if _geometry is None:
+                    _load_geometry()
+                return gen(self, *args, **kwargs)
+            d['generate'] = generate
+        return type.__new__(mcs, name, bases, d)
+
 
 aluminium_colour = [0.77, 0.77, 0.8]
 steel_colour = [0.7, 0.7, 0.7]#[0.8, 0.8, 0.8]
@@ -22,280 +63,336 @@ copper_colour = [ 0.722, 0.451, 0.20]
 TransparentYellow = (1, 1, 0, 0.3)
 
 
-def radial_extrude(pts, r_min, r_max):
-    src = rotate([0, 0, 90])(
-        rotate([90, 0, 0])(
-            linear_extrude(height=r_max-r_min,
-                           convexity=4)(polygon(pts))
-        )
-    )
-    xmin = min([e[0] for e in pts])
-    xmax = max([e[0] for e in pts])
-    ymin = min([e[1] for e in pts])
-    ymax = max([e[1] for e in pts])
-    x_range = (xmax-xmin)
-    y_range = (ymax-ymin)
-    a_range = x_range / r_min
-    a_step = math.radians(2.0)
-    x_step = x_range * a_step/a_range
-    a_min = xmin/r_min
-    l = []
-    a = a_min
-
-    while a < a_min + a_range + a_step:
-        offset_x = xmin + x_range * (a - a_min) / a_range
-        cut = translate([-1, -x_step/2, ymin-1])(
-            cube([r_max-r_min+2, x_step, y_range+2])
-        )
-        section = rotate([0,0,math.degrees(a)])(
-            translate([r_min, 0,0])(
-                intersection()(
-                    translate([0.0, -offset_x, 0])(src),
-                    cut
-                )
-            )
-        )
-        l.append(section)
-        a += a_step
+# Tracing.  While a tracer is set, calculate, recalculate, generate,
+# make_id, SCAD rendering and OpenSCAD runs are timed per node and
+# get_data lookups are counted.  With none set each hook costs one
+# global lookup.  Anything with begin(), end(cat, node, start) and
+# lookup(node, key) can be set as the tracer.
 
-    if len(l) > 1:
-        l2 = []
-        for i in range(len(l) - 1):
-            l2.append(hull()(l[i], l[i+1]))
-    else:
-        l2 = l    
-    return union()(l2)
+_tracer = None
 
+from timeit import default_timer as _clock
 
-def fit_to_radius(shape, xmin, xmax, ymin, ymax, r_min, z_max,
-                  a_step = math.radians(2.0)):
-    shape = rotate([0, 0, 90])(
-        rotate([90, 0, 0])(
-            shape
-        )
-    )
-    x_range = (xmax-xmin)
-    y_range = (ymax-ymin)
-    a_range = x_range / r_min
-    x_step = x_range * a_step/a_range
-    a_min = xmin/r_min
-    l = []
-    a = a_min
-
-    while a < a_min + a_range + a_step:
-        offset_x = xmin + x_range * (a - a_min) / a_range
-        cut = translate([-1, -x_step/2, ymin-1])(
-            cube([z_max+2, x_step, y_range+2])
-        )
-        section = rotate([0,0,math.degrees(a)])(
-            translate([r_min, 0,0])(
-                intersection()(
-                    translate([0.0, -offset_x, 0])(shape),
-                    cut
-                )
-            )
-        )
-        l.append(section)
-        a += a_step
 
-    if len(l) > 1:
-        l2 = []
-        for i in range(len(l) - 1):
-            l2.append(hull()(l[i], l[i+1]))
-    else:
-        l2 = l    
-    return union()(l2)
-
-
-def chamfer_edge(shape, pt1, pt2, radius, face_vec):
-    #print pt1, pt2
-    direction = np.array([pt2[0] - pt1[0],
-                          pt2[1] - pt1[1],
-                          pt2[2] - pt1[2]])
-    l = np.linalg.norm(direction)
-    if l < 1e-6:
-        print "Warning ignoring request to fillet zero-length edge", pt1, pt2
-        return shape
-    chamfer = translate([-radius,0, 0])(
-        difference()(
-            rotate([0,0,-45])(
-                translate([0,0,-1])(
-                    cube([2*radius, 2*radius, l+2.0]),
-                )
-            )
-        )
-    )
-    #return chamfer
-    #chamfer located at origin, along z axis, with region to be
-    #chamfer in neg X and neg Y.  Remap axes via transformation
-    #matrix
-    direction = direction / np.linalg.norm(direction)
-    face_vec = np.array(face_vec)
-    face_vec = face_vec / np.linalg.norm(face_vec)
-    face_vec2 = np.cross(face_vec, direction)#, face_vec)
-    #print direction, face_vec, face_vec2
-    chamfer = multmatrix(m = [[face_vec[0], face_vec2[0], direction[0], 0.0],
-                              [face_vec[1], face_vec2[1], direction[1], 0.0],
-                              [face_vec[2], face_vec2[2], direction[2], 0.0],
-                              [0.0, 0.0, 0.0, 1.0]])(chamfer)
-    
-    return difference()(
-        shape,
-        translate([pt1[0], pt1[1], pt1[2]])(chamfer)
-    )
-
-def fillet_edge(shape, pt1, pt2, radius, face_vec):
-    #print pt1, pt2
-    direction = np.array([pt2[0] - pt1[0],
-                          pt2[1] - pt1[1],
-                          pt2[2] - pt1[2]])
-    l = np.linalg.norm(direction)
-    if l < 1e-6:
-        print "Warning ignoring request to fillet zero-length edge", pt1, pt2
-        return shape
-    fillet = translate([-radius,-radius, 0])(
-        difference()(
-            translate([0,0,-1])(
-                cube([2*radius, 2*radius, l+2.0]),
-            ),
-            translate([0,0,-2.0])(
-                cylinder(r=radius, h=l+4.0)
-            )
-        )
-    )
-    #fillet located at origin, along z axis, with region to be
-    #filleted in neg X and neg Y.  Remap axes via transformation
-    #matrix
-    direction = direction / np.linalg.norm(direction)
-    face_vec = np.array(face_vec)
-    face_vec = face_vec / np.linalg.norm(face_vec)
-    face_vec2 = np.cross(face_vec, direction)#, face_vec)
-    #print direction, face_vec, face_vec2
-    fillet = multmatrix(m = [[face_vec[0], face_vec2[0], direction[0], 0.0],
-                             [face_vec[1], face_vec2[1], direction[1], 0.0],
-                             [face_vec[2], face_vec2[2], direction[2], 0.0],
-                             [0.0, 0.0, 0.0, 1.0]])(fillet)
-    
-    return difference()(
-        shape,
-        translate([pt1[0], pt1[1], pt1[2]])(fillet)
-    )
-
-
-def vert_rounded_cube(dims, radius):
-    r = cube(dims)
-    r = fillet_edge(r,
-                    [0.0, 0.0, 0.0],
-                    [0.0, 0.0, dims[2]],
-                    radius,
-                    [0.0, -1.0, 0.0])
-    r = fillet_edge(r,
-                    [dims[0], 0.0, 0.0],
-                    [dims[0], 0.0, dims[2]],
-                    radius,
-                    [1.0, 0.0, 0.0])
-    r = fillet_edge(r,
-                    [0.0, dims[1], 0.0],
-                    [0.0, dims[1], dims[2]],
-                    radius,
-                    [-1.0, 0.0, 0.0])
-    r = fillet_edge(r,
-                    [dims[0], dims[1], 0.0],
-                    [dims[0], dims[1], dims[2]],
-                    radius,
-                    [0.0, 1.0, 0.0])
+def set_tracer(tracer):
+    # returns the tracer it replaces
+    global _tracer
+    old = _tracer
+    _tracer = tracer
+    return old
 
-    return r
 
-def rounded_cube(dims, radius):
-    c1 = translate([0,0,radius])(
-        vert_rounded_cube([dims[0], dims[1], dims[2] - 2*radius], radius)
-    )
-    c2 = translate([0,dims[1]-radius,0])(
-        rotate([90, 0, 0])(
-            vert_rounded_cube([dims[0], dims[2], dims[1] - 2*radius], radius)
-        )
-    )
-    c3 = translate([dims[0]-radius,0,0])(
-        rotate([00, -90, 0])(
-            vert_rounded_cube([dims[2], dims[1], dims[0] - 2*radius], radius)
-        )
-    )
-    x1 = radius
-    y1 = radius
-    z1 = radius
-    x2 = dims[0] - radius
-    y2 = dims[1] - radius
-    z2 = dims[2] - radius
-    
-    s = sphere(radius)
-    return union()(
-        c1,
-        c2,
-        c3,
-        [translate([c[0],c[1],c[2]])(s) for c in [
-            [x1, y1, z1],
-            [x1, y1, z2],
-            [x1, y2, z1],
-            [x1, y2, z2],
-            [x2, y1, z1],
-            [x2, y1, z2],
-            [x2, y2, z1],
-            [x2, y2, z2]]]
-        
-    )
+def start_tracing():
+    t = Tracer()
+    set_tracer(t)
+    return t
 
 
-def pipe(r_ext, r_int, l):
-    return difference()(
-        cylinder(r_ext, l),
-        translate([0,0,-0.1])(
-            cylinder(r_int, l+0.2)
-        )
-    )
+def stop_tracing():
+    return set_tracer(None)
 
 
+class Tracer(object):
+    # events are (cat, class, identifier, start, duration, self time)
+
+    def __init__(self):
+        self.events = []
+        self.lookups = {}
+        self._child = []
+        self.start = _clock()
+
+    def begin(self):
+        self._child.append(0.0)
+        return _clock()
+
+    def end(self, cat, node, start):
+        dur = _clock() - start
+        child = self._child.pop()
+        if self._child:
+            self._child[-1] += dur
+        if node is None:
+            cls, ident = None, None
+        else:
+            cls, ident = node.__class__.__name__, node.identifier
+        self.events.append((cat, cls, ident, start, dur, dur - child))
+
+    def lookup(self, node, key):
+        k = (node.__class__.__name__, key)
+        self.lookups[k] = self.lookups.get(k, 0) + 1
+
+    def totals(self, by_node=False):
+        # {(cat, class or identifier): [calls, total, self, max]}
+        r = {}
+        for cat, cls, ident, start, dur, own in self.events:
+            k = (cat, ident if by_node else cls)
+            e = r.get(k, None)
+            if e is None:
+                r[k] = [1, dur, own, dur]
+            else:
+                e[0] += 1
+                e[1] += dur
+                e[2] += own
+                e[3] = max(e[3], dur)
+        return r
+
+    def write_chrome_trace(self, f):
+        # Chrome trace / Perfetto JSON, times in microseconds
+        import json
+        pid = os.getpid()
+        events = []
+        for cat, cls, ident, start, dur, own in self.events:
+            name = cat if cls is None else '%s %s' % (cat, cls)
+            args = {} if cls is None else {'class' : cls, 'node' : ident}
+            events.append({'name' : name, 'cat' : cat, 'ph' : 'X',
+                           'ts' : (start - self.start) * 1e6,
+                           'dur' : dur * 1e6, 'pid' : pid, 'tid' : 0,
+                           'args' : args})
+        lookups = {}
+        for (cls, key), n in self.lookups.items():
+            lookups['%s.%s' % (cls, key)] = n
+        json.dump({'traceEvents' : events, 'displayTimeUnit' : 'ms',
+                   'otherData' : {'get_data' : lookups}}, f)
+
+    def write_summary(self, f, top=20):
+        # times in ms; total includes nested calls, self doesn't
+        f.write('%-12s %-24s %8s %10s %10s %10s\n'
+                % ('what', 'class', 'calls', 'total', 'self', 'max'))
+        for by_node in (False, True):
+            items = sorted(self.totals(by_node).items(),
+                           key=lambda e: -e[1][2])
+            if by_node:
+                f.write('\n%-12s %-24s\n' % ('what', 'node'))
+                items = items[:top]
+            for (cat, k), (n, total, own, most) in items:
+                f.write('%-12s %-24s %8d %10.2f %10.2f %10.2f\n'
+                        % (cat, k, n, total * 1e3, own * 1e3, most * 1e3))
+        if self.lookups:
+            f.write('\n%-36s %8s\n' % ('get_data', 'calls'))
+            for (cls, key), n in sorted(self.lookups.items(),
+                                        key=lambda e: -e[1])[:top]:
+                f.write('%-36s %8d\n' % ('%s.%s' % (cls, key), n))
+
+
+def print_trace_summary(tracer, top=20):
+    tracer.write_summary(sys.stdout, top)
+
+
+# Memory accounting.  Sizes are what sys.getsizeof() reports for each
+# object reachable from a node without going through another node,
+# counting anything shared once.
+
+_no_size = (type, types.ModuleType, types.FunctionType,
+            types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_size(obj, seen=None):
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    numpy = sys.modules.get('numpy')
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (AssemblyBase,) + _no_size):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif numpy is not None and isinstance(o, numpy.ndarray):
+            if o.base is not None:
+                stack.append(o.base)
+        elif hasattr(o, '__dict__'):
+            stack.append(o.__dict__)
+    return total
+
+
+def scad_size(shape, seen=None, stop=()):
+    # (node count, bytes) of a SolidPython tree, leaving out subtrees
+    # whose ids are in stop.  Parent links aren't followed, so a shape
+    # that's part of a bigger tree is measured alone.
+    if seen is None:
+        seen = set()
+    count = 0
+    size = 0
+    stack = [shape]
+    while stack:
+        n = stack.pop()
+        count += 1
+        d = n.__dict__
+        seen.add(id(n))
+        seen.add(id(d))
+        size += sys.getsizeof(n) + sys.getsizeof(d)
+        for k, v in d.items():
+            if k == 'children':
+                seen.add(id(v))
+                size += sys.getsizeof(v)
+                stack.extend([c for c in v if id(c) not in stop])
+            elif k != 'parent':
+                size += deep_size(v, seen)
+    return count, size
+
+
+def _rss():
+    # resident size in bytes, None where /proc isn't there
+    try:
+        f = open('/proc/self/statm')
+        try:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def measure_peak(fn, *args, **kwargs):
+    # (fn's result, {'start', 'peak', 'end'}) with resident size sampled
+    # every 10ms while fn runs
+    import threading
+    samples = [_rss()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.01):
+            samples.append(_rss())
+
+    t = threading.Thread(target=sample)
+    t.daemon = True
+    t.start()
+    try:
+        r = fn(*args, **kwargs)
+    finally:
+        done.set()
+        t.join()
+    samples.append(_rss())
+    if samples[0] is None:
+        # only the process-wide high water mark
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin':
+            peak *= 1024
+        return r, {'start' : None, 'peak' : peak, 'end' : None}
+    return r, {'start' : samples[0], 'peak' : max(samples),
+               'end' : samples[-1]}
+
+
+memory_columns = ['nodes', 'node', 'data', 'children', 'id_dict', 'other',
+                  'geometry_nodes', 'geometry']
+
+# node attributes counted under their own column or not at all
+_memory_own = set(['data', 'children', 'id_dict', 'parent'])
+
+
+def memory_report(root, geometry=False, save_dir=None):
+    # Per class bytes of the node objects, their data, children lists,
+    # id_dicts and everything else they hold, and with geometry the
+    # node count and size of each node's own geometry, listing nodes with
+    # no generate() of their own under 'ungenerated'.  With save_dir the
+    # peak resident size while save_components() writes there.
+    classes = {}
+    seen = set()
+    nodes = list(root.iter_nodes())
+    shapes = {}
+    owner = {}
+    for n in nodes:
+        k = n.__class__.__name__
+        e = classes.get(k, None)
+        if e is None:
+            e = classes[k] = dict([(c, 0) for c in memory_columns])
+        d = n.__dict__
+        e['nodes'] += 1
+        e['node'] += sys.getsizeof(n) + sys.getsizeof(d)
+        seen.add(id(d))
+        e['data'] += deep_size(d.get('data'), seen)
+        e['children'] += deep_size(d.get('children'), seen)
+        e['id_dict'] += deep_size(d.get('id_dict'), seen)
+        e['other'] += sum([deep_size(v, seen) for a, v in d.items()
+                           if a not in _memory_own])
+    ungenerated = []
+    if geometry:
+        # Every node is generated once: an assembly's generate() gets
+        # the shapes its children already made, and each node is
+        # charged for its shapes down to where another node's begin.
+        def memo(n):
+            gen = n.generate
+
+            def generate():
+                if n not in shapes:
+                    try:
+                        shapes[n] = gen()
+                    except NotImplementedError:
+                        shapes[n] = None
+                        raise
+                    owner.setdefault(id(shapes[n]), n)
+                if shapes[n] is None:
+                    raise NotImplementedError, "no generate()"
+                return shapes[n]
+            return generate
+
+        for n in nodes:
+            n.generate = memo(n)
+        try:
+            for n in nodes:
+                try:
+                    n._generate()
+                except NotImplementedError:
+                    pass
+        finally:
+            for n in nodes:
+                n.__dict__.pop('generate', None)
+        for n in nodes:
+            shape = shapes[n]
+            if shape is None:
+                # no generate() of its own
+                ungenerated.append(n.identifier)
+                continue
+            if owner[id(shape)] is not n:
+                continue
+            count, size = scad_size(shape, seen, owner)
+            e = classes[n.__class__.__name__]
+            e['geometry_nodes'] += count
+            e['geometry'] += size
+    total = dict([(c, sum([e[c] for e in classes.values()]))
+                  for c in memory_columns])
+    r = {'classes' : classes, 'total' : total}
+    if geometry:
+        r['ungenerated'] = ungenerated
+    if save_dir is not None:
+        r['save_components'] = measure_peak(root.save_components,
+                                            save_dir)[1]
+    return r
+
+
+def print_memory_report(report):
+    # kB, largest classes first
+    cols = memory_columns
+    print '%-24s' % 'class', ' '.join(['%10s' % c[:10] for c in cols])
+    items = sorted(report['classes'].items(),
+                   key=lambda e: -sum([v for c, v in e[1].items()
+                                       if c not in ('nodes',
+                                                    'geometry_nodes')]))
+    for k, e in items + [('total', report['total'])]:
+        print '%-24s' % k, ' '.join(
+            ['%10d' % e[c] if c in ('nodes', 'geometry_nodes')
+             else '%10.1f' % (e[c] / 1024.0) for c in cols])
+    if report.get('ungenerated'):
+        print 'no geometry from:', ' '.join(report['ungenerated'])
+    peak = report.get('save_components', None)
+    if peak is not None:
+        if peak['start'] is None:
+            print 'save_components: process peak %.1fMB' % (
+                peak['peak'] / 1048576.0)
+        else:
+            print 'save_components: %.1fMB at start, peak %.1fMB, %.1fMB after' \
+                % (peak['start'] / 1048576.0, peak['peak'] / 1048576.0,
+                   peak['end'] / 1048576.0)
 
-def rounded_cylinder(r, l):
-    return translate([0,0,-l/2])(
-        union()(
-            sphere(r),
-            cylinder(r, l),
-            translate([0,0,l])(
-                sphere(r)
-            )
-        )
-    )
-
-def make_routed_slot(pts, tool_dia):
-    import shapely
-    import shapely.geometry
-    l = shapely.geometry.LineString(pts)
-    p = l.buffer(distance=tool_dia/2, resolution=10)
-    #, cap_style=1, join_style=1)
-    pts = [(e[0],e[1]) for e in p.exterior.coords]
-    return pts
-
-
-def make_catch(engage_dist, width, catch_depth, depth,
-               peak_height=None):
-    if peak_height is None:
-        peak_height = min(1.5, catch_depth*2)
-    pts = [
-        [0.0, 0.0],
-        [0.0, engage_dist],
-        [-catch_depth, engage_dist-0.1],
-        [-catch_depth, engage_dist+peak_height/3],
-        [0.0, engage_dist+peak_height],
-        [depth*0.9, engage_dist+peak_height/2],
-        [depth*1.1, 0.0],
-    ]
-    catch = linear_extrude(height=width, convexity=4)(polygon(pts))
-    catch = rotate([90,0,0])(translate([0,0,-width/2])(catch))
-    return catch
-        
 
 class AssemblyBase(object):
+    __metaclass__ = _Geometric
 
     def __init__(self, name, data):
         self.name = name
@@ -306,12 +403,74 @@ class AssemblyBase(object):
         self.calculating = False
         self.identifier = name
         self.id_dict = {}
+        self._bbox = None
+        self._placements = None
+        self._mesh = None
+        self._mass = None
+        self.local_transform = None
+        self._transform_tree = None
+        self.connectors = {}
+        self._mate_solver = None
+        self._children_placed = False
+        self._hash = None
+        self._own_hash = None
+        self._index = None
+        self._reads = set()
+
+    def __getattr__(self, attr):
+        # Nodes loaded lazily from an archive fill themselves in the
+        # first time data or a calculated attribute is asked for.  Fork
+        # nodes read through to their source until they're changed.
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        d = self.__dict__
+        src = d.get('_fork_src')
+        if src is not None:
+            if attr == 'children':
+                return d['_forks'].children(self)
+            if attr in _fork_local:
+                return None
+            if attr in _fork_cached:
+                return d['_fork_caches'][_fork_cached[attr]]
+            return d['_forks'].view(self, attr, getattr(src, attr))
+        loader = d.pop('_loader', None)
+        if loader is None:
+            raise AttributeError(attr)
+        loader(self)
+        return getattr(self, attr)
+
+    def _writable(self):
+        # Call before changing this node.  A fork node takes its own copy
+        # of its source, and forks of this node keep what they've seen.
+        d = self.__dict__
+        if '_fork_src' in d:
+            d['_forks'].own(self)
+        # forks which haven't reached this node yet must still find it
+        # as it was
+        n = self
+        while n is not None:
+            forked = n.__dict__.get('_forked')
+            if forked:
+                forked[:] = [f for f in forked if f() is not None]
+                for f in forked:
+                    s = f().node(self)
+                    if s.__dict__.get('_fork_src') is self:
+                        s._writable()
+            n = n.parent
 
     def add_child(self, child):
-        self.children.append(child)        
+        self._writable()
+        self.children.append(child)
         child.set_parent(self)
+        child._index = None
+        self._placements = None
+        self._children_placed = False
+        self._drop_caches(self, restructured=True)
         if self.calculating:
             child.calculate()
+        top = self.get_top()
+        if top._index is not None:
+            top._index.add_tree(child)
                             
     def add_children(self, *args):
         for a in args:
@@ -340,6 +499,10 @@ class AssemblyBase(object):
             return self.parent.get_top()
 
     def get_data(self, key, default=None):
+        if _tracer is not None:
+            _tracer.lookup(self, key)
+        if _data_reads is not None:
+            _data_reads.add(key)
         data_depth = self.get_data_depth(key)
         if len(data_depth) > 0:            
             data_depth.sort(key=lambda e: e[1])
@@ -382,6 +545,15 @@ class AssemblyBase(object):
             return False
     
     def recalculate(self, show_errors=False):
+        t = _tracer
+        s = t.begin() if t is not None else None
+        try:
+            return self._recalculate(show_errors)
+        finally:
+            if t is not None:
+                t.end('recalculate', self, s)
+
+    def _recalculate(self, show_errors):
         done = True
         for c in self.children:
             r = c.recalculate(show_errors=show_errors)
@@ -399,9 +571,18 @@ class AssemblyBase(object):
     def check_calculate(self):
         if self.calculated:
             return True
+        self._writable()
         self.calculating = True
-        r = self.calculate()
+        t = _tracer
+        s = t.begin() if t is not None else None
+        try:
+            r = self._recorded(self.calculate)
+        finally:
+            if t is not None:
+                t.end('calculate', self, s)
         self.calculating = False
+        self._drop_hash()
+        self._update_index()
         if r:
             self.calculated = r
         return r
@@ -412,14 +593,380 @@ class AssemblyBase(object):
     def generate(self):
         raise NotImplementedError, "Should be overridden"
 
+    def _generate(self):
+        # generate(), traced
+        t = _tracer
+        s = t.begin() if t is not None else None
+        try:
+            return self.generate()
+        finally:
+            if t is not None:
+                t.end('generate', self, s)
+
+    def _recorded(self, fn):
+        # fn(), adding the data keys it looks up to self._reads
+        global _data_reads
+        outer = _data_reads
+        _data_reads = set()
+        try:
+            return fn()
+        finally:
+            self._reads = self._reads | _data_reads
+            _data_reads = outer
+
+    def invalidate(self):
+        # Drop cached geometry-derived results here and in every
+        # ancestor, and re-place this node, its siblings and everything
+        # below, as place_children() and generate() may read the change.
+        # Call after changing data outside calculate().
+        self._placements = None
+        self._children_placed = False
+        self._drop_hash()
+        self._update_index()
+        self._drop_caches(self)
+        p = self.parent
+        if p is not None:
+            p._placements = None
+            p._children_placed = False
+            p._drop_caches(p)
+        # anything below may have inherited the change; nodes not yet
+        # loaded have nothing cached
+        stack = list(self.__dict__.get('children', []))
+        while stack:
+            n = stack.pop()
+            n._bbox = None
+            n._mesh = None
+            n._mass = None
+            n._placements = None
+            n._children_placed = False
+            tree = n.__dict__.get('_transform_tree')
+            if tree is not None:
+                tree.mark_dirty(n)
+            stack.extend(n.__dict__.get('children', []))
+
+    def _drop_caches(self, moved, restructured=False):
+        # Clear geometry caches from here to the top and tell transform
+        # trees on the way that moved's subtree needs placing again.
+        n = self
+        while n is not None:
+            n._bbox = None
+            n._mesh = None
+            n._mass = None
+            n._hash = None
+            if n._transform_tree is not None:
+                if restructured:
+                    n._transform_tree.stale = True
+                else:
+                    n._transform_tree.mark_dirty(moved)
+            n = n.parent
+
+    def _drop_hash(self):
+        # A node's hash is only ever valid if those below it are, so
+        # the walk up can stop at the first node without one.
+        self._own_hash = None
+        n = self
+        while n is not None and n._hash is not None:
+            n._hash = None
+            n = n.parent
+
+    def fork(self):
+        # A variant of this subtree for trying changes on, copied on
+        # write.  Fork nodes are made as the tree is walked and read
+        # their data and calculated attributes straight from the
+        # original; a node copies its own only when it's changed, by
+        # set_data(), add_child(), calculation or assigning an attribute.
+        # Changing the original the same ways first gives its forks the
+        # copy they'd have had.  Containers read from either side are
+        # shared until then, so change them through set_data() rather
+        # than in place.
+        forks = _Forks()
+        self.__dict__.setdefault('_forked', []).append(weakref.ref(forks))
+        return forks.shell(self, None)
+
+    def get_index(self):
+        top = self.get_top()
+        if top._index is None:
+            top._index = NodeIndex(top)
+        return top._index
+
+    def reindex(self):
+        self.get_top()._index = None
+
+    def _update_index(self):
+        top = self.get_top()
+        if top._index is not None:
+            top._index.add(self)
+
+    def query(self, cls=None, **data):
+        # Nodes at or under this one which are instances of cls (a class
+        # or class name) and for which get_data(key) finds each
+        # key=value, so inherited values such as colour match too, in
+        # iter_nodes() order.  Numbers match whatever their type, so 3
+        # finds 3.0.  A callable value is used as a predicate on the
+        # value found; nodes get_data() finds nothing for never match.
+        return self.get_index().query(self, cls, data)
+
+    def set_data(self, key, value):
+        self._writable()
+        self.data[key] = value
+        self.invalidate()
+
+    def own_hash(self):
+        # class, data and explicit placement of this node alone
+        if self._own_hash is None:
+            import hashlib
+            self._own_hash = hashlib.sha1(
+                '%s\0%s\0%s' % (self.__class__.__name__,
+                                data_digest(self.data),
+                                data_digest(self.placement()))).hexdigest()
+        return self._own_hash
+
+    def placement(self):
+        # what own_hash() and diff() take from where this node was put
+        return {'local_transform' : self.local_transform,
+                'connectors' : self.connectors}
+
+    def content_hash(self):
+        # Merkle hash of this node's class, data and children, cached
+        # until something below changes
+        if self._hash is None:
+            import hashlib
+            order = []
+            stack = [self]
+            while stack:
+                n = stack.pop()
+                # placing n's children may drop their hashes
+                n.ensure_placed()
+                order.append(n)
+                stack.extend([c for c in n.children if c._hash is None])
+            for n in reversed(order):
+                h = hashlib.sha1(n.own_hash())
+                for c in n.children:
+                    h.update(c._hash)
+                n._hash = h.hexdigest()
+        return self._hash
+
+    def iter_nodes(self):
+        stack = [self]
+        while stack:
+            n = stack.pop()
+            yield n
+            stack.extend(reversed(n.children))
+
+    def get_bbox(self):
+        # bounds of generate() in this node's own frame, from its mesh
+        # where shape_bbox() can't work them out
+        _load_geometry()
+        if self._bbox is None:
+            try:
+                b = shape_bbox(self._generate())
+            except NotImplementedError, e:
+                try:
+                    mesh = self.get_mesh()
+                except NotMeshable, e2:
+                    raise NotImplementedError, "%s: %s, %s" % (
+                        self.identifier, e, e2)
+                b = _points_bbox(mesh.vertices) if len(mesh.faces) else None
+            self._bbox = (b,)
+        return self._bbox[0]
+
+    def locate_children(self):
+        # Local placement of each child, found by generating this node
+        # and looking for where each child's own geometry ended up.
+        # Children that can't be found are taken to be modelled in this
+        # node's frame.
+        _load_geometry()
+        self.ensure_placed()
+        if self._placements is not None:
+            return self._placements
+        explicit = dict([(c, c.local_transform) for c in self.children
+                         if c.local_transform is not None])
+        if len(explicit) == len(self.children):
+            self._placements = explicit
+            return explicit
+        shapes = {}
+
+        def recorder(child):
+            gen = child.generate
+
+            def generate():
+                s = gen()
+                shapes[id(s)] = child
+                return s
+            return generate
+
+        for c in self.children:
+            c.generate = recorder(c)
+        try:
+            try:
+                shape = self._generate()
+            except NotImplementedError:
+                shape = None
+        finally:
+            for c in self.children:
+                del c.generate
+        found = {}
+        if shape is not None:
+            _find_placed(shape, np.identity(4), shapes, found)
+        found.update(explicit)
+        self._placements = dict([(c, found.get(c, np.identity(4)))
+                                 for c in self.children])
+        return self._placements
+
+    def set_transform(self, m):
+        # Place this node in its parent's frame explicitly, rather than
+        # leaving it to be found from the parent's generate().
+        _load_geometry()
+        self._writable()
+        self.local_transform = np.array(m, dtype=float)
+        self._drop_hash()
+        if self.parent is not None:
+            self.parent._placements = None
+            self.parent._drop_caches(self)
+
+    def place_children(self):
+        # Set explicit child transforms here rather than in calculate(),
+        # so that calculation alone never needs numpy.
+        pass
+
+    def ensure_placed(self):
+        if not self._children_placed:
+            _load_geometry()
+            self._children_placed = True
+            self.place_children()
+
+    def get_local_transform(self):
+        _load_geometry()
+        if self.parent is not None:
+            self.parent.ensure_placed()
+        if self.local_transform is not None:
+            return self.local_transform
+        if self.parent is None:
+            return np.identity(4)
+        return self.parent.locate_children()[self]
+
+    def generate_placed(self):
+        # generate() moved by this node's explicit local_transform
+        _load_geometry()
+        if self.parent is not None:
+            self.parent.ensure_placed()
+        m = self.local_transform
+        if m is None or np.array_equal(m, np.identity(4)):
+            return self._generate()
+        return multmatrix(m=m.tolist())(self._generate())
+
+    def get_transform_tree(self):
+        _load_geometry()
+        if self._transform_tree is None:
+            self._transform_tree = TransformTree(self)
+        return self._transform_tree
+
+    def get_world_matrix(self):
+        return self.get_top().get_transform_tree().world_of(self)
+
+    def get_world_bbox(self):
+        _load_geometry()
+        return transform_bbox(self.get_bbox(), self.get_world_matrix())
+
+    def get_mesh(self, fallback=True):
+        # tessellation of generate() in this node's own frame
+        _load_geometry()
+        if self._mesh is None:
+            self._mesh = shape_mesh(self._generate(), fallback)
+        return self._mesh
+
+    def get_density(self):
+        # explicit density or material, else None to go by colour
+        _load_geometry()
+        d = self.get_data('density')
+        if d is not None:
+            return d
+        material = self.get_data('material')
+        if material is not None:
+            return material_densities[material]
+        return None
+
+    def mass_key(self):
+        # keyed on the values this part resolved, wherever in the tree
+        # they came from, not just its own data
+        reads = sorted(self._reads)
+        return (self.__class__.__module__, self.__class__.__name__,
+                data_digest(self.data),
+                data_digest([(k, self.get_data(k)) for k in reads]),
+                self.get_density(), _normalise(self.get_data('colour')))
+
+    def get_mass_properties(self):
+        # Leaf parts are computed from their geometry and cached by
+        # content, assemblies are the sum of their placed children.
+        # Both are kept on the node until invalidate().
+        _load_geometry()
+        if self._mass is not None:
+            return self._mass
+        if len(self.children) == 0:
+            shape = self._recorded(self._generate)
+            key = self.mass_key()
+            r = _mass_cache.get(key, None)
+            if r is None:
+                r = shape_mass(shape, self.get_density())
+                _mass_cache[key] = r
+        else:
+            placements = self.locate_children()
+            r = MassProperties()
+            for c in self.children:
+                r = r + c.get_mass_properties().transformed(placements[c])
+        self._mass = r
+        return r
+
+    def make_connectors(self):
+        # Named frames on this part, in its own frame, for mating.
+        # Override to provide them from calculated data.
+        return {}
+
+    def add_connector(self, name, origin, axis=(0, 0, 1), xdir=None):
+        _load_geometry()
+        self._writable()
+        self.connectors[name] = connector_frame(origin, axis, xdir)
+        self._drop_hash()
+
+    def get_connectors(self):
+        _load_geometry()
+        r = self.make_connectors()
+        r.update(self.connectors)
+        return r
+
+    def get_mate_solver(self):
+        _load_geometry()
+        if self._mate_solver is None:
+            self._mate_solver = MateSolver(self)
+        return self._mate_solver
+
+    def add_mate(self, kind, a, a_conn, b, b_conn, offset=0.0, angle=0.0):
+        _load_geometry()
+        return self.get_mate_solver().add(
+            Mate(kind, a, a_conn, b, b_conn, offset, angle))
+
+    def solve_mates(self):
+        return self.get_mate_solver().solve()
+
+    def get_bvh(self):
+        _load_geometry()
+        return BVH.from_assembly(self)
+
+    def check_interference(self, **kwargs):
+        _load_geometry()
+        return interference(self, **kwargs)
+
     def make_id(self):
         basename = self.identifier
-        id_dict = self.get_top().id_dict
+        top = self.get_top()
         t = basename
-        d = id_dict.get(t, None)
-        if d is self:
+        d = top.id_dict.get(t, None)
+        if _same_node(d, self):
             return None
-        elif d is None:
+        top._writable()
+        self._writable()
+        id_dict = top.id_dict
+        if d is None:
             id_dict[t] = self
             self.identifier = t
             print '%s:Allocating new id %s to %s' % (
@@ -430,7 +977,7 @@ class AssemblyBase(object):
             while True:
                 t = basename + '_' + str(i)
                 d = id_dict.get(t, None)
-                if d is self or d is None:
+                if d is None or _same_node(d, self):
                     break
                 
                 i += 1
@@ -441,7 +988,13 @@ class AssemblyBase(object):
             self.identifier = t
         
     def gen_unique_ids(self):
-        self.make_id()
+        t = _tracer
+        s = t.begin() if t is not None else None
+        try:
+            self.make_id()
+        finally:
+            if t is not None:
+                t.end('make_id', self, s)
         for c in self.children:
             c.gen_unique_ids()
     
@@ -459,6 +1012,38 @@ class AssemblyBase(object):
         for c in self.children:
             c.do_make_bom(l)
 
+    def bom_quantity(self):
+        # how many physical items this node stands for
+        return 1
+
+    def bom_data(self):
+        # the data that makes two of these the same BOM item
+        return self.data
+
+    def make_grouped_bom(self):
+        return BOM(self)
+
+    def stock_length(self):
+        # length cut from linear stock, None if this isn't
+        return None
+
+    def stock_data(self):
+        # the data that makes two of these cut from the same stock
+        d = dict(self.bom_data())
+        d.pop('length', None)
+        return d
+
+    def make_cut_list(self, stock, kerf=3.0):
+        return cut_list(self, stock, kerf)
+
+    def memory_report(self, geometry=False, save_dir=None):
+        return memory_report(self, geometry, save_dir)
+
+    def profile_2d(self):
+        # flat parts return their profile for write_profile(), in the
+        # part's own frame; anything else None
+        return None
+
 
     def save_data(self, output_dir):
         self.get_top().gen_unique_ids()
@@ -469,23 +1054,68 @@ class AssemblyBase(object):
         pickle.dump(self.data, open(ofn, 'w'))
         for c in self.children:
             c.do_save(output_dir)
+
+    def save_archive(self, filename, compress=True):
+        self.get_top().gen_unique_ids()
+        write_archive(self.get_top(), filename, compress)
         
     def save_components(self, output_dir):
         self.get_top().gen_unique_ids()
         self.get_top().do_save_components(output_dir)
 
     def do_save_components(self, output_dir):
+        _load_geometry()
         ofn = os.path.join(output_dir, '%s.scad' %  (self.identifier))
         pickle.dump(self.data, open(ofn, 'w'))
-        scad_render_to_file(self.generate(),
-                            filepath=ofn,
-                            include_orig_code=False,#True,
-                            #file_header='$fa = %s; $fn = %s;' % (40, 40)
-                            file_header='$fs = 0.01;'
-        )
+        shape = self._generate()
+        t = _tracer
+        s = t.begin() if t is not None else None
+        try:
+            scad_render_to_file(shape,
+                                filepath=ofn,
+                                include_orig_code=False,#True,
+                                #file_header='$fa = %s; $fn = %s;' % (40, 40)
+                                file_header='$fs = 0.01;'
+            )
+        finally:
+            if t is not None:
+                t.end('scad_render', self, s)
         for c in self.children:
             c.do_save_components(output_dir)
-        
+
+    def save_stl_components(self, output_dir, fallback=True):
+        self.get_top().gen_unique_ids()
+        self.get_top().do_save_stl_components(output_dir, fallback)
+
+    def do_save_stl_components(self, output_dir, fallback=True):
+        _load_geometry()
+        ofn = os.path.join(output_dir, '%s.stl' %  (self.identifier))
+        export_stl(self._generate(), ofn, fallback=fallback)
+        for c in self.children:
+            c.do_save_stl_components(output_dir, fallback)
+
+    def save_profiles(self, output_dir, format='dxf'):
+        # one file per flat part, returns the filenames written
+        _load_geometry()
+        self.get_top().gen_unique_ids()
+        written = []
+        stack = [self.get_top()]
+        while stack:
+            n = stack.pop()
+            n.check_calculate()
+            profile = n.profile_2d()
+            if profile is not None:
+                ofn = os.path.join(output_dir, '%s.%s' % (n.identifier,
+                                                          format))
+                f = open(ofn, 'w')
+                try:
+                    write_profile(profile, f, format)
+                finally:
+                    f.close()
+                written.append(ofn)
+            stack.extend(reversed(n.children))
+        return written
+
 def print_bom(bom):
     for d in bom:
         if not d['assembly']:
@@ -494,47 +1124,1258 @@ def print_bom(bom):
     for d in bom:
         if d['assembly']:
             print d['identifier'], d['name'], d['data']
-        
-def mirror_points_x(pts, x_val):
-    r = []
-    for x,y in pts:
-        x = 2 * x_val - x
-        r.append((x,y))
-    r.reverse()
+
+
+def _json_default(o):
+    numpy = sys.modules.get('numpy')
+    if numpy is not None:
+        if isinstance(o, numpy.ndarray):
+            return o.tolist()
+        if isinstance(o, numpy.generic):
+            return o.item()
+    if isinstance(o, AssemblyBase):
+        return o.identifier
+    raise TypeError(repr(o))
+
+
+class BOM(object):
+    # Bill of materials in quantity lines.  Nodes are streamed from the
+    # tree and identical items - same class and same data - share a
+    # line.  Each distinct sub-assembly also records its direct
+    # contents, for nested roll-ups.
+
+    def __init__(self, root):
+        self.root = root
+        self.lines = {}
+        self.order = []
+        self.contents = {}
+        self._add_tree(root)
+
+    def node_key(self, node):
+        return (node.__class__.__name__, data_digest(node.bom_data()))
+
+    def _add_tree(self, root):
+        stack = [(root, self.node_key(root))]
+        while stack:
+            n, k = stack.pop()
+            line = self.lines.get(k, None)
+            first = line is None
+            if first:
+                line = {'ref': '%s-%s' % (k[0], k[1][:8]),
+                        'class': k[0],
+                        'name': n.name,
+                        'data': n.bom_data(),
+                        'quantity': 0,
+                        'assembly': len(n.children) > 0}
+                self.lines[k] = line
+                self.order.append(k)
+            line['quantity'] += n.bom_quantity()
+            keys = [self.node_key(c) for c in n.children]
+            if first and keys:
+                contents = []
+                index = {}
+                for c, ck in zip(n.children, keys):
+                    if ck not in index:
+                        index[ck] = len(contents)
+                        contents.append([ck, 0])
+                    contents[index[ck]][1] += c.bom_quantity()
+                self.contents[k] = contents
+            stack.extend(reversed(zip(n.children, keys)))
+
+    def iter_lines(self, assemblies=None):
+        for k in self.order:
+            line = self.lines[k]
+            if assemblies is None or line['assembly'] == assemblies:
+                yield line
+
+    def iter_nested(self):
+        # (assembly line, quantity, line) for each sub-assembly's contents
+        for k in self.order:
+            if k in self.contents:
+                for ck, q in self.contents[k]:
+                    yield self.lines[k], q, self.lines[ck]
+
+    def write_csv(self, f, nested=False):
+        import csv
+        import json
+        w = csv.writer(f)
+        if nested:
+            w.writerow(['assembly', 'quantity', 'ref', 'name'])
+            for a, q, line in self.iter_nested():
+                w.writerow([a['ref'], q, line['ref'], line['name']])
+        else:
+            w.writerow(['ref', 'quantity', 'class', 'name', 'assembly',
+                        'data'])
+            for line in self.iter_lines():
+                w.writerow([line['ref'], line['quantity'], line['class'],
+                            line['name'], int(line['assembly']),
+                            json.dumps(line['data'], sort_keys=True,
+                                       default=_json_default)])
+
+    def write_json(self, f):
+        import json
+        f.write('{"lines": [')
+        for i, line in enumerate(self.iter_lines()):
+            if i:
+                f.write(',')
+            f.write('\n')
+            d = dict(line)
+            json.dump(d, f, sort_keys=True, default=_json_default)
+        f.write('\n], "contents": [')
+        for i, (a, q, line) in enumerate(self.iter_nested()):
+            if i:
+                f.write(',')
+            f.write('\n')
+            json.dump({'assembly': a['ref'], 'quantity': q,
+                       'ref': line['ref']}, f, sort_keys=True)
+        f.write('\n]}\n')
+
+
+def print_grouped_bom(bom):
+    for line in bom.iter_lines(assemblies=False):
+        print line['quantity'], line['name'], line['data']
+    print ''
+    for line in bom.iter_lines(assemblies=True):
+        print line['quantity'], line['name'], line['data']
+
+
+# Cut lists.  Parts cut to length from linear stock (stock_length() not
+# None) are grouped by class and stock_data(), and each group is packed
+# onto bars of the available stock lengths: first fit decreasing, then
+# emptying the emptiest bars into the others where everything fits,
+# then cutting each bar from the shortest stock that will do.  Every
+# piece costs its length plus one kerf.
+
+def stock_cuts(root):
+    # {(class, digest of stock data): {'class', 'data', 'cuts'}}, cuts
+    # as (length, identifier)
+    r = {}
+    stack = [root]
+    while stack:
+        n = stack.pop()
+        length = n.stock_length()
+        if length is not None:
+            data = n.stock_data()
+            k = (n.__class__.__name__, data_digest(data))
+            if k not in r:
+                r[k] = {'class' : k[0], 'data' : data, 'cuts' : []}
+            r[k]['cuts'].append((float(length), n.identifier))
+        stack.extend(reversed(n.children))
     return r
 
-def shift_points(pts, s):
+
+def _stock_counts(stock):
+    # {length: count available, None for any number}
+    if isinstance(stock, dict):
+        return dict([(float(l), c) for l, c in stock.items()])
+    return dict([(float(l), None) for l in stock])
+
+
+def _take_stock(counts, need):
+    # longest bar in stock that will hold need
+    for l in sorted(counts, reverse=True):
+        if l + 1e-9 >= need and counts[l] != 0:
+            if counts[l] is not None:
+                counts[l] -= 1
+            return l
+    raise ValueError, "No stock left for a %g cut" % need
+
+
+def cut_plan(cuts, stock, kerf=3.0):
+    # cuts are (length, label); stock a list of lengths, or a dict of
+    # length to number of bars available
+    import numpy as np
+    counts = _stock_counts(stock)
+    order = sorted(cuts, key=lambda c: -c[0])
+    bars = []
+    free = np.zeros(len(order))
+    for cut in order:
+        need = cut[0] + kerf
+        fits = np.nonzero(free[:len(bars)] + 1e-9 >= need)[0]
+        if len(fits):
+            i = fits[0]
+        else:
+            i = len(bars)
+            l = _take_stock(counts, need)
+            bars.append({'stock' : l, 'cuts' : []})
+            free[i] = l
+        bars[i]['cuts'].append(cut)
+        free[i] -= need
+    free = free[:len(bars)]
+
+    # empty the emptiest bars into the others, best fit
+    for i in np.argsort(-free):
+        trial = free.copy()
+        trial[i] = -1.0
+        moves = []
+        for cut in bars[i]['cuts']:
+            need = cut[0] + kerf
+            fits = np.nonzero(trial + 1e-9 >= need)[0]
+            if len(fits) == 0:
+                break
+            j = fits[np.argmin(trial[fits])]
+            trial[j] -= need
+            moves.append((j, cut))
+        else:
+            for j, cut in moves:
+                bars[j]['cuts'].append(cut)
+            free = trial
+            if counts[bars[i]['stock']] is not None:
+                counts[bars[i]['stock']] += 1
+            bars[i]['cuts'] = []
+    bars = [b for b in bars if b['cuts']]
+
+    # shortest stock for each bar
+    for b in bars:
+        used = sum([c[0] + kerf for c in b['cuts']])
+        if counts[b['stock']] is not None:
+            counts[b['stock']] += 1
+        b['stock'] = min([l for l, c in counts.items()
+                          if l + 1e-9 >= used and c != 0])
+        if counts[b['stock']] is not None:
+            counts[b['stock']] -= 1
+        b['cuts'].sort(key=lambda c: -c[0])
+        b['offcut'] = b['stock'] - used
+
+    cut_length = sum([c[0] for c in cuts])
+    stock_length = sum([b['stock'] for b in bars])
+    used = {}
+    for b in bars:
+        used[b['stock']] = used.get(b['stock'], 0) + 1
+    return {
+        'bars' : sorted(bars, key=lambda b: -b['stock']),
+        'stock' : used,
+        'cut_length' : cut_length,
+        'stock_length' : stock_length,
+        'waste' : stock_length - cut_length,
+        'efficiency' : cut_length / stock_length if bars else 1.0,
+    }
+
+
+def cut_list(root, stock, kerf=3.0):
+    # a cut plan per stock item under root.  stock is the lengths
+    # available, as for cut_plan(), or a dict of class name to them.
+    by_class = isinstance(stock, dict) and [k for k in stock
+                                            if isinstance(k, str)]
     r = []
-    for x,y in pts:
-        x += s[0]
-        y += s[1]
-        r.append([x, y])
+    for k, item in sorted(stock_cuts(root).items()):
+        s = stock
+        if by_class:
+            if item['class'] not in stock:
+                raise ValueError, "No stock given for %s" % item['class']
+            s = stock[item['class']]
+        r.append(dict(item, plan=cut_plan(item['cuts'], s, kerf)))
     return r
 
-def rotate_points(pts, angle):
-    ca = math.cos(angle)
-    sa = math.sin(angle)
-    r = []
-    for x,y in pts:
-        nx = x * ca - y * sa
-        ny = x * sa + y * ca
-        r.append([nx, ny])
+
+def print_cut_list(cut_list):
+    for item in cut_list:
+        plan = item['plan']
+        print item['class'], item['data']
+        for b in plan['bars']:
+            print '  %g:' % b['stock'], ' '.join(['%g' % c[0]
+                                                  for c in b['cuts']]),
+            print '(offcut %g)' % b['offcut']
+        print '  %d bars, %.1f%% used' % (len(plan['bars']),
+                                         100.0 * plan['efficiency'])
+
+
+# Assembly archives.  One file holds every node of a tree:
+#
+#   header   magic, flags, offset and length of the index
+#   payloads one pickled record per node, optionally zlib compressed
+#   index    pickled list, in depth-first order, of
+#            (identifier, module, class, name, parent position,
+#             payload offset, payload length, own hash, content hash)
+#
+# A node's record is its data plus its other instance attributes, with
+# references to other nodes stored by identifier, so any one node can
+# be read back without touching the rest.
+
+archive_magic = 'MECHARC\x01'
+_archive_header = struct.Struct('<8sIQQ')
+ARCHIVE_COMPRESSED = 1
+
+# instance attributes which are rebuilt rather than stored
+_archive_skip = set(['name', 'data', 'parent', 'children', 'identifier',
+                     'id_dict', 'calculated', 'calculating', '_bbox',
+                     '_placements', '_mesh', '_mass', '_transform_tree',
+                     '_mate_solver', '_children_placed', '_loader',
+                     '_hash', '_own_hash', '_fork_src', '_forks',
+                     '_fork_caches', '_forked', '_fork_origin',
+                     '_index'])
+
+
+def _archive_record(node, compress):
+    import cPickle
+    import cStringIO
+    data = node.data
+    attrs = dict([(k, v) for k, v in _node_attrs(node).items()
+                  if k not in _archive_skip])
+    buf = cStringIO.StringIO()
+    p = cPickle.Pickler(buf, 2)
+    p.persistent_id = lambda o: (o.identifier
+                                 if isinstance(o, AssemblyBase) else None)
+    p.dump((data, attrs))
+    s = buf.getvalue()
+    if compress:
+        import zlib
+        s = zlib.compress(s)
+    return s
+
+
+def write_archive(root, filename, compress=True):
+    flags = ARCHIVE_COMPRESSED if compress else 0
+    index = []
+    pos = {}
+    f = open(filename, 'wb')
+    try:
+        f.write(_archive_header.pack(archive_magic, flags, 0, 0))
+        offset = _archive_header.size
+        root.content_hash()
+        for n in root.iter_nodes():
+            s = _archive_record(n, compress)
+            f.write(s)
+            pos[n] = len(index)
+            cls = n.__class__
+            index.append((n.identifier, cls.__module__, cls.__name__, n.name,
+                          pos.get(n.parent, -1), offset, len(s),
+                          n.own_hash(), n._hash))
+            offset += len(s)
+        import cPickle
+        s = cPickle.dumps(index, 2)
+        f.write(s)
+        f.seek(0)
+        f.write(_archive_header.pack(archive_magic, flags, offset, len(s)))
+    finally:
+        f.close()
+
+
+class ArchiveReader(object):
+    # Random access to an archive's index and node records.  buf, if
+    # given, is the whole file already in memory.
+
+    def __init__(self, filename, buf=None):
+        self.filename = filename
+        self.buf = buf
+        self.f = None
+        head = self._read(0, _archive_header.size)
+        magic, self.flags, offset, length = _archive_header.unpack(head)
+        if magic != archive_magic:
+            raise IOError, "%s is not an assembly archive" % filename
+        import cPickle
+        self.index = cPickle.loads(self._read(offset, length))
+        self.position = dict([(e[0], i) for i, e in enumerate(self.index)])
+        self.children = [[] for e in self.index]
+        for i, e in enumerate(self.index):
+            if e[4] >= 0:
+                self.children[e[4]].append(i)
+
+    def _read(self, offset, length):
+        if self.buf is not None:
+            return self.buf[offset:offset + length]
+        if self.f is None:
+            self.f = open(self.filename, 'rb')
+        self.f.seek(offset)
+        return self.f.read(length)
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def ids(self):
+        return [e[0] for e in self.index]
+
+    def node_info(self, identifier):
+        i = self.position[identifier]
+        e = self.index[i]
+        return {'identifier': e[0],
+                'module': e[1],
+                'class': e[2],
+                'name': e[3],
+                'parent': self.index[e[4]][0] if e[4] >= 0 else None,
+                'children': [self.index[c][0] for c in self.children[i]]}
+
+    def read_record(self, identifier, resolve=None):
+        # (data, attrs) for one node.  Node references are passed to
+        # resolve, or left as identifiers.
+        import cPickle
+        import cStringIO
+        e = self.index[self.position[identifier]]
+        s = self._read(e[5], e[6])
+        if self.flags & ARCHIVE_COMPRESSED:
+            import zlib
+            s = zlib.decompress(s)
+        u = cPickle.Unpickler(cStringIO.StringIO(s))
+        u.persistent_load = resolve or (lambda ident: ident)
+        return u.load()
+
+    def read_data(self, identifier):
+        return self.read_record(identifier)[0]
+
+    def node_class(self, i):
+        import importlib
+        e = self.index[i]
+        return getattr(importlib.import_module(e[1]), e[2])
+
+    def load(self, lazy=False):
+        # Rebuild the whole tree.  Nodes come back calculated, with the
+        # attributes their calculate() set.  If lazy, each node's record
+        # is only read the first time one of them is used.
+        nodes = []
+        classes = {}
+        for i, e in enumerate(self.index):
+            cls = classes.get(e[1:3], None)
+            if cls is None:
+                cls = classes[e[1:3]] = self.node_class(i)
+            n = cls.__new__(cls)
+            AssemblyBase.__init__(n, e[3], None)
+            n.identifier = e[0]
+            n.calculated = True
+            n._own_hash = e[7]
+            n._hash = e[8]
+            if e[4] >= 0:
+                p = nodes[e[4]]
+                p.children.append(n)
+                n.set_parent(p)
+            nodes.append(n)
+        resolve = lambda ident: nodes[self.position[ident]]
+
+        def loader(n):
+            data, attrs = self.read_record(n.identifier, resolve)
+            n.__dict__.update(attrs)
+            n.data = data
+
+        for n in nodes:
+            if lazy:
+                # everything the record holds has to be missing for
+                # __getattr__ to fetch it, including what __init__ set
+                for k in [k for k in n.__dict__ if k not in _archive_skip]:
+                    del n.__dict__[k]
+                del n.data
+                n._loader = loader
+            else:
+                loader(n)
+        return nodes[0] if nodes else None
+
+
+def load_archive(filename, lazy=True):
+    # Lazily, the file is memory mapped and records are read as nodes
+    # are used; otherwise it's read in one sequential pass.
+    f = open(filename, 'rb')
+    try:
+        if lazy:
+            import mmap
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+    finally:
+        f.close()
+    return ArchiveReader(filename, buf).load(lazy)
+
+
+def verify_archive(root, filename, tol=1e-9):
+    # Round trip check: load filename both ways and compare every
+    # node's world placement and data against root's.  Returns
+    # {identifier: [what differs]} for nodes that don't match.
+    import numpy as np
+
+    def state(top):
+        tree = top.get_transform_tree()
+        return dict([(n.identifier, (tree.world_of(n), data_digest(n.data)))
+                     for n in top.iter_nodes()])
+    expected = state(root)
+    r = {}
+    for lazy in (False, True):
+        got = state(load_archive(filename, lazy))
+        for ident, (m, digest) in expected.items():
+            what = 'lazy' if lazy else 'eager'
+            if ident not in got:
+                r.setdefault(ident, []).append('%s: missing' % what)
+                continue
+            if not np.allclose(got[ident][0], m, atol=tol):
+                r.setdefault(ident, []).append('%s: placement' % what)
+            if got[ident][1] != digest:
+                r.setdefault(ident, []).append('%s: data' % what)
     return r
 
 
-def rounded_slot(length, width, height):
-    u = union()(
-        translate([0, -width/2, 0])(
-            cube([length, width, height]),
-        ),
-        cylinder(r=width/2, h=height),
-        translate([length,0,0])(
-            cylinder(r=width/2, h=height),
-        )
-    )
-    return u
+# fork node attributes never read from the source: ones which would
+# refer to the source's nodes, and caches of things below, which the
+# source may change
+_fork_local = ('_placements', '_transform_tree', '_mate_solver', '_index')
+_fork_cache_names = ['_bbox', '_mesh', '_mass', '_hash', '_own_hash',
+                     '_children_placed']
+_fork_cached = dict([(k, i) for i, k in enumerate(_fork_cache_names)])
+_fork_caches = operator.attrgetter(*_fork_cache_names)
+_no_caches = (None,) * len(_fork_cache_names)
+
+_fork_keys = set(['_fork_src', '_forks', '_fork_caches', '_forked',
+                  '_fork_origin', '_loader'])
+
+_fork_classes = {}
+
+
+def _fork_setattr(self, attr, value):
+    # Public attributes are what the node is, so the first one set
+    # copies it from its source.  generate is swapped in and out by
+    # locate_children().
+    if not (attr.startswith('_') or attr in ('parent', 'children',
+                                             'generate')):
+        self._writable()
+    object.__setattr__(self, attr, value)
+
+
+def _fork_class(cls):
+    # cls, watching attribute assignment for a fork node which hasn't
+    # been changed yet
+    cls = getattr(cls, '_fork_base', cls)
+    r = _fork_classes.get(cls, None)
+    if r is None:
+        r = _fork_classes[cls] = type(cls.__name__, (cls,), {
+            '__module__' : cls.__module__,
+            '__setattr__' : _fork_setattr,
+            '_fork_base' : cls})
+    return r
+
+
+def _node_attrs(n):
+    # n's instance attributes, reading through unchanged fork nodes
+    n.data
+    r = {}
+    while n is not None:
+        d = n.__dict__
+        for k, v in d.items():
+            r.setdefault(k, v)
+        n = d.get('_fork_src')
+    return r
+
+
+def _same_node(a, b):
+    # whether a is b or what b was forked from
+    while b is not None:
+        if a is b:
+            return True
+        d = b.__dict__
+        b = d.get('_fork_src', d.get('_fork_origin'))
+    return False
+
+
+class _Forks(dict):
+    # Source node -> fork node for one fork() call.  Until it's changed
+    # a fork node holds only its place in the fork and its caches, and
+    # reads everything else from its source.
+
+    def shell(self, src, parent, caches=None):
+        cls = src.__class__
+        n = object.__new__(_fork_classes.get(cls) or _fork_class(cls))
+        n.__dict__.update({'parent' : parent,
+                           '_fork_src' : src,
+                           '_forks' : self,
+                           '_fork_caches' : caches or _fork_caches(src)})
+        self[src] = n
+        return n
+
+    def children(self, n):
+        # n's children, as fork nodes for its source's.  They keep what
+        # the source's have cached, unless they're below a changed node,
+        # which it may depend on.
+        p = n
+        while p is not None and '_fork_src' in p.__dict__:
+            p = p.parent
+        caches = _no_caches if p is not None else None
+        shell = self.shell
+        r = n.__dict__['children'] = [
+            shell(c, n, caches) for c in n.__dict__['_fork_src'].children]
+        return r
+
+    def node(self, v):
+        # v's fork node if v is in the forked subtree, else v
+        r = self.get(v)
+        if r is None and v.parent is not None:
+            p = self.node(v.parent)
+            if p is not v.parent:
+                p.children
+                r = self.get(v)
+        return v if r is None else r
+
+    def view(self, n, attr, v):
+        # v, read from n's source, as n should see it: nodes, and
+        # containers of them, are read as the fork's own
+        if isinstance(v, AssemblyBase):
+            return self.node(v)
+        if type(v) in (list, tuple, dict):
+            es = v.values() if type(v) is dict else v
+            if [e for e in es if isinstance(e, AssemblyBase)]:
+                v = n.__dict__[attr] = self.remap_nodes(v)
+        return v
+
+    def remap_nodes(self, v):
+        if isinstance(v, AssemblyBase):
+            return self.node(v)
+        if type(v) in (list, tuple):
+            return type(v)([self.remap_nodes(e) for e in v])
+        if type(v) is dict:
+            return dict([(k, self.remap_nodes(e)) for k, e in v.items()])
+        return v
+
+    def own(self, n):
+        # give n its own copy of its source's data and attributes
+        d = n.__dict__
+        src = d['_fork_src']
+        for k, i in _fork_cached.items():
+            d.setdefault(k, d['_fork_caches'][i])
+        if 'children' not in d:
+            self.children(n)
+        for k, v in _node_attrs(src).items():
+            if k not in d and k not in _fork_keys:
+                d[k] = self.remap(v)
+        for k in _fork_local:
+            d.setdefault(k, None)
+        del d['_fork_src'], d['_forks'], d['_fork_caches']
+        d['_fork_origin'] = src
+        n.__class__ = n.__class__._fork_base
+
+    def remap(self, v):
+        # a copy of v for the fork, with nodes swapped for their forks
+        if isinstance(v, AssemblyBase):
+            return self.get(v, v)
+        if isinstance(v, (int, long, float, complex, basestring, bool,
+                          types.NoneType, types.FunctionType, type)):
+            return v
+        if isinstance(v, list):
+            return [self.remap(e) for e in v]
+        if isinstance(v, tuple):
+            return tuple([self.remap(e) for e in v])
+        if isinstance(v, dict):
+            return dict([(k, self.remap(e)) for k, e in v.items()])
+        if isinstance(v, (set, frozenset)):
+            return v.__class__([self.remap(e) for e in v])
+        numpy = sys.modules.get('numpy')
+        if numpy is not None:
+            if isinstance(v, numpy.ndarray):
+                return v.copy()
+            if isinstance(v, numpy.generic):
+                return v
+        # anything else mutable is copied whole, keeping references to
+        # forked nodes pointing at the forks
+        import copy
+        return copy.deepcopy(v, dict([(id(s), f) for s, f in self.items()]))
+
+
+class _NodeView(object):
+    # what diff() needs from a tree of nodes
+    def root(self, a):
+        return a
+
+    def children(self, x):
+        return x.children
+
+    def merkle(self, x):
+        return x.content_hash()
+
+    def own(self, x):
+        return x.own_hash()
+
+    def info(self, x):
+        return x.identifier, x.__class__.__name__, x.name, x
+
+    def data(self, x):
+        return x.data
+
+    def placement(self, x):
+        return x.placement()
+
+
+class _ArchiveView(object):
+    # ... and from an archive, without reading any records until data
+    # has to be compared
+    def __init__(self, reader):
+        self.reader = reader
+
+    def root(self, a):
+        return 0
+
+    def children(self, x):
+        return self.reader.children[x]
+
+    def merkle(self, x):
+        return self.reader.index[x][8]
+
+    def own(self, x):
+        return self.reader.index[x][7]
+
+    def info(self, x):
+        e = self.reader.index[x]
+        return e[0], e[2], e[3], e[0]
+
+    def data(self, x):
+        return self.reader.read_data(self.reader.index[x][0])
+
+    def placement(self, x):
+        attrs = self.reader.read_record(self.reader.index[x][0])[1]
+        return {'local_transform' : attrs.get('local_transform'),
+                'connectors' : attrs.get('connectors', {})}
+
+
+def _diff_entry(view, x):
+    ident, cls, name, item = view.info(x)
+    return {'identifier': ident, 'class': cls, 'name': name, 'item': item}
+
+
+def _data_changes(a, b):
+    ret = {}
+    for k in set(a.keys()) | set(b.keys()):
+        if k not in b:
+            ret[k] = (a[k], None)
+        elif k not in a:
+            ret[k] = (None, b[k])
+        elif _normalise(a[k]) != _normalise(b[k]):
+            ret[k] = (a[k], b[k])
+    return ret
+
+
+def _diff(va, a, vb, b):
+    # Walk both trees together, skipping subtrees whose hashes agree.
+    # Children are paired first by identical hash, then by identifier,
+    # then by class in order; whatever's left was added or removed.
+    ret = {'added': [], 'removed': [], 'modified': []}
+    stack = [(va.root(a), vb.root(b))]
+    while stack:
+        x, y = stack.pop()
+        if va.merkle(x) == vb.merkle(y):
+            continue
+        if va.own(x) != vb.own(y):
+            d = _diff_entry(vb, y)
+            d['before'] = va.info(x)[3]
+            d['changes'] = _data_changes(va.data(x), vb.data(y))
+            d['changes'].update(_data_changes(va.placement(x),
+                                              vb.placement(y)))
+            ret['modified'].append(d)
+        used = set()
+        same = {}
+        for c in vb.children(y):
+            same.setdefault(vb.merkle(c), []).append(c)
+        left = []
+        for c in va.children(x):
+            m = same.get(va.merkle(c))
+            if m:
+                used.add(m.pop(0))
+            else:
+                left.append(c)
+        for key in (lambda v, c: v.info(c)[:2],
+                    lambda v, c: v.info(c)[1]):
+            by_key = {}
+            for c in vb.children(y):
+                if c not in used:
+                    by_key.setdefault(key(vb, c), []).append(c)
+            rest = []
+            for c in left:
+                m = by_key.get(key(va, c))
+                if m:
+                    d = m.pop(0)
+                    used.add(d)
+                    stack.append((c, d))
+                else:
+                    rest.append(c)
+            left = rest
+        right = [c for c in vb.children(y) if c not in used]
+        ret['removed'] += [_diff_entry(va, c) for c in left]
+        ret['added'] += [_diff_entry(vb, c) for c in right]
+    return ret
+
+
+def diff_assemblies(a, b):
+    return _diff(_NodeView(), a, _NodeView(), b)
+
+
+def diff_archives(a, b):
+    # a and b are archive filenames
+    ra = ArchiveReader(a)
+    rb = ArchiveReader(b)
+    try:
+        return _diff(_ArchiveView(ra), None, _ArchiveView(rb), None)
+    finally:
+        ra.close()
+        rb.close()
+
+
+def print_diff(diff):
+    for d in diff['removed']:
+        print '-', d['identifier'], d['name']
+    for d in diff['added']:
+        print '+', d['identifier'], d['name']
+    for d in diff['modified']:
+        print '~', d['identifier'], d['name']
+        for k, (old, new) in sorted(d['changes'].items()):
+            print '   ', k, old, '->', new
+
+
+class NodeIndex(object):
+    # Secondary indexes over a tree for query(): nodes by class, and for
+    # each data key asked about, nodes by the normalised value get_data()
+    # finds for them.  Held on the top node, built on first use and kept
+    # current by add_child, calculation and invalidate().  Other changes
+    # to the tree's shape need reindex().  get_data() reads both up and
+    # down the tree, so any change drops the per-key indexes and they're
+    # rebuilt as queries need them.
+
+    def __init__(self, top):
+        self.top = top
+        self.by_class = {}
+        self.nodes = set()
+        self.values = {}
+        self.add_tree(top)
+
+    def add_tree(self, root):
+        for n in root.iter_nodes():
+            self.add(n)
+
+    def add(self, n):
+        if n not in self.nodes:
+            for c in n.__class__.__mro__:
+                self.by_class.setdefault(c, set()).add(n)
+            self.nodes.add(n)
+        self.values = {}
+
+    def key_values(self, key):
+        # {node: get_data(key)} for the nodes it finds a value for, and
+        # those nodes by normalised value.  As get_data(): a node's own
+        # value, else the shallowest below (first in tree order), else
+        # the nearest above.
+        r = self.values.get(key)
+        if r is not None:
+            return r
+        order = list(self.top.iter_nodes())
+        below = {}
+        for n in reversed(order):
+            if key in n.data:
+                below[n] = (0, n.data[key])
+                continue
+            best = None
+            for c in n.children:
+                b = below.get(c)
+                if b is not None and (best is None or b[0] < best[0]):
+                    best = b
+            if best is not None:
+                below[n] = (best[0] + 1, best[1])
+        above = {}
+        found = {}
+        for n in order:
+            if key in n.data:
+                above[n] = n.data[key]
+            elif n.parent in above:
+                above[n] = above[n.parent]
+            if n in below:
+                found[n] = below[n][1]
+            elif n in above:
+                found[n] = above[n]
+        by_value = {}
+        for n, v in found.items():
+            try:
+                by_value.setdefault(_normalise(v), set()).add(n)
+            except TypeError:
+                pass
+        r = self.values[key] = (found, by_value)
+        return r
+
+    def _class_set(self, cls):
+        if not isinstance(cls, basestring):
+            return self.by_class.get(cls, set())
+        r = set()
+        for c, s in self.by_class.items():
+            if c.__name__ == cls:
+                r |= s
+        return r
+
+    def query(self, under, cls, preds):
+        # Start from the smallest candidate set and test the rest.
+        # Callable values are predicates on the data value.
+        sets = []
+        tests = []
+        if cls is not None:
+            sets.append(self._class_set(cls))
+        for k, v in preds.items():
+            found, by_value = self.key_values(k)
+            if callable(v):
+                sets.append(found)
+                tests.append((found, v))
+            else:
+                try:
+                    sets.append(by_value.get(_normalise(v), set()))
+                except TypeError:
+                    sets.append(found)
+                    tests.append((found, lambda e, v=v: e == v))
+        if not sets:
+            sets.append(self.nodes)
+        sets.sort(key=len)
+        ret = []
+        for n in sets[0]:
+            if not all([n in s for s in sets[1:]]):
+                continue
+            if not all([t(found[n]) for found, t in tests]):
+                continue
+            if under is not self.top:
+                p = n
+                while p is not None and p is not under:
+                    p = p.parent
+                if p is None:
+                    continue
+            ret.append(n)
+        # in tree order, as iter_nodes() would give them
+        position = {}
+
+        def path(n):
+            r = []
+            while n.parent is not None:
+                p = n.parent
+                if p not in position:
+                    position[p] = dict([(c, i) for i, c in
+                                        enumerate(p.children)])
+                r.append(position[p][n])
+                n = p
+            r.reverse()
+            return r
+        ret.sort(key=path)
+        return ret
+
+
+def _normalise(v):
+    # hashable, order independent form of a data value
+    if isinstance(v, dict):
+        return ('dict',) + tuple(sorted([(_normalise(k), _normalise(e))
+                                         for k, e in v.items()]))
+    if isinstance(v, (list, tuple)):
+        return tuple([_normalise(e) for e in v])
+    numpy = sys.modules.get('numpy')
+    if numpy is not None:
+        if isinstance(v, numpy.ndarray):
+            return ('ndarray', v.shape, _normalise(v.tolist()))
+        if isinstance(v, (numpy.floating, numpy.integer)):
+            return repr(float(v))
+    # all numbers as floats, so 3 and 3.0 are the same value
+    if isinstance(v, (int, long, float)) and not isinstance(v, bool):
+        return repr(float(v))
+    if isinstance(v, AssemblyBase):
+        return ('node', v.identifier)
+    return v
+
+
+def data_digest(data):
+    import hashlib
+    return hashlib.sha1(repr(_normalise(data))).hexdigest()
+
+
+_mass_cache = {}
+
+# keys passed to get_data() while a node's calculate() or generate()
+# runs, None when nothing is recording
+_data_reads = None
+
+
+# Parameter sweeps.  Each point of the grid is built by factory(params),
+# calculated, costed and optionally exported in a worker process.
+# Leaf mass properties are cached by content, so identical sub-parts
+# are only computed once per worker, and new cache entries come back
+# with each result to be shared with later sweeps in this process.
+
+sweep_columns = ['ok', 'error', 'hash', 'parts', 'lines', 'mass',
+                 'com_x', 'com_y', 'com_z', 'seconds']
+
+
+def sweep_points(grid):
+    # grid is {name: [values]} for the full product, or a list of
+    # param dicts
+    if isinstance(grid, dict):
+        import itertools
+        names = sorted(grid.keys())
+        return [dict(zip(names, v))
+                for v in itertools.product(*[grid[k] for k in names])]
+    return [dict(p) for p in grid]
+
+
+def _sweep_point(args):
+    import traceback
+    factory, index, params, mass, export_dir, export = args
+    known = set(_mass_cache.keys())
+    row = dict([(k, None) for k in sweep_columns])
+    t = time.time()
+    try:
+        a = factory(params)
+        row['ok'] = a.finalise_calcs(exception_on_fail=False)
+        bom = BOM(a)
+        row['hash'] = a.content_hash()
+        row['lines'] = len(bom.lines)
+        row['parts'] = sum([l['quantity'] for l in bom.iter_lines(False)])
+        if mass:
+            m = a.get_mass_properties()
+            row['mass'] = m.mass
+            row['com_x'], row['com_y'], row['com_z'] = m.get_com().tolist()
+        if export_dir is not None:
+            path = os.path.join(export_dir, str(index))
+            if export == 'archive':
+                a.save_archive(path + '.arc')
+            else:
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+                if export == 'scad':
+                    a.save_components(path)
+                else:
+                    a.save_stl_components(path)
+    except Exception:
+        row['ok'] = False
+        row['error'] = traceback.format_exc().strip().split('\n')[-1]
+    row['seconds'] = time.time() - t
+    new = dict([(k, v) for k, v in _mass_cache.items() if k not in known])
+    return index, row, new
+
+
+def sweep(factory, grid, jobs=None, mass=True, export_dir=None,
+          export='archive'):
+    # Returns a columnar table, {column: [value per point]}, with a
+    # column for each parameter plus sweep_columns.  factory must be
+    # picklable, e.g. a part class or a module level function.  export
+    # is 'archive', 'scad' or 'stl'.
+    points = sweep_points(grid)
+    tasks = [(factory, i, p, mass, export_dir, export)
+             for i, p in enumerate(points)]
+    names = sorted(set([k for p in points for k in p.keys()]))
+    table = dict([(k, [None] * len(points))
+                  for k in names + sweep_columns])
+    if jobs == 1 or len(tasks) < 2:
+        results = map(_sweep_point, tasks)
+        pool = None
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(jobs)
+        chunk = max(1, len(tasks) // (4 * (jobs or
+                                           multiprocessing.cpu_count())))
+        results = pool.imap_unordered(_sweep_point, tasks, chunk)
+    try:
+        for i, row, new in results:
+            for k in names:
+                table[k][i] = points[i].get(k, None)
+            for k in sweep_columns:
+                table[k][i] = row[k]
+            _mass_cache.update(new)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return table
+
+
+def write_table_csv(table, f, columns=None):
+    import csv
+    if columns is None:
+        columns = sorted([k for k in table if k not in sweep_columns]) + \
+                  [k for k in sweep_columns if k in table]
+    w = csv.writer(f)
+    w.writerow(columns)
+    n = max([len(v) for v in table.values()] + [0])
+    for i in range(n):
+        w.writerow([table[k][i] for k in columns])
+
+
+# Standard parts catalogue.  Each section is a family, headed by its
+# column names, with one row per size.  The first column is the size
+# the family is looked up by.  Dimensions are in mm.
+
+_catalogue_text = '''
+[metric_nut] size outer_dia height
+# ISO 4032 hex nuts, width across corners and height
+1.0     2.887   1.0
+1.6     3.41    1.3
+2.0     4.32    1.6
+2.5     5.45    2.0
+3.0     6.01    2.4
+4.0     7.66    3.2
+5.0     8.79    4.7
+6.0     11.05   5.2
+8.0     14.38   6.8
+10.0    17.77   8.4
+12.0    20.03   10.8
+14.0    23.35   12.8
+16.0    26.75   14.8
+18.0    29.56   15.8
+20.0    32.95   18.0
+22.0    35.03   19.4
+24.0    39.55   21.5
+27.0    45.2    23.8
+30.0    50.85   25.6
+33.0    55.37   28.7
+36.0    60.79   31.0
+42.0    71.3    34.0
+48.0    82.6    38.0
+56.0    93.56   45.0
+64.0    104.86  51.0
+
+[metric_bolt] size head_dia head_height socket socket_depth
+# ISO 4762 socket head cap screws, socket is across flats
+1.6     3.0     1.6     1.5     0.7
+2.0     3.8     2.0     1.5     1.0
+2.5     4.5     2.5     2.0     1.1
+3.0     5.5     3.0     2.5     1.3
+4.0     7.0     4.0     3.0     2.0
+5.0     8.5     5.0     4.0     2.5
+6.0     10.0    6.0     5.0     3.0
+8.0     13.0    8.0     6.0     4.0
+10.0    16.0    10.0    8.0     5.0
+12.0    18.0    12.0    10.0    6.0
+14.0    21.0    14.0    12.0    7.0
+16.0    24.0    16.0    14.0    8.0
+20.0    30.0    20.0    17.0    10.0
+24.0    36.0    24.0    19.0    12.0
+30.0    45.0    30.0    22.0    15.5
+36.0    54.0    36.0    27.0    19.0
+
+[metric_washer] size inner_dia outer_dia thickness
+# ISO 7089 plain washers
+1.6     1.7     4.0     0.3
+2.0     2.2     5.0     0.3
+2.5     2.7     6.0     0.5
+3.0     3.2     7.0     0.5
+4.0     4.3     9.0     0.8
+5.0     5.3     10.0    1.0
+6.0     6.4     12.0    1.6
+8.0     8.4     16.0    1.6
+10.0    10.5    20.0    2.0
+12.0    13.0    24.0    2.5
+14.0    15.0    28.0    2.5
+16.0    17.0    30.0    3.0
+20.0    21.0    37.0    3.0
+24.0    25.0    44.0    4.0
+30.0    31.0    56.0    4.0
+36.0    37.0    66.0    5.0
+
+[nema] size width pilot_dia pilot_height hole_spacing hole_dia
+8       20.0    16.0    1.5     16.0    2.0
+11      28.0    22.0    2.0     23.0    2.5
+14      35.0    22.0    2.0     26.0    3.0
+17      42.0    22.0    2.0     31.0    3.0
+23      57.0    38.1    1.6     47.14   5.0
+34      86.0    73.0    2.0     69.6    5.5
+42      110.0   55.5    1.5     89.0    8.5
+
+[bk] size bore x0 depth width height boss boss_height hole_pitch hole_rows hole_dia
+# fixed end support blocks, shaft along z, mounting face at x = x0
+10      10.0    -22.0   32.5    60.0    25.0    34.0    30.0    46.0    13.0    5.5
+12      12.0    -25.0   32.5    60.0    25.0    34.0    30.0    46.0    13.0    5.5
+15      15.0    -28.0   38.0    70.0    27.0    40.0    33.0    54.0    15.0    5.5
+17      17.0    -39.0   55.0    86.0    35.0    50.0    44.0    68.0    19.0    9.0
+20      20.0    -34.0   50.0    88.0    35.0    52.0    43.0    70.0    19.0    9.0
+25      25.0    -48.0   70.0    106.0   42.0    64.0    54.0    85.0    22.0    11.0
+30      30.0    -51.0   78.0    128.0   45.0    76.0    59.0    102.0   23.0    14.0
+
+[bf] size bore x0 depth width height boss boss_height hole_pitch hole_rows hole_dia
+# floating end support blocks, a single row of mounting holes
+10      8.0     -22.0   32.5    60.0    20.0    34.0    20.0    46.0    0.0     5.5
+12      10.0    -25.0   32.5    60.0    20.0    34.0    20.0    46.0    0.0     5.5
+15      15.0    -28.0   38.0    70.0    20.0    40.0    20.0    54.0    0.0     5.5
+17      17.0    -39.0   55.0    86.0    23.0    50.0    23.0    68.0    0.0     9.0
+20      20.0    -34.0   50.0    88.0    26.0    52.0    26.0    70.0    0.0     9.0
+25      25.0    -48.0   70.0    106.0   30.0    64.0    30.0    85.0    0.0     11.0
+30      30.0    -51.0   78.0    128.0   32.0    76.0    32.0    102.0   0.0     14.0
+
+[fk] size bore flange flange_height spigot spigot_height pcd hole_dia
+# fixed end flange supports, flange on top of the spigot.  FK, FF, SBR
+# and SBR..UU only have the sizes modelled so far.
+10      10.0    42.0    10.0    34.0    17.0    42.0    4.0
+
+[ff] size bore flange flange_height spigot spigot_height pcd hole_dia
+# floating end flange supports
+10      8.0     35.0    7.0     28.0    5.0     35.0    4.0
+
+[sk] size bore width body_width depth base_offset base_thickness thickness hole_pitch hole_dia
+# shaft supports, base at y = -base_offset
+8       8.0     42.0    18.0    32.8    20.0    6.0     14.0    32.0    5.5
+10      10.0    42.0    18.0    32.8    20.0    6.0     14.0    32.0    5.5
+12      12.0    42.0    20.0    37.5    23.0    6.0     14.0    32.0    5.5
+13      13.0    42.0    20.0    37.5    23.0    6.0     14.0    32.0    5.5
+16      16.0    48.0    25.0    44.0    27.0    8.0     16.0    38.0    5.5
+20      20.0    60.0    30.0    51.0    31.0    10.0    20.0    45.0    6.6
+25      25.0    70.0    38.0    60.0    35.0    12.0    24.0    56.0    6.6
+30      30.0    84.0    44.0    70.0    42.0    12.0    28.0    64.0    9.0
+
+[lm_uu] size bore outer_dia length
+# linear ball bearings
+3       3.0     7.0     10.0
+4       4.0     8.0     12.0
+5       5.0     10.0    15.0
+6       6.0     12.0    19.0
+8       8.0     15.0    24.0
+10      10.0    19.0    29.0
+12      12.0    21.0    30.0
+13      13.0    23.0    32.0
+16      16.0    28.0    37.0
+20      20.0    32.0    42.0
+25      25.0    40.0    59.0
+30      30.0    45.0    64.0
+35      35.0    52.0    70.0
+40      40.0    60.0    80.0
+50      50.0    80.0    100.0
+60      60.0    90.0    110.0
+
+[lm_luu] size bore outer_dia length
+# long linear ball bearings
+8       8.0     15.0    45.0
+10      10.0    19.0    55.0
+12      12.0    21.0    57.0
+16      16.0    28.0    70.0
+20      20.0    32.0    80.0
+25      25.0    40.0    112.0
+30      30.0    45.0    123.0
+
+[sbr] size rail_dia height base_width base_thickness web_base web_top web_height
+# supported rails, rail axis at the origin, base at y = -height
+12      12.0    20.46   34.0    4.5     15.0    6.0     15.0
+
+[sbr_uu] size bore width height length top slot slot_flare slot_depth hole_x hole_z hole_dia hole_depth
+# open bearing blocks for supported rails, top face at y = top
+12      12.0    40.0    27.6    39.0    17.0    8.5     3.0     7.0     14.0    13.0    5.0     11.0
+'''
+
+_catalogue = None
+
+
+def _size_key(size):
+    return round(float(size), 3)
+
+
+def catalogue():
+    # {family: {size: row}}, parsed the first time it's asked for
+    global _catalogue
+    if _catalogue is None:
+        cat = {}
+        cols = None
+        for line in _catalogue_text.split('\n'):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('['):
+                family, rest = line[1:].split(']')
+                cols = rest.split()
+                rows = cat[family] = {}
+            else:
+                row = dict(zip(cols, [float(e) for e in line.split()]))
+                rows[_size_key(row['size'])] = row
+        _catalogue = cat
+    return _catalogue
+
+
+def lookup(family, size):
+    # Row of standard dimensions, shared between callers so don't
+    # change it.
+    try:
+        return catalogue()[family][_size_key(size)]
+    except KeyError:
+        raise KeyError("No size %s in catalogue family %s" % (size, family))
+
+
+def catalogue_sizes(family):
+    return sorted(catalogue()[family].keys())
 
-    
 
 class GenericRectangularPrism(AssemblyBase):
     def __init__(self, name, data={}):
@@ -546,6 +2387,21 @@ class GenericRectangularPrism(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        width = self.get_data('width')
+        height = self.get_data('height')
+        depth = self.get_data('depth')
+        return {
+            'bottom' : connector_frame([width/2.0, depth/2.0, 0.0], [0,0,-1]),
+            'top' : connector_frame([width/2.0, depth/2.0, height], [0,0,1]),
+        }
+
+    def profile_2d(self):
+        width = self.get_data('width')
+        depth = self.get_data('depth')
+        return {'outline' : [(0.0, 0.0), (width, 0.0), (width, depth),
+                             (0.0, depth)]}
+
     def generate(self):
         colour = self.get_data('colour', Yellow)
         width = self.get_data('width')
@@ -563,6 +2419,13 @@ class GenericPipe(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        return {
+            'start' : connector_frame([0,0,0], [0,0,-1]),
+            'end' : connector_frame([0,0,self.data['length']], [0,0,1]),
+            'axis' : connector_frame([0,0,0], [0,0,1]),
+        }
+
     def generate(self):
         colour = self.get_data('colour', Yellow)
         return color(colour)(
@@ -573,7 +2436,12 @@ class GenericPipe(AssemblyBase):
             )
         )
 
+
 class GenericDrilledPlate(AssemblyBase):
+    # drills are x, y, dia; hole_patterns are dicts for hole_pattern();
+    # routes are (path, tool_dia) cut through as routed_slots().
+    # Negative positions, pattern origins and path points are measured
+    # from the far edges unless remap_negative is False.
     def __init__(self, name, data={}):
         defaults = {            
         }
@@ -581,21 +2449,125 @@ class GenericDrilledPlate(AssemblyBase):
         AssemblyBase.__init__(self, name, defaults)
 
     def calculate(self):
-        nd = []
+        # plain lists only, so calculation doesn't need numpy
         width = self.get_data('width')
         depth = self.get_data('depth')
-        drills = self.get_data('drills', [])
-        width_offset = self.get_data('width_offset', 0.0)
-        depth_offset = self.get_data('depth_offset', 0.0)
-        for x,y,dia in drills:
-            if x < 0 and self.get_data('remap_negative', True):
+        remap = self.get_data('remap_negative', True)
+
+        def remapped(x, y):
+            if x < 0 and remap:
                 x = width + x
-            if y < 0 and self.get_data('remap_negative', True):
+            if y < 0 and remap:
                 y = depth + y
-            nd.append([x,y,dia])
+            return x, y
+
+        nd = []
+        for x, y, dia in self.get_data('drills', []):
+            x, y = remapped(x, y)
+            nd.append([x, y, dia])
         self.data['drills'] = nd
+        self.patterns = []
+        for p in self.get_data('hole_patterns', []):
+            x, y = remapped(p.get('x', 0.0), p.get('y', 0.0))
+            self.patterns.append(dict(p, x=x, y=y))
+        self.routes = [([remapped(p[0], p[1]) for p in path], dia)
+                       for path, dia in self.get_data('routes', [])]
+        self._arrays = None
         return True
 
+    def plate_arrays(self):
+        # (holes, slots, cutouts) with every drill and pattern: holes
+        # an (N, 3) array of x, y, dia, slots (N, 5) as hole_pattern()
+        # gives and cutouts the routed outlines.  Built on first use.
+        _load_geometry()
+        if self._arrays is None:
+            holes = [np.array(self.data['drills'],
+                              dtype=float).reshape(-1, 3)]
+            slots = [np.zeros((0, 5))]
+            for p in self.patterns:
+                if p.get('pattern', 'grid') == 'slot':
+                    slots.append(hole_pattern(p))
+                else:
+                    holes.append(hole_pattern(p))
+            tolerance = self.get_data('route_tolerance', 0.01)
+            cutouts = []
+            for dia in sorted(set([dia for path, dia in self.routes])):
+                cutouts += routed_slots(
+                    [path for path, d in self.routes if d == dia], dia,
+                    tolerance)
+            self._arrays = (np.concatenate(holes), np.concatenate(slots),
+                            cutouts)
+        return self._arrays
+
+    def make_connectors(self):
+        width = self.get_data('width')
+        height = self.get_data('height')
+        depth = self.get_data('depth')
+        width_offset = self.get_data('width_offset', 0.0)
+        depth_offset = self.get_data('depth_offset', 0.0)
+        cx = width_offset + width/2.0
+        cy = depth_offset + depth/2.0
+        r = {
+            'bottom' : connector_frame([cx, cy, 0.0], [0,0,-1]),
+            'top' : connector_frame([cx, cy, height], [0,0,1]),
+        }
+        for i, (x, y, dia) in enumerate(self.plate_arrays()[0].tolist()):
+            r['hole_%d' % i] = connector_frame([x, y, height], [0,0,1])
+        return r
+
+    def generate_holes(self):
+        # one loop per diameter, and per slot size
+        height = self.get_data('height')
+        holes, slots, cutouts = self.plate_arrays()
+        dl = []
+        if len(holes):
+            dias, group = np.unique(holes[:, 2], return_inverse=True)
+            for i, dia in enumerate(dias):
+                dl.append(instance_loop(
+                    translate([0,0,-1])(cylinder(r=float(dia)/2,
+                                                 h = height+2)),
+                    translations(holes[group == i, :2])))
+        if len(slots):
+            sizes, group = np.unique(slots[:, 2:], axis=0,
+                                     return_inverse=True)
+            for i, (length, angle, w) in enumerate(sizes):
+                dl.append(instance_loop(
+                    translate([0,0,-1])(rotate([0, 0, angle])(
+                        linear_extrude(height+2)(polygon(
+                            obround(length, w))))),
+                    translations(slots[group.ravel() == i, :2])))
+        for c in cutouts:
+            dl.append(translate([0,0,-1])(linear_extrude(height+2)(
+                polygon(list(c)))))
+        return dl
+
+    def toolpath(self, start=(0.0, 0.0), machine={}):
+        # drills, slots routed along their centre lines with a cutter
+        # of the slot width, and routes, through the plate
+        holes, slots, cutouts = self.plate_arrays()
+        routes = []
+        for x, y, length, angle, w in slots.tolist():
+            a = math.radians(angle)
+            routes.append(([(x, y), (x + length*math.cos(a),
+                                     y + length*math.sin(a))], w))
+        routes += self.routes
+        machine = dict({'depth' : self.get_data('height') + 1.0}, **machine)
+        return plan_toolpath(holes, routes, start, machine)
+
+    def profile_2d(self):
+        width = self.get_data('width')
+        depth = self.get_data('depth')
+        x0 = self.get_data('width_offset', 0.0)
+        y0 = self.get_data('depth_offset', 0.0)
+        holes, slots, cutouts = self.plate_arrays()
+        return {
+            'outline' : [(x0, y0), (x0 + width, y0),
+                         (x0 + width, y0 + depth), (x0, y0 + depth)],
+            'cutouts' : cutouts,
+            'holes' : holes,
+            'slots' : slots,
+        }
+
     def generate(self):
         colour = self.get_data('colour', Yellow)
         width = self.get_data('width')
@@ -603,17 +2575,12 @@ class GenericDrilledPlate(AssemblyBase):
         depth = self.get_data('depth')
         width_offset = self.get_data('width_offset', 0.0)
         depth_offset = self.get_data('depth_offset', 0.0)
-        drills = self.get_data('drills', [])
         u = translate([width_offset, depth_offset, 0.0])(
             cube([width, depth, height])
         )
-        dl = []
-        for x,y,dia in drills:
-            dl.append(translate([x,y,-1])(cylinder(r=float(dia)/2,
-                                                   h = height+2)))
         u = difference()(
             u,
-            *dl
+            *self.generate_holes()
         )
         return color(colour)(u)
 
@@ -629,14 +2596,18 @@ class GenericRHS(AssemblyBase):
     def calculate(self):
         return True
 
-    def generate(self):
-        colour = self.get_data('colour', Yellow)
+    def make_connectors(self):
+        return {
+            'start' : connector_frame([0,0,0], [0,0,-1]),
+            'end' : connector_frame([0,0,self.get_data('length')], [0,0,1]),
+        }
+
+    def profile_2d(self):
+        # the section, for cutting to length
         width = self.get_data('width')
         height = self.get_data('height')
-        length = self.get_data('length')
         thickness = self.get_data('thickness')
-
-        pts = [
+        return {'outline' : [
             [0.0, 0.0],
             [width, 0.0],
             [width, thickness],
@@ -644,163 +2615,21 @@ class GenericRHS(AssemblyBase):
             [thickness, height],
             [0.0, height],
             [0.0, 0.0]
-        ]
+        ]}
+
+    def stock_length(self):
+        return self.get_data('length')
+
+    def generate(self):
+        colour = self.get_data('colour', Yellow)
+        length = self.get_data('length')
+        pts = self.profile_2d()['outline']
         
         u = linear_extrude(length, convexity=2)(polygon(pts))
         
         return color(colour)(u)
 
 
-def metric_bolt(d, l, style='socket_head'):
-    r = float(d)/2.0
-    if style == 'socket_head':
-        head = cylinder(r=2*r, h=d)
-        head = difference()(head, 
-                            translate([0, 0, r])(cylinder(r=float(r),
-                                                          h=r+1, segments=6)))
-        remaining_len = l - d
-    else:
-        raise NotImplementedError, 'unknown head style %s' % style
-    return color([0.1,0.1,0.1])(union()(
-        head,
-        translate([0,0,-remaining_len])(
-            cylinder(r=r,
-                     h=remaining_len)))
-    )
-    
-
-
-def beam20x20(l):
-    beam_corner = circle(r=1.5)
-    beam_square = minkowski()(translate([1.5, 1.5, 0])(square(20.0 - 3)),
-                              beam_corner)
-    #beam_square = union()(square(20.0 - 3), beam_corner)
-    tslot = [
-        (0,   3.8),
-        (0,   2.7),
-        (2.4, 0),
-        (8.6, 0),
-        (11,  2.7),
-        (11,  3.8),
-        (8.6, 3.8),
-        (8.6, 6.1),
-        (2.4, 6.1),
-        (2.4, 3.8),
-        (0,   3.8),
-    ]
-        
-    beam_shape = difference()(
-        beam_square,
-        translate([4.5,6.1,0])(rotate([180,0,0])(polygon(tslot))),
-        translate([4.5,13.9,0])(rotate([0,0,0])(polygon(tslot))),
-        translate([6.1,4.5,0])(rotate([0,0,90])(polygon(tslot))),
-        translate([14,4.5,0])(rotate([180,0,90])(polygon(tslot)))
-    )
-                                           
-    beam = linear_extrude(l)(beam_shape)
-                                           
-    return color(aluminium_colour)( 
-        beam
-    )
-
-
-
-
-def beam40x20(l):
-    beam_corner = circle(r=1.5)
-    beam_square = minkowski()(translate([1.5, 1.5, 0])(square([20.0 - 3,
-                                                               40.0 - 3])),
-                              beam_corner)
-
-    
-    tslot = [
-        (0,   3.8),
-        (0,   2.7),
-        (2.4, 0),
-        (8.6, 0),
-        (11,  2.7),
-        (11,  3.8),
-        (8.6, 3.8),
-        (8.6, 6.1),
-        (2.4, 6.1),
-        (2.4, 3.8),
-        (0,   3.8),
-    ]
-
-    hollow = [
-        (-7.0, -2.0),
-        (-8.0, -2.0),
-        (-8.0, 2.0),
-        (-7.0, 2.0),
-        
-        (-2.0, 7.0),
-        (-2.0, 8.0),
-        (2.0, 8.0),
-        (2.0, 7.0),
-
-        (7.0, 2.0),
-        (8.0, 2.0),
-        (8.0, -2.0),
-        (7.0, -2.0),
-
-        (2.0, -7.0),
-        (2.0, -8.0),
-        (-2.0, -8.0),
-        (-2.0, -7.0),
-
-        (-7.0, -2.0)
-    ]
-        
-    beam_shape = difference()(
-        beam_square,
-        translate([10.0, 20.0, 0])(polygon(hollow)),
-        translate([4.5,6.1,0])(rotate([180,0,0])(polygon(tslot))),
-
-        translate([4.5,13.9+20.01,0])(rotate([0,0,0])(polygon(tslot))),
-
-        translate([6.1,4.5,0])(rotate([0,0,90])(polygon(tslot))),
-        translate([6.1,4.5+20,0])(rotate([0,0,90])(polygon(tslot))),
-
-        translate([14,4.5,0])(rotate([180,0,90])(polygon(tslot))),
-        translate([14,4.5+20.0,0])(rotate([180,0,90])(polygon(tslot)))
-    )
-                                           
-    beam = linear_extrude(l)(beam_shape)
-                                           
-    return color(aluminium_colour)( 
-        beam
-    )
-
-
-def beam40x40(l):
-    pts = [
-        [5.5, 4.1],
-        [5.5, -4.1],
-        [13.0, -10.25],
-        [18.2, -10.25],
-        [18.2, -6.4],
-        [15.5, -6.4],
-        [15.5, -4.1],
-        [20.0, -4.1],
-        [20.0, -20.0],
-        [4.1, -20.0],
-        [4.1, -15.5],
-        [6.4, -15.5],
-        [6.4, -18.2],
-        [10.25, -18.2],
-        [10.25, -13.0],
-        [4.1, -5.5],
-    ]
-
-    all_pts = (pts + rotate_points(pts, math.radians(90))
-               + rotate_points(pts, math.radians(180)) 
-               + rotate_points(pts, math.radians(270)))
-    beam = linear_extrude(l)(polygon(all_pts))
-                                           
-    return color(aluminium_colour)( 
-        beam
-    )
-
 class Beam40x40(AssemblyBase):
     def __init__(self, data={}):
         defaults = {
@@ -811,92 +2640,25 @@ class Beam40x40(AssemblyBase):
     def calculate(self):
         return True
 
-    def generate(self):
-        return beam40x40(self.data['length'])
-
+    def make_connectors(self):
+        return {
+            'axis' : connector_frame([0,0,0], [0,0,1]),
+            'start' : connector_frame([0,0,0], [0,0,-1]),
+            'end' : connector_frame([0,0,self.data['length']], [0,0,1]),
+        }
 
-def mgn12_rail(l):
-
-    h = 13.0 - 5.0
-    c = 0.25
-    p = [
-        (-6.0, 0),
-        (-6.0, 3.0),
-        (-6.0, 4.5),
-        (-5.0, 5.5),
-        (-4.8, 5.5),
-        (-4.8, 6.0),
-        (-5.0, 6.0),
-        (-6.0, 7.0),       
-        (-6.0, h-c),
-        (-6.0+c, h),
-
-        (6.0-c, h),
-        (6.0, h-c),
-        (6.0, 7.0),       
-        (5.0, 6.0),
-        (4.8, 6.0),
-        (4.8, 5.5),
-        (5.0, 5.5),
-        (6.0, 4.5),
-        (6.0, 3.0),
-        (6.0, 0.0),
-        (-6.0, 0.0)
-        ]
-    beam = linear_extrude(l)(polygon(p))
-    beam = rotate([90,0,90])(beam)
-    return color(steel_colour)( 
-        beam
-    )
-
-
-
-def mgn12h_slider():
-    w = 27.0
-    l = 45.4
-    red_l = 1.0
-    green_l = 4.0
-    steel_l = l - 2*(red_l + green_l)
-    s = union()(
-        color(steel_colour)(
-            translate([-steel_l/2, -w/2, 3])(cube([steel_l, w, 10]))
-        ),
-        color([0, 0.7, 0])(
-            translate([steel_l/2, -w/2, 3])(cube([green_l, w, 10]))
-        ),
-        color([0.8, 0.0, 0])(
-            translate([steel_l/2 + green_l, -w/2, 3])(cube([red_l, w, 10]))
-        ),
-
-        color([0, 0.7, 0])(
-            translate([-steel_l/2 - green_l, -w/2, 3])(cube([green_l, w, 10]))
-        ),
-        color([0.8, 0.0, 0])(
-            translate([-steel_l/2 - green_l - red_l, -w/2, 3])(
-                cube([red_l, w, 10])
-            )
-        ),
-        
-    )
+    def profile_2d(self):
+        # the polygon crosses itself, leaving OpenSCAD's even-odd fill
+        # to open the slots, so trace the filled region instead
+        _load_geometry()
+        outline, cutouts = _fill_regions(beam40x40_profile())[0]
+        return {'outline' : outline, 'cutouts' : cutouts}
 
-    
-    beam = translate([-1-l/2, 0, 0])(mgn12_rail(l + 2))
-
-    C = 20.0
-    B = 20.0
-    s = difference()(
-        s,
-        beam,
-        translate([-C/2, -B/2, 10])(cylinder(r=2.6/2, h=20.0)),
-        translate([-C/2,  B/2, 10])(cylinder(r=2.6/2, h=20.0)),
-        translate([ C/2, -B/2, 10])(cylinder(r=2.6/2, h=20.0)),
-        translate([ C/2,  B/2, 10])(cylinder(r=2.6/2, h=20.0)),
-    )
-    return s
-    
+    def stock_length(self):
+        return self.data['length']
 
-def shaft(dia=10.0, length=300.0):
-    return color(steel_colour)(cylinder(r=float(dia)/2, h=length))
+    def generate(self):
+        return beam40x40(self.data['length'])
 
 
 class GenericShaft(AssemblyBase):
@@ -909,6 +2671,16 @@ class GenericShaft(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        return {
+            'axis' : connector_frame([0,0,0], [0,0,1]),
+            'start' : connector_frame([0,0,0], [0,0,-1]),
+            'end' : connector_frame([0,0,self.get_data('length')], [0,0,1]),
+        }
+
+    def stock_length(self):
+        return self.get_data('length')
+
     def generate(self):
         colour = self.get_data('colour', Yellow)
         dia = self.get_data('dia')
@@ -957,72 +2729,6 @@ class GenericBearing(AssemblyBase):
         )
         return u
 
-    
-
-
-def linear_bearing_block_sc10uu():
-    pts = [
-        [40.0, 0.0],
-        [40.0, 6.0],
-        [39.0, 7.0],
-        [39.0, 21.0],
-        [32.0, 21.0],
-        [27.0, 26.0],
-        ]
-        
-    pts = pts + mirror_points_x(pts, 20.0)
-
-    pts = shift_points(pts, [-20.0, -13.0])
-
-    u = linear_extrude(35.0)(polygon(pts))
-
-    u = difference()(
-        u,
-        translate([0,0,-1])(
-            cylinder(r=5.0, h=37.0)
-        ),
-        translate([-14.0, -15.0, 35.0/2-10.5])(
-            rotate([-90, 0, 0])(
-                cylinder(r=5.0/2, h=40.0)
-            )
-        ),
-        translate([-14.0, -15.0, 35.0/2+10.5])(
-            rotate([-90, 0, 0])(
-                cylinder(r=5.0/2, h=40.0)
-            )
-        ),
-        translate([14.0, -15.0, 35.0/2-10.5])(
-            rotate([-90, 0, 0])(
-                cylinder(r=5.0/2, h=40.0)
-            )
-        ),
-        translate([14.0, -15.0, 35.0/2+10.5])(
-            rotate([-90, 0, 0])(
-                cylinder(r=5.0/2, h=40.0)
-            )
-        )
-    )
-    
-    return color(aluminium_colour)(u)
-
-def sbr12(l, h = 20.46):
-    
-    pts = [
-        [34.0/2, 0.0],
-        [34.0/2, 4.5],
-        [15.0/2, 4.5],
-        [6.0/2, 15.0],        
-        ]
-        
-    pts = pts + mirror_points_x(pts, 0.0)
-
-    pts = shift_points(pts, [0.0, -h])
-
-    u = linear_extrude(l)(polygon(pts))
-
-    u = u + cylinder(r=12.0/2, h=l)
-
-    return color(steel_colour)(u)
 
 class SBR12(AssemblyBase):
     def __init__(self, data={}):
@@ -1035,54 +2741,21 @@ class SBR12(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        return {
+            'rail_axis' : connector_frame([0,0,0], [0,0,1]),
+            'mounting_face' : connector_frame(
+                [0,-self.get_data('height_above_mounting_plane'),0], [0,-1,0]),
+        }
+
+    def stock_length(self):
+        return self.get_data('length')
+
     def generate(self):
         return sbr12(self.get_data('length'),
                      h=self.get_data('height_above_mounting_plane'))
 
 
-def sbr12uu():
-    pts = [
-        [8.5/2, 7.0],
-        [8.5/2+3, 0.0],
-        [40.0/2, 0.0],
-        [40.0/2, 27.6],
-    ]
-    
-    pts = pts + mirror_points_x(pts, 0.0)
-
-    pts = shift_points(pts, [0.0, -27.6+17.0])
-    
-    u = linear_extrude(39.0, convexity=4)(polygon(pts))
-
-    u = difference()(
-        u,
-        translate([0,0,-1])(cylinder(r=12.0/2, h=41.0)),
-        translate([14.0, 27.6-17.0-1, 39.0/2+13.0])(
-            rotate([-90, 0, 0])(
-                cylinder(r=5.0/2, h=11.0)
-            )
-        ),
-        translate([14.0, 27.6-17.0-1, 39.0/2-13.0])(
-            rotate([-90, 0, 0])(
-                cylinder(r=5.0/2, h=11.0)
-            )
-        ),
-        translate([-14.0, 27.6-17.0-1, 39.0/2+13.0])(
-            rotate([-90, 0, 0])(
-                cylinder(r=5.0/2, h=11.0)
-            )
-        ),
-        translate([-14.0, 27.6-17.0-1, 39.0/2-13.0])(
-            rotate([-90, 0, 0])(
-                cylinder(r=5.0/2, h=11.0)
-            )
-        )
-    )
-    u = translate([0.0, 0.0, -39.0/2])(
-        u
-    )
-    return color(aluminium_colour)(u)
-
 class SBR12UU(AssemblyBase):
     def __init__(self, data={}):
         defaults = {
@@ -1093,32 +2766,16 @@ class SBR12UU(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        c = lookup('sbr_uu', 12)
+        return {
+            'bore_axis' : connector_frame([0,0,0], [0,0,1]),
+            'mounting_face' : connector_frame([0,c['top'],0], [0,1,0]),
+        }
+
     def generate(self):
         return sbr12uu()
 
-def sfu1204_screw(l, show_thread=False):
-    thread_len = l - 15 - 39 - 10
-    if show_thread:
-        section = screw_thread.default_thread_section(tooth_height=6,
-                                                      tooth_depth=1)
-        s = screw_thread.thread(outline_pts=section, inner_rad=10.0/2,
-                                pitch=4.0, length=thread_len,
-                                segments_per_rot=12)
-    else:
-        s = cylinder(r=12.0/2,
-                     h=thread_len)
-    u = union()(
-        cylinder(r=8.0/2,
-                 h=l),
-        translate([0.0, 0.0, 15.0])(
-            cylinder(r=10.0/2,
-                     h=l - 15 - 10)
-        ),
-        translate([0,0,15.0+39.0])(
-            s
-        )
-    )
-    return color(Steel)(u)
 
 class SFU1204Screw(AssemblyBase):
     def __init__(self, data={}):
@@ -1130,45 +2787,21 @@ class SFU1204Screw(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        return {
+            'axis' : connector_frame([0,0,0], [0,0,1]),
+            'fixed_end' : connector_frame([0,0,0], [0,0,-1]),
+            'floating_end' : connector_frame([0,0,self.get_data('length')],
+                                             [0,0,1]),
+        }
+
+    def stock_length(self):
+        return self.get_data('length')
+
     def generate(self):
-        return sfu1204_screw(self.get_data('length'))
-
-def sfu1204_nut(show_thread=False):
-    u = union()(
-        cylinder(r=42.0/2, h=8.0),
-        translate([0,0,-10.0])(
-            cylinder(r=22.0/2,
-                     h = 10.0 + 0.1)
-        ),
-        translate([0,0,8.0-35.0])(
-            cylinder(r=21.8/2,
-                     h=35.0 - 10.0 - 8.0 + 0.1)
-        )
-    )
-
-
-    drill = translate([0.0,16.0,-0.6])(cylinder(r=4.5/2, h=10.0))
-    h1 = 30.0
-    u = difference()(
-        u,
-        translate([h1/2,-15,-1])(
-            cube([30, 30, 30])
-        ),
-        translate([-h1/2-30,-15,-1])(
-            cube([30, 30, 30])
-        ),
-        translate([0,0,-50])(
-            cylinder(r=12.0/2,
-                     h=60)
-        ),
-        drill,
-        rotate([0,0,45])(drill),
-        rotate([0,0,-45])(drill),
-        rotate([0,0,180])(drill),
-        rotate([0,0,180-45])(drill),
-        rotate([0,0,180+45])(drill),
-    )
-    return color(Steel)(u)
+        return sfu1204_screw(self.get_data('length'),
+                             self.get_data('show_thread', None))
+
 
 class SFU1204Nut(AssemblyBase):
     def __init__(self, data={}):
@@ -1184,15 +2817,6 @@ class SFU1204Nut(AssemblyBase):
         return sfu1204_nut()
 
 
-def lm12uu():
-    u = difference()(
-        cylinder(r=21.0/2, h=30.0),
-        translate([0,0,-1])(
-            cylinder(r=12.0/2, h=32.0)
-        )
-    )
-    return color(Steel)(u)
-
 class LM12UU(AssemblyBase):
     def __init__(self, data={}):
         defaults = {
@@ -1203,26 +2827,14 @@ class LM12UU(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        return {
+            'bore_axis' : connector_frame([0,0,0], [0,0,1]),
+        }
+
     def generate(self):
         return lm12uu()
 
-def lm12luu():
-    u = difference()(
-        cylinder(r=21.0/2, h=57.0),
-        translate([0,0,-1])(
-            cylinder(r=12.0/2, h=57.0+2)
-        )
-    )
-    return color(Steel)(u)
-
-def lm10uu():
-    u = difference()(
-        cylinder(r=19.0/2, h=29.0),
-        translate([0,0,-1])(
-            cylinder(r=10.0/2, h=31.0)
-        )
-    )
-    return color(Steel)(u)
 
 class LM10UU(AssemblyBase):
     def __init__(self, data={}):
@@ -1234,78 +2846,14 @@ class LM10UU(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        return {
+            'bore_axis' : connector_frame([0,0,0], [0,0,1]),
+        }
+
     def generate(self):
         return lm10uu()
 
-    
-
-def nema(size=23, l=76.0, shaft_dia=8.0):
-    if size == 17:
-        w = 42.0
-    elif size == 23:
-        w = 57.0
-    elif size == 34:
-        w = 86.0
-    else:
-        raise NotImplementedError
-
-    return union()(
-        color(Black)(
-            translate([-w/2,-w/2,-l])(
-                cube([w,w,l])
-            ),
-        ),
-        color(Steel)(
-            cylinder(r=shaft_dia/2, h=21.0)
-        )
-    )
-
-
-def bk10():
-    return color(Black)(
-        difference()(
-            union()(
-                translate([-22.0, -30.0, 0.0])(
-                    cube([32.5, 60.0, 25.0])
-                ),
-                translate([-34.0/2, -34.0/2, 0.0])(
-                    cube([34.0, 34.0, 30.0])
-                )
-            ),
-            translate([0,0,-1])(
-                cylinder(r=10.0/2, h=32.0)
-            ),
-            translate([-22.0, -46.0/2, -13.0/2+25.0/2])(
-                rotate([0,90,0])(
-                    translate([0,0,-1])(
-                        cylinder(r=5.5/2, h=39+1)
-                    )
-                )
-            ),
-            translate([-22.0, -46.0/2, 13.0/2+25.0/2])(
-                rotate([0,90,0])(
-                    translate([0,0,-1])(
-                        cylinder(r=5.5/2, h=39+1)
-                    )
-                )
-            ),
-            translate([-22.0, 46.0/2, -13.0/2+25.0/2])(
-                rotate([0,90,0])(
-                    translate([0,0,-1])(
-                        cylinder(r=5.5/2, h=39+1)
-                    )
-                )
-            ),
-            translate([-22.0, 46.0/2, 13.0/2+25.0/2])(
-                rotate([0,90,0])(
-                    translate([0,0,-1])(
-                        cylinder(r=5.5/2, h=39+1)
-                    )
-                )
-            )
-            
-        )
-    )
 
 class BK10Bearing(AssemblyBase):
     def __init__(self, data={}):
@@ -1317,41 +2865,18 @@ class BK10Bearing(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        c = lookup('bk', 10)
+        return {
+            'shaft_axis' : connector_frame([0,0,0], [0,0,1]),
+            'mounting_face' : connector_frame([c['x0'],0,c['height']/2],
+                                              [-1,0,0]),
+        }
+
     def generate(self):
         return bk10()
 
 
-def bf10():
-    return color(Black)(
-        difference()(
-            union()(
-                translate([-22.0, -30.0, 0.0])(
-                    cube([32.5, 60.0, 20.0])
-                ),
-                translate([-34.0/2, -34.0/2, 0.0])(
-                    cube([34.0, 34.0, 20.0])
-                )
-            ),
-            translate([0,0,-1])(
-                cylinder(r=8.0/2, h=22.0)
-            ),
-            translate([-22.0, 46.0/2, 20.0/2])(
-                rotate([0,90,0])(
-                    translate([0,0,-1])(
-                        cylinder(r=5.5/2, h=39+1)
-                    )
-                )
-            ),
-            translate([-22.0, -46.0/2, 20.0/2])(
-                rotate([0,90,0])(
-                    translate([0,0,-1])(
-                        cylinder(r=5.5/2, h=39+1)
-                    )
-                )
-            )
-        )
-    )
-
 class BF10Bearing(AssemblyBase):
     def __init__(self, data={}):
         defaults = {
@@ -1362,45 +2887,18 @@ class BF10Bearing(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        c = lookup('bf', 10)
+        return {
+            'shaft_axis' : connector_frame([0,0,0], [0,0,1]),
+            'mounting_face' : connector_frame([c['x0'],0,c['height']/2],
+                                              [-1,0,0]),
+        }
+
     def generate(self):
         return bf10()
 
 
-def fk10():
-    return color(Black)(
-        difference()(
-            union()(
-                translate([-42.0/2, -42.0/2, 17.0])(
-                    cube([42.0, 42.0, 10.0])
-                ),
-                cylinder(r=34.0/2, h=17.0 + 1.0)
-            ),
-            translate([0,0,-1])(
-                cylinder(r=10.0/2, h=29.0)
-            ),
-            rotate([0,0,45])(
-                translate([42.0/2, 0, 16])(
-                    cylinder(r=4.0/2, h=14.0)
-                )
-            ),
-            rotate([0,0,45+90])(
-                translate([42.0/2, 0, 16])(
-                    cylinder(r=4.0/2, h=14.0)
-                )
-            ),
-            rotate([0,0,45+180])(
-                translate([42.0/2, 0, 16])(
-                    cylinder(r=4.0/2, h=14.0)
-                )
-            ),
-            rotate([0,0,45+270])(
-                translate([42.0/2, 0, 16])(
-                    cylinder(r=4.0/2, h=14.0)
-                )
-            )
-        )
-    )
-
 class FK10Bearing(AssemblyBase):
     def __init__(self, data={}):
         defaults = {
@@ -1411,45 +2909,18 @@ class FK10Bearing(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        c = lookup('fk', 10)
+        return {
+            'shaft_axis' : connector_frame([0,0,0], [0,0,1]),
+            'mounting_face' : connector_frame([0,0,c['spigot_height']],
+                                              [0,0,-1]),
+        }
+
     def generate(self):
         return fk10()
 
 
-def ff10():
-    return color(Black)(
-        difference()(
-            union()(
-                translate([-35.0/2, -35.0/2, 5.0])(
-                    cube([35.0, 35.0, 7.0])
-                ),
-                cylinder(r=28.0/2, h=5.0 + 1.0)
-            ),
-            translate([0,0,-1])(
-                cylinder(r=8.0/2, h=14.0)
-            ),
-            rotate([0,0,45])(
-                translate([35.0/2, 0, -1])(
-                    cylinder(r=4.0/2, h=14.0)
-                )
-            ),
-            rotate([0,0,45+90])(
-                translate([35.0/2, 0, -1])(
-                    cylinder(r=4.0/2, h=14.0)
-                )
-            ),
-            rotate([0,0,45+180])(
-                translate([35.0/2, 0, -1])(
-                    cylinder(r=4.0/2, h=14.0)
-                )
-            ),
-            rotate([0,0,45+270])(
-                translate([35.0/2, 0, -1])(
-                    cylinder(r=4.0/2, h=14.0)
-                )
-            )
-        )
-    )
-
 class FF10Bearing(AssemblyBase):
     def __init__(self, data={}):
         defaults = {
@@ -1460,60 +2931,18 @@ class FF10Bearing(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        c = lookup('ff', 10)
+        return {
+            'shaft_axis' : connector_frame([0,0,0], [0,0,1]),
+            'mounting_face' : connector_frame([0,0,c['spigot_height']],
+                                              [0,0,-1]),
+        }
+
     def generate(self):
         return ff10()
 
 
-    
-def gt2_pulley(nt, shaft_dia=8.0, belt_width=6.0):
-    d = nt * 2 / math.pi
-    ed = 16 / 12.7 * d
-    hub_h = 8.0
-    u = union()(
-        cylinder(r=ed/2, h=hub_h),
-        translate([0.0, 0.0, hub_h-0.5])(
-            cylinder(r=d/2, h=belt_width+1+1.0)
-        ),
-        translate([0.0, 0.0, hub_h + belt_width + 1])(
-            cylinder(r=ed/2, h=1.0),
-        )
-    )
-
-    u = difference()(
-        u,
-        translate([0,0,-1])(
-            cylinder(r=shaft_dia/2, h=hub_h + belt_width + 2)
-        )
-    )
-    return color(aluminium_colour)(u)
-
-def sk12():
-    u = union()(
-        translate([-20.0/2, -23, 0.0])(
-            cube([20.0, 37.5, 14.0])
-        ),
-        translate([-42.0/2, -23, 0.0])(
-            cube([42.0, 6.0, 14.0])
-        )
-    )
-    u = difference()(
-        u,
-        translate([0,0,-1])(
-            cylinder(r=12.0/2, h=16)
-        ),
-        translate([-32.0/2, -23.0+7, 14.0/2])(
-            rotate([90,0,0])(
-                cylinder(r=5.5/2, h=8)
-            )
-        ),
-        translate([32.0/2, -23.0+7, 14.0/2])(
-            rotate([90,0,0])(
-                cylinder(r=5.0/2, h=8)
-            )
-        ),
-    )
-    return color(aluminium_colour)(u)
-
 class SK12(AssemblyBase):
     def __init__(self, data={}):
         defaults = {
@@ -1524,6 +2953,14 @@ class SK12(AssemblyBase):
     def calculate(self):
         return True
 
+    def make_connectors(self):
+        c = lookup('sk', 12)
+        return {
+            'shaft_axis' : connector_frame([0,0,0], [0,0,1]),
+            'mounting_face' : connector_frame(
+                [0,-c['base_offset'],c['thickness']/2], [0,-1,0]),
+        }
+
     def generate(self):
         return sk12()
 
@@ -1568,32 +3005,41 @@ class SFU1204ScrewAssembly(AssemblyBase):
         self.add_child(self.floating_nut)
 
         return True
-        
-    def generate(self):
+
+    def place_children(self):
+        self.screw.set_transform(np.identity(4))
         if self.data['fixed_nut_type'] == 'bk':
-            kn = translate([0,0,self.data['screw_fixed_pos']-30])(
-                self.fixed_nut.generate()
-            )
-        elif self.data['fixed_nut_type'] == 'fk':
-            kn = translate([0,0,self.data['screw_fixed_pos']-27])(
-                self.fixed_nut.generate()
-            )
+            self.fixed_nut.set_transform(translation_matrix(
+                [0,0,self.data['screw_fixed_pos']-30]))
         else:
-            raise NotImplementedError
-        
+            self.fixed_nut.set_transform(translation_matrix(
+                [0,0,self.data['screw_fixed_pos']-27]))
         if self.data['floating_nut_type'] == 'bf':
-            fn = translate([0,0,self.data['screw_float_pos']])(
-                self.floating_nut.generate()
-            )
-        elif self.data['floating_nut_type'] == 'ff':
-            fn = translate([0,0,self.data['screw_float_pos']+12.0])(
-                mirror([0,0,1])(
-                    self.floating_nut.generate()
-                ))
+            self.floating_nut.set_transform(translation_matrix(
+                [0,0,self.data['screw_float_pos']]))
         else:
-            raise NotImplementedError
+            self.floating_nut.set_transform(
+                translation_matrix([0,0,self.data['screw_float_pos']+12.0])
+                .dot(mirror_matrix([0,0,1])))
+        
+    def make_connectors(self):
+        r = {
+            'screw_axis' : connector_frame([0,0,0], [0,0,1]),
+        }
+        if 'screw_input_bearing_mounting_face' in self.data:
+            r['screw_input_bearing_mounting_face'] = connector_frame(
+                [0,0,self.data['screw_input_bearing_mounting_face']],
+                [0,0,-1])
+        if 'screw_end_bearing_mounting_face' in self.data:
+            r['screw_end_bearing_mounting_face'] = connector_frame(
+                [0,0,self.data['screw_end_bearing_mounting_face']],
+                [0,0,1])
+        return r
 
-        return self.screw.generate() + kn + fn
+    def generate(self):
+        return (self.screw.generate_placed() +
+                self.fixed_nut.generate_placed() +
+                self.floating_nut.generate_placed())
     
 
 class MetricNut(AssemblyBase):
@@ -1608,45 +3054,21 @@ class MetricNut(AssemblyBase):
     
     def calculate(self):        
         self.inner_r = float(self.data['thread_size'])/2
-        code = int(float(self.data['thread_size'] * 10) + 0.5)
-        self.outer_r = {
-            10 : 2.887,
-            16 : 3.41,
-            20 : 4.32,
-            25 : 5.45,
-            30 : 6.01,
-            40 : 7.66,
-            50 : 8.79,
-            60 : 11.05,
-            80 : 14.38,
-            100 : 17.77,
-            120 : 20.03,
-            140 : 23.35,
-            160 : 26.75,
-            200 : 32.95
-        }[code] / 2
-        self.height = {
-            10 : 1.0,
-            16 : 1.3,
-            20 : 1.6,
-            25 : 2.0,
-            30 : 2.4,
-            40 : 3.2,
-            50 : 4.7,
-            60 : 5.2,
-            80 : 6.8,
-            100 : 8.4,
-            120 : 10.8,
-            140 : 12.8,
-            160 : 14.8,
-            200 : 18.0
-        }[code]
+        c = lookup('metric_nut', self.data['thread_size'])
+        self.outer_r = c['outer_dia'] / 2
+        self.height = c['height']
         self.height = self.height * self.data.get('height_scale', 1.0)
         self.data['height'] = self.height
         self.data['outer_dia'] = self.outer_r * 2
         self.data['outer_r'] = self.outer_r
         return True
         
+    def make_connectors(self):
+        return {
+            'bottom' : connector_frame([0,0,0], [0,0,-1]),
+            'top' : connector_frame([0,0,self.data['height']], [0,0,1]),
+        }
+
     def generate(self):
         return color(Steel)(
             difference()(
@@ -1657,3 +3079,100 @@ class MetricNut(AssemblyBase):
                 )
             )
         )
+
+
+class MetricWasher(AssemblyBase):
+
+    def __init__(self, data={}):
+        defaults = {
+        }
+        defaults.update(data)
+        AssemblyBase.__init__(self, "M%dWasher" % defaults['thread_size'],
+                              defaults)
+
+    def calculate(self):
+        c = lookup('metric_washer', self.data['thread_size'])
+        self.inner_r = c['inner_dia'] / 2
+        self.outer_r = c['outer_dia'] / 2
+        self.height = c['thickness']
+        self.data['height'] = self.height
+        self.data['outer_dia'] = c['outer_dia']
+        self.data['inner_dia'] = c['inner_dia']
+        return True
+
+    def make_connectors(self):
+        return {
+            'bottom' : connector_frame([0,0,0], [0,0,-1]),
+            'top' : connector_frame([0,0,self.data['height']], [0,0,1]),
+        }
+
+    def generate(self):
+        return color(Steel)(
+            difference()(
+                cylinder(r=self.outer_r, h=self.height),
+                translate([0,0,-1])(
+                    cylinder(r=self.inner_r, h=self.height+2)
+                )
+            )
+        )
+
+
+def pattern_count(data):
+    kind = data.get('pattern', 'explicit')
+    if kind == 'grid':
+        return int(data.get('nx', 1)) * int(data.get('ny', 1))
+    if kind == 'circular':
+        return int(data['count'])
+    return len(data['placements'])
+
+
+class FastenerPattern(AssemblyBase):
+    # Many identical bolts, nuts or washers as one node.  The fastener
+    # is generated once and placed by an OpenSCAD loop, and the BOM
+    # counts one item per placement.
+
+    def __init__(self, data={}):
+        defaults = {
+            'fastener' : 'bolt',
+            'pattern' : 'explicit',
+        }
+        defaults.update(data)
+        if defaults['fastener'] == 'bolt':
+            name = "M%dx%dBolt" % (defaults['thread_size'],
+                                   defaults['length'])
+        else:
+            name = "M%d%s" % (defaults['thread_size'],
+                              defaults['fastener'].capitalize())
+        AssemblyBase.__init__(self, name, defaults)
+
+    def calculate(self):
+        kind = self.data['fastener']
+        if kind == 'nut':
+            self.part = MetricNut({'thread_size' : self.data['thread_size']})
+        elif kind == 'washer':
+            self.part = MetricWasher({'thread_size' :
+                                      self.data['thread_size']})
+        elif kind == 'bolt':
+            self.part = None
+        else:
+            raise NotImplementedError, 'unknown fastener %s' % kind
+        if self.part is not None:
+            self.part.calculate()
+        return True
+
+    def bom_quantity(self):
+        return pattern_count(self.data)
+
+    def bom_data(self):
+        return dict([(k, v) for k, v in self.data.items()
+                     if k in ('fastener', 'thread_size', 'length')])
+
+    def generate_fastener(self):
+        if self.part is None:
+            return metric_bolt(self.data['thread_size'],
+                               self.data['length'])
+        return self.part._generate()
+
+    def generate(self):
+        return instance_loop(self.generate_fastener(),
+                             pattern_matrices(self.data))
@@ -0,0 +1,273 @@
+# Microbenchmarks for mech_lib.
+#
+#   python mech_lib_bench.py run [-o results.json] [--sizes 1000,10000]
+#   python mech_lib_bench.py compare baseline.json results.json
+#
+# run times tree operations on synthetic assemblies of each size and
+# every geometry factory (construction, SCAD rendering and SCAD size),
+# taking the best of --repeat runs, and writes the results as JSON.
+# compare prints the change against a baseline and exits 1 if anything
+# got slower, or its SCAD bigger, by more than --threshold.
+
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+import platform
+import argparse
+from timeit import default_timer as clock
+
+import mech_lib_geometry as m
+
+default_sizes = [1000, 10000, 100000]
+
+
+class SynthAssembly(m.AssemblyBase):
+    def calculate(self):
+        return True
+
+    def generate(self):
+        return m.union()(*[c.generate() for c in self.children])
+
+
+def build_tree(n, fanout=10):
+    # n nodes laid out as a heap: node k's parent is (k - 1) // fanout,
+    # the first ceil((n - 1) / fanout) are assemblies and the rest
+    # shafts, with names and data repeating so BOMs and ids group
+    internal = max(1, -(-(n - 1) // fanout))
+    nodes = []
+    for k in range(n):
+        if k < internal:
+            node = SynthAssembly('asm%d' % (k % 100),
+                                 {'level': k % 7} if k else
+                                 {'colour': m.Steel})
+        else:
+            node = m.GenericShaft('shaft%d' % (k % 1000),
+                                  {'dia': 6.0 + k % 5,
+                                   'length': 100.0 + k % 50})
+        nodes.append(node)
+        if k:
+            nodes[(k - 1) // fanout].add_child(node)
+    return nodes
+
+
+class quiet(object):
+    # gen_unique_ids prints a line per node
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def best_of(repeat, setup, run):
+    # best time of run(setup()) over repeat fresh setups
+    times = []
+    for i in range(repeat):
+        arg = setup()
+        with quiet():
+            t = clock()
+            run(arg)
+            times.append(clock() - t)
+    return min(times)
+
+
+def tree_benchmarks(n, repeat, save_limit):
+    # name -> seconds
+    def fresh():
+        return build_tree(n)
+
+    def ided():
+        nodes = build_tree(n)
+        with quiet():
+            nodes[0].gen_unique_ids()
+        return nodes
+
+    def calculated():
+        nodes = ided()
+        nodes[0].finalise_calcs()
+        return nodes
+
+    def get_data(nodes):
+        # found at the top from the last 1000 leaves, and missing
+        for node in nodes[-1000:]:
+            node.get_data('colour')
+        for i in range(10):
+            nodes[0].get_data('no_such_key')
+
+    def find_child(nodes):
+        for i in range(10):
+            nodes[0].find_child(nodes[-1 - i].identifier)
+
+    def save_components(nodes):
+        d = tempfile.mkdtemp()
+        try:
+            nodes[0].save_components(d)
+        finally:
+            shutil.rmtree(d)
+
+    r = {
+        'build': best_of(repeat, lambda: None, lambda a: build_tree(n)),
+        'get_data': best_of(repeat, ided, get_data),
+        'find_child': best_of(repeat, ided, find_child),
+        'gen_unique_ids': best_of(repeat, fresh,
+                                  lambda a: a[0].gen_unique_ids()),
+        'make_bom': best_of(repeat, ided, lambda a: a[0].make_bom()),
+        'make_grouped_bom': best_of(repeat, ided,
+                                    lambda a: a[0].make_grouped_bom()),
+        'finalise_calcs': best_of(repeat, ided,
+                                  lambda a: a[0].finalise_calcs()),
+    }
+    if n <= save_limit:
+        r['save_components'] = best_of(repeat, calculated, save_components)
+    return dict([('tree/%d/%s' % (n, k), {'seconds': v})
+                 for k, v in r.items()])
+
+
+catch_pts = [[0.0, 0.0], [10.0, 0.0], [10.0, 4.0], [0.0, 4.0]]
+
+factories = [
+    ('beam20x20', lambda: m.beam20x20(500.0)),
+    ('beam40x20', lambda: m.beam40x20(500.0)),
+    ('beam40x40', lambda: m.beam40x40(500.0)),
+    ('radial_extrude', lambda: m.radial_extrude(catch_pts, 20.0, 25.0)),
+    ('vert_rounded_cube', lambda: m.vert_rounded_cube([40, 30, 10], 3.0)),
+    ('rounded_cube', lambda: m.rounded_cube([40, 30, 10], 3.0)),
+    ('pipe', lambda: m.pipe(10.0, 8.0, 100.0)),
+    ('rounded_cylinder', lambda: m.rounded_cylinder(5.0, 50.0)),
+    ('rounded_slot', lambda: m.rounded_slot(30.0, 8.0, 5.0)),
+    ('make_catch', lambda: m.make_catch(5.0, 10.0, 1.0, 3.0)),
+    ('metric_bolt', lambda: m.metric_bolt(5, 20)),
+    ('mgn12_rail', lambda: m.mgn12_rail(300.0)),
+    ('mgn12h_slider', m.mgn12h_slider),
+    ('shaft', m.shaft),
+    ('linear_bearing_block_sc10uu', m.linear_bearing_block_sc10uu),
+    ('sbr12', lambda: m.sbr12(500.0)),
+    ('sbr12uu', m.sbr12uu),
+    ('sfu1204_screw', lambda: m.sfu1204_screw(500.0)),
+    ('sfu1204_screw_thread', lambda: m.sfu1204_screw(500.0, True)),
+    ('sfu1204_nut', m.sfu1204_nut),
+    ('lm12uu', m.lm12uu),
+    ('lm12luu', m.lm12luu),
+    ('lm10uu', m.lm10uu),
+    ('nema', m.nema),
+    ('bk10', m.bk10),
+    ('bf10', m.bf10),
+    ('fk10', m.fk10),
+    ('ff10', m.ff10),
+    ('gt2_pulley', lambda: m.gt2_pulley(20)),
+    ('sk12', m.sk12),
+]
+
+
+def factory_benchmarks(repeat):
+    # name -> seconds to build, seconds to render and SCAD bytes
+    r = {}
+    for name, fn in factories:
+        build = best_of(repeat, lambda: None, lambda a: fn())
+        shape = fn()
+        render = best_of(repeat, lambda: None,
+                         lambda a: m.scad_render(shape))
+        r['factory/%s' % name] = {'seconds': build}
+        r['scad/%s' % name] = {'seconds': render,
+                               'scad_bytes': len(m.scad_render(shape))}
+    return r
+
+
+def run(args):
+    sizes = [int(s) for s in args.sizes.split(',')]
+    results = {}
+    for n in sizes:
+        results.update(tree_benchmarks(n, args.repeat, args.save_limit))
+        print >>sys.stderr, 'tree %d done' % n
+    results.update(factory_benchmarks(args.repeat))
+    doc = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sizes': sizes,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output == '-':
+        json.dump(doc, sys.stdout, indent=1, sort_keys=True)
+    else:
+        f = open(args.output, 'w')
+        try:
+            json.dump(doc, f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+    for name in sorted(results):
+        e = results[name]
+        print >>sys.stderr, '%-40s %10.3fms %s' % (
+            name, e['seconds'] * 1e3,
+            '%dB' % e['scad_bytes'] if 'scad_bytes' in e else '')
+    return 0
+
+
+def compare(args):
+    base = json.load(open(args.baseline))['results']
+    new = json.load(open(args.results))['results']
+    regressions = []
+    for name in sorted(set(base) | set(new)):
+        if name not in new:
+            print '%-40s missing' % name
+            continue
+        if name not in base:
+            print '%-40s new' % name
+            continue
+        b, e = base[name], new[name]
+        flags = []
+        ratio = e['seconds'] / b['seconds'] if b['seconds'] else 1.0
+        if (ratio > 1 + args.threshold
+                and e['seconds'] - b['seconds'] > args.min_seconds):
+            flags.append('SLOWER')
+        line = '%-40s %10.3fms %10.3fms %+7.1f%%' % (
+            name, b['seconds'] * 1e3, e['seconds'] * 1e3,
+            (ratio - 1) * 100)
+        if 'scad_bytes' in b and 'scad_bytes' in e:
+            growth = float(e['scad_bytes']) / max(b['scad_bytes'], 1)
+            if growth > 1 + args.threshold:
+                flags.append('BIGGER')
+            line += ' %9dB %+7.1f%%' % (e['scad_bytes'], (growth - 1) * 100)
+        if flags:
+            regressions.append(name)
+        print line, ' '.join(flags)
+    if regressions:
+        print '%d regressions' % len(regressions)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='mech_lib microbenchmarks')
+    sub = p.add_subparsers()
+    r = sub.add_parser('run', help='run the benchmarks')
+    r.add_argument('-o', '--output', default='mech_lib_bench.json',
+                   help='results file, - for stdout')
+    r.add_argument('--sizes', default=','.join(map(str, default_sizes)),
+                   help='comma separated assembly sizes, in nodes')
+    r.add_argument('--repeat', type=int, default=3)
+    r.add_argument('--save-limit', type=int, default=1000,
+                   help='largest size to run save_components on')
+    r.set_defaults(func=run)
+    c = sub.add_parser('compare', help='compare results to a baseline')
+    c.add_argument('baseline')
+    c.add_argument('results')
+    c.add_argument('--threshold', type=float, default=0.2,
+                   help='fractional slowdown or growth flagged')
+    c.add_argument('--min-seconds', type=float, default=1e-4,
+                   help='ignore slowdowns smaller than this')
+    c.set_defaults(func=compare)
+    args = p.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,3626 @@
+# Geometry for mech_lib: SolidPython helpers, meshing, bounds, profiles,
+# toolpaths, placement, mates, interference, mass properties and the
+# shapes of the stock parts.  mech_lib imports this the first time a
+# part generates or is placed; "from mech_lib_geometry import *" gives
+# everything "from mech_lib import *" did before the split.  The mesh,
+# OpenSCAD, thread and material settings live here.
+
+import sys
+import os
+import math
+import struct
+import subprocess
+import tempfile
+from solid import *
+from solid.utils import *
+from solid import screw_thread
+import numpy as np
+
+import mech_lib
+from mech_lib import *
+
+
+def radial_extrude(pts, r_min, r_max):
+    src = rotate([0, 0, 90])(
+        rotate([90, 0, 0])(
+            linear_extrude(height=r_max-r_min,
+                           convexity=4)(polygon(pts))
+        )
+    )
+    xmin = min([e[0] for e in pts])
+    xmax = max([e[0] for e in pts])
+    ymin = min([e[1] for e in pts])
+    ymax = max([e[1] for e in pts])
+    x_range = (xmax-xmin)
+    y_range = (ymax-ymin)
+    a_range = x_range / r_min
+    a_step = math.radians(2.0)
+    x_step = x_range * a_step/a_range
+    a_min = xmin/r_min
+    l = []
+    a = a_min
+
+    while a < a_min + a_range + a_step:
+        offset_x = xmin + x_range * (a - a_min) / a_range
+        cut = translate([-1, -x_step/2, ymin-1])(
+            cube([r_max-r_min+2, x_step, y_range+2])
+        )
+        section = rotate([0,0,math.degrees(a)])(
+            translate([r_min, 0,0])(
+                intersection()(
+                    translate([0.0, -offset_x, 0])(src),
+                    cut
+                )
+            )
+        )
+        l.append(section)
+        a += a_step
+
+    if len(l) > 1:
+        l2 = []
+        for i in range(len(l) - 1):
+            l2.append(hull()(l[i], l[i+1]))
+    else:
+        l2 = l    
+    return union()(l2)
+
+
+def fit_to_radius(shape, xmin, xmax, ymin, ymax, r_min, z_max,
+                  a_step = math.radians(2.0)):
+    shape = rotate([0, 0, 90])(
+        rotate([90, 0, 0])(
+            shape
+        )
+    )
+    x_range = (xmax-xmin)
+    y_range = (ymax-ymin)
+    a_range = x_range / r_min
+    x_step = x_range * a_step/a_range
+    a_min = xmin/r_min
+    l = []
+    a = a_min
+
+    while a < a_min + a_range + a_step:
+        offset_x = xmin + x_range * (a - a_min) / a_range
+        cut = translate([-1, -x_step/2, ymin-1])(
+            cube([z_max+2, x_step, y_range+2])
+        )
+        section = rotate([0,0,math.degrees(a)])(
+            translate([r_min, 0,0])(
+                intersection()(
+                    translate([0.0, -offset_x, 0])(shape),
+                    cut
+                )
+            )
+        )
+        l.append(section)
+        a += a_step
+
+    if len(l) > 1:
+        l2 = []
+        for i in range(len(l) - 1):
+            l2.append(hull()(l[i], l[i+1]))
+    else:
+        l2 = l    
+    return union()(l2)
+
+
+def chamfer_edge(shape, pt1, pt2, radius, face_vec):
+    #print pt1, pt2
+    direction = np.array([pt2[0] - pt1[0],
+                          pt2[1] - pt1[1],
+                          pt2[2] - pt1[2]])
+    l = np.linalg.norm(direction)
+    if l < 1e-6:
+        print "Warning ignoring request to fillet zero-length edge", pt1, pt2
+        return shape
+    chamfer = translate([-radius,0, 0])(
+        difference()(
+            rotate([0,0,-45])(
+                translate([0,0,-1])(
+                    cube([2*radius, 2*radius, l+2.0]),
+                )
+            )
+        )
+    )
+    #return chamfer
+    #chamfer located at origin, along z axis, with region to be
+    #chamfer in neg X and neg Y.  Remap axes via transformation
+    #matrix
+    direction = direction / np.linalg.norm(direction)
+    face_vec = np.array(face_vec)
+    face_vec = face_vec / np.linalg.norm(face_vec)
+    face_vec2 = np.cross(face_vec, direction)#, face_vec)
+    #print direction, face_vec, face_vec2
+    chamfer = multmatrix(m = [[face_vec[0], face_vec2[0], direction[0], 0.0],
+                              [face_vec[1], face_vec2[1], direction[1], 0.0],
+                              [face_vec[2], face_vec2[2], direction[2], 0.0],
+                              [0.0, 0.0, 0.0, 1.0]])(chamfer)
+    
+    return difference()(
+        shape,
+        translate([pt1[0], pt1[1], pt1[2]])(chamfer)
+    )
+
+def fillet_edge(shape, pt1, pt2, radius, face_vec):
+    #print pt1, pt2
+    direction = np.array([pt2[0] - pt1[0],
+                          pt2[1] - pt1[1],
+                          pt2[2] - pt1[2]])
+    l = np.linalg.norm(direction)
+    if l < 1e-6:
+        print "Warning ignoring request to fillet zero-length edge", pt1, pt2
+        return shape
+    fillet = translate([-radius,-radius, 0])(
+        difference()(
+            translate([0,0,-1])(
+                cube([2*radius, 2*radius, l+2.0]),
+            ),
+            translate([0,0,-2.0])(
+                cylinder(r=radius, h=l+4.0)
+            )
+        )
+    )
+    #fillet located at origin, along z axis, with region to be
+    #filleted in neg X and neg Y.  Remap axes via transformation
+    #matrix
+    direction = direction / np.linalg.norm(direction)
+    face_vec = np.array(face_vec)
+    face_vec = face_vec / np.linalg.norm(face_vec)
+    face_vec2 = np.cross(face_vec, direction)#, face_vec)
+    #print direction, face_vec, face_vec2
+    fillet = multmatrix(m = [[face_vec[0], face_vec2[0], direction[0], 0.0],
+                             [face_vec[1], face_vec2[1], direction[1], 0.0],
+                             [face_vec[2], face_vec2[2], direction[2], 0.0],
+                             [0.0, 0.0, 0.0, 1.0]])(fillet)
+    
+    return difference()(
+        shape,
+        translate([pt1[0], pt1[1], pt1[2]])(fillet)
+    )
+
+
+def vert_rounded_cube(dims, radius):
+    r = cube(dims)
+    r = fillet_edge(r,
+                    [0.0, 0.0, 0.0],
+                    [0.0, 0.0, dims[2]],
+                    radius,
+                    [0.0, -1.0, 0.0])
+    r = fillet_edge(r,
+                    [dims[0], 0.0, 0.0],
+                    [dims[0], 0.0, dims[2]],
+                    radius,
+                    [1.0, 0.0, 0.0])
+    r = fillet_edge(r,
+                    [0.0, dims[1], 0.0],
+                    [0.0, dims[1], dims[2]],
+                    radius,
+                    [-1.0, 0.0, 0.0])
+    r = fillet_edge(r,
+                    [dims[0], dims[1], 0.0],
+                    [dims[0], dims[1], dims[2]],
+                    radius,
+                    [0.0, 1.0, 0.0])
+
+    return r
+
+def rounded_cube(dims, radius):
+    c1 = translate([0,0,radius])(
+        vert_rounded_cube([dims[0], dims[1], dims[2] - 2*radius], radius)
+    )
+    c2 = translate([0,dims[1]-radius,0])(
+        rotate([90, 0, 0])(
+            vert_rounded_cube([dims[0], dims[2], dims[1] - 2*radius], radius)
+        )
+    )
+    c3 = translate([dims[0]-radius,0,0])(
+        rotate([00, -90, 0])(
+            vert_rounded_cube([dims[2], dims[1], dims[0] - 2*radius], radius)
+        )
+    )
+    x1 = radius
+    y1 = radius
+    z1 = radius
+    x2 = dims[0] - radius
+    y2 = dims[1] - radius
+    z2 = dims[2] - radius
+    
+    s = sphere(radius)
+    return union()(
+        c1,
+        c2,
+        c3,
+        [translate([c[0],c[1],c[2]])(s) for c in [
+            [x1, y1, z1],
+            [x1, y1, z2],
+            [x1, y2, z1],
+            [x1, y2, z2],
+            [x2, y1, z1],
+            [x2, y1, z2],
+            [x2, y2, z1],
+            [x2, y2, z2]]]
+        
+    )
+
+
+def pipe(r_ext, r_int, l):
+    return difference()(
+        cylinder(r_ext, l),
+        translate([0,0,-0.1])(
+            cylinder(r_int, l+0.2)
+        )
+    )
+
+
+
+def rounded_cylinder(r, l):
+    return translate([0,0,-l/2])(
+        union()(
+            sphere(r),
+            cylinder(r, l),
+            translate([0,0,l])(
+                sphere(r)
+            )
+        )
+    )
+
+def make_routed_slot(pts, tool_dia, tolerance=None):
+    # tolerance is the largest chord error on the rounded ends
+    if tolerance is not None:
+        return list(routed_slots([pts], tool_dia, tolerance)[0])
+    import shapely
+    import shapely.geometry
+    l = shapely.geometry.LineString(pts)
+    p = l.buffer(distance=tool_dia/2, resolution=10)
+    #, cap_style=1, join_style=1)
+    pts = [(e[0],e[1]) for e in p.exterior.coords]
+    return pts
+
+
+def slot_resolution(tool_dia, tolerance):
+    # segments per quarter circle keeping chords within tolerance
+    r = tool_dia / 2.0
+    if tolerance >= r:
+        return 1
+    step = 2 * math.acos(1 - float(tolerance) / r)
+    return int(math.ceil(math.pi / 2 / step))
+
+
+_slot_cache = {}
+
+
+def routed_slots(paths, tool_dia, tolerance=0.01):
+    # closed outlines, as make_routed_slot() gives, of many paths cut
+    # with one tool.  Outlines are tuples shared through the cache, so
+    # copy before changing one.
+    keys = [(tuple([(float(p[0]), float(p[1])) for p in path]),
+             float(tool_dia), float(tolerance)) for path in paths]
+    missing = [k for k in set(keys) if k not in _slot_cache]
+    if missing:
+        import shapely.geometry
+        resolution = slot_resolution(tool_dia, tolerance)
+        for k in missing:
+            p = shapely.geometry.LineString(k[0]).buffer(
+                distance=tool_dia/2.0, resolution=resolution)
+            _slot_cache[k] = tuple([(e[0], e[1])
+                                    for e in p.exterior.coords])
+    return [_slot_cache[k] for k in keys]
+
+
+def make_catch(engage_dist, width, catch_depth, depth,
+               peak_height=None):
+    if peak_height is None:
+        peak_height = min(1.5, catch_depth*2)
+    pts = [
+        [0.0, 0.0],
+        [0.0, engage_dist],
+        [-catch_depth, engage_dist-0.1],
+        [-catch_depth, engage_dist+peak_height/3],
+        [0.0, engage_dist+peak_height],
+        [depth*0.9, engage_dist+peak_height/2],
+        [depth*1.1, 0.0],
+    ]
+    catch = linear_extrude(height=width, convexity=4)(polygon(pts))
+    catch = rotate([90,0,0])(translate([0,0,-width/2])(catch))
+    return catch
+
+
+# Mesh backend.  Tessellates the subset of the CSG tree that the simple
+# parts are built from (cube, cylinder, sphere, linear_extrude(polygon),
+# transforms and disjoint unions) straight into numpy arrays, so they can
+# be written as STL without a round trip through OpenSCAD.  Anything that
+# needs a real boolean raises NotMeshable and export_stl() falls back to
+# running OpenSCAD.
+
+# Fragment settings, chosen to match the '$fs = 0.01;' header written by
+# save_components (OpenSCAD's default $fa of 12 then dominates).
+mesh_fn = 0
+mesh_fa = 12.0
+mesh_fs = 0.01
+
+openscad_binary = 'openscad'
+
+
+class NotMeshable(Exception):
+    pass
+
+
+def get_fragments(r, fn=None):
+    # same rule as OpenSCAD's get_fragments_from_r()
+    if fn is None:
+        fn = mesh_fn
+    if r < 1e-8:
+        return 3
+    if fn > 0:
+        return int(max(fn, 3))
+    return int(math.ceil(max(min(360.0 / mesh_fa,
+                                 r * 2 * math.pi / mesh_fs), 5)))
+
+
+_stl_dtype = [('normal', '<f4', (3,)),
+              ('vertices', '<f4', (3, 3)),
+              ('attr', '<u2')]
+
+
+class Mesh(object):
+
+    def __init__(self, vertices=None, faces=None):
+        if vertices is None:
+            vertices = np.zeros((0, 3))
+        if faces is None:
+            faces = np.zeros((0, 3), dtype=int)
+        self.vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+        self.faces = np.asarray(faces, dtype=int).reshape(-1, 3)
+
+    @staticmethod
+    def concatenate(meshes):
+        meshes = [m for m in meshes if len(m.faces) > 0]
+        if len(meshes) == 0:
+            return Mesh()
+        if len(meshes) == 1:
+            return meshes[0]
+        offsets = np.cumsum([0] + [len(m.vertices) for m in meshes[:-1]])
+        return Mesh(np.concatenate([m.vertices for m in meshes]),
+                    np.concatenate([m.faces + o
+                                    for m, o in zip(meshes, offsets)]))
+
+    def transformed(self, m):
+        m = np.asarray(m, dtype=float)
+        v = self.vertices.dot(m[:3, :3].T) + m[:3, 3]
+        f = self.faces
+        if np.linalg.det(m[:3, :3]) < 0:
+            # mirrored - keep the faces pointing outwards
+            f = f[:, ::-1]
+        return Mesh(v, f)
+
+    def triangles(self):
+        return self.vertices[self.faces]
+
+    def normals(self):
+        t = self.triangles()
+        n = np.cross(t[:, 1] - t[:, 0], t[:, 2] - t[:, 0])
+        l = np.sqrt((n * n).sum(axis=1))
+        l[l == 0] = 1.0
+        return n / l[:, None]
+
+    def volume(self):
+        t = self.triangles()
+        return np.einsum('ij,ij->i', t[:, 0],
+                         np.cross(t[:, 1], t[:, 2])).sum() / 6.0
+
+    def write_stl(self, filename, header='mech_lib'):
+        rec = np.zeros(len(self.faces), dtype=_stl_dtype)
+        rec['normal'] = self.normals()
+        rec['vertices'] = self.triangles()
+        f = open(filename, 'wb')
+        f.write(struct.pack('<80sI', header[:80], len(rec)))
+        f.write(rec.tostring())
+        f.close()
+
+
+def _param(node, key, default=None):
+    v = node.params.get(key, None)
+    if v is None:
+        return default
+    return v
+
+
+def _node_segments(node):
+    fn = node.params.get('segments', None)
+    if fn is None:
+        # scad_render renames 'segments' in place
+        fn = node.params.get('$fn', None)
+    return fn
+
+
+def _rotation_matrix(axis, angle_deg):
+    axis = np.asarray(axis, dtype=float)
+    axis = axis / np.linalg.norm(axis)
+    a = math.radians(angle_deg)
+    c = math.cos(a)
+    s = math.sin(a)
+    x, y, z = axis
+    return np.array([[c + x*x*(1-c),   x*y*(1-c) - z*s, x*z*(1-c) + y*s],
+                     [y*x*(1-c) + z*s, c + y*y*(1-c),   y*z*(1-c) - x*s],
+                     [z*x*(1-c) - y*s, z*y*(1-c) + x*s, c + z*z*(1-c)]])
+
+
+# 4x4 matrices with the same meaning as the OpenSCAD transforms
+
+def translation_matrix(v):
+    m = np.identity(4)
+    m[:3, 3] = (list(v) + [0.0] * 3)[:3]
+    return m
+
+
+def rotation_matrix(a, v=None):
+    m = np.identity(4)
+    if isinstance(a, (list, tuple, np.ndarray)):
+        a = list(a) + [0.0] * 3
+        m[:3, :3] = _rotation_matrix([0, 0, 1], a[2]).dot(
+            _rotation_matrix([0, 1, 0], a[1])).dot(
+                _rotation_matrix([1, 0, 0], a[0]))
+    elif v is not None:
+        m[:3, :3] = _rotation_matrix(v, a)
+    else:
+        m[:3, :3] = _rotation_matrix([0, 0, 1], a)
+    return m
+
+
+def mirror_matrix(v):
+    n = np.array((list(v) + [0.0] * 3)[:3], dtype=float)
+    n = n / np.linalg.norm(n)
+    m = np.identity(4)
+    m[:3, :3] = np.identity(3) - 2 * np.outer(n, n)
+    return m
+
+
+class ScadExpr(object):
+    # OpenSCAD source used verbatim as a parameter value
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+
+def _scad_list(a):
+    # compact, exact OpenSCAD literal for a nested list of floats
+    if isinstance(a, list):
+        return '[' + ','.join([_scad_list(e) for e in a]) + ']'
+    return repr(float(a))
+
+
+def translations(points):
+    # (N, 4, 4) translations to each of points, (N, 2) or (N, 3)
+    p = np.asarray(points, dtype=float).reshape(len(points), -1)
+    m = np.tile(np.identity(4), (len(p), 1, 1))
+    m[:, :p.shape[1], 3] = p[:, :3]
+    return m
+
+
+def instance_loop(shape, matrices):
+    # One copy of shape placed by each of matrices, (N, 4, 4), as an
+    # OpenSCAD for loop.  Pure translations loop over offsets.
+    mats = np.asarray(matrices, dtype=float).reshape(-1, 4, 4)
+    if np.allclose(mats[:, :3, :3], np.identity(3)):
+        loop = OpenSCADObject('for', {
+            'p': ScadExpr(_scad_list(mats[:, :3, 3].tolist()))})
+        body = translate(v=ScadExpr('p'))
+    else:
+        loop = OpenSCADObject('for', {
+            'm': ScadExpr(_scad_list(mats.tolist()))})
+        body = multmatrix(m=ScadExpr('m'))
+    loop.loop_matrices = mats
+    return loop(body(shape))
+
+
+def mesh_polyhedron(mesh):
+    # a Mesh as an OpenSCAD polyhedron, written compactly and kept on
+    # the node for meshing and bounds
+    v = ','.join(['[%.5f,%.5f,%.5f]' % tuple(p)
+                  for p in mesh.vertices.tolist()])
+    # OpenSCAD wants faces clockwise seen from outside
+    f = ','.join(['[%d,%d,%d]' % tuple(t)
+                  for t in mesh.faces[:, ::-1].tolist()])
+    node = polyhedron(points=ScadExpr('[' + v + ']'),
+                      faces=ScadExpr('[' + f + ']'))
+    node.poly_mesh = mesh
+    return node
+
+
+def _loop_instances(node):
+    # (matrices, body) for a loop made by instance_loop(), else None
+    mats = getattr(node, 'loop_matrices', None)
+    if mats is None:
+        return None
+    return mats, _rendered_children(node.children[0])
+
+
+def node_matrix(node):
+    # 4x4 matrix applied by a transform node, or None if node is not a
+    # transform.
+    for v in node.params.values():
+        if isinstance(v, ScadExpr):
+            return None
+    m = np.identity(4)
+    if node.name == 'translate':
+        m = translation_matrix(_param(node, 'v', [0, 0, 0]))
+    elif node.name == 'rotate':
+        m = rotation_matrix(_param(node, 'a', 0.0), _param(node, 'v'))
+    elif node.name == 'mirror':
+        m = mirror_matrix(_param(node, 'v'))
+    elif node.name == 'scale':
+        v = _param(node, 'v', 1.0)
+        if not isinstance(v, (list, tuple, np.ndarray)):
+            v = [v, v, v]
+        v = list(v) + [1.0] * 3
+        m[:3, :3] = np.diag(v[:3])
+    elif node.name == 'multmatrix':
+        mm = np.array(_param(node, 'm'), dtype=float)
+        m[:mm.shape[0], :mm.shape[1]] = mm
+    else:
+        return None
+    return m
+
+
+def _signed_area(pts):
+    a = 0.0
+    for i in range(len(pts)):
+        x1, y1 = pts[i - 1]
+        x2, y2 = pts[i]
+        a += x1 * y2 - x2 * y1
+    return a / 2
+
+
+def _bridge_holes(outer, holes):
+    # Joins each hole to the outline with a zero-width bridge so the
+    # result can be ear clipped as one polygon.  Returns indices into
+    # outer + holes concatenated.
+    pts = list(outer)
+    for h in holes:
+        pts.extend(h)
+    edges = []
+    start = 0
+    for ring in [outer] + list(holes):
+        n = len(ring)
+        edges.extend([(start + i, start + (i + 1) % n) for i in range(n)])
+        start += n
+    edges = np.array(edges)
+    p = np.array(pts)
+    seg_a = p[edges[:, 0]]
+    seg_b = p[edges[:, 1]]
+
+    def visible(i, j):
+        # does segment i-j cross any polygon edge?
+        a, b = p[i], p[j]
+
+        def orient(u, v, w):
+            return ((v[..., 0] - u[..., 0]) * (w[..., 1] - u[..., 1]) -
+                    (v[..., 1] - u[..., 1]) * (w[..., 0] - u[..., 0]))
+        d1 = orient(a, b, seg_a)
+        d2 = orient(a, b, seg_b)
+        d3 = orient(seg_a, seg_b, a)
+        d4 = orient(seg_a, seg_b, b)
+        touching = ((edges[:, 0] == i) | (edges[:, 1] == i) |
+                    (edges[:, 0] == j) | (edges[:, 1] == j))
+        crossing = (d1 * d2 < 0) & (d3 * d4 < 0) & ~touching
+        return not crossing.any()
+
+    loop = list(range(len(outer)))
+    order = sorted(range(len(holes)),
+                   key=lambda k: -max(x for x, y in holes[k]))
+    offsets = np.cumsum([len(outer)] + [len(h) for h in holes])
+    for k in order:
+        hole = holes[k]
+        base = offsets[k]
+        m = max(range(len(hole)), key=lambda i: hole[i][0])
+        hm = base + m
+        cands = sorted(set(loop), key=lambda i: ((p[i] - p[hm]) ** 2).sum())
+        for c in cands:
+            if visible(c, hm):
+                break
+        else:
+            raise NotMeshable("Could not bridge polygon hole")
+        pos = loop.index(c)
+        ring = [base + (m + i) % len(hole) for i in range(len(hole))]
+        loop = loop[:pos + 1] + ring + [hm, c] + loop[pos + 1:]
+    return pts, loop
+
+
+def triangulate_polygon(pts, holes=()):
+    # Ear clipping.  pts is a simple anticlockwise outline without a
+    # repeated end point, holes are clockwise.  Returns index triples
+    # into pts + holes.
+    pts, idx = _bridge_holes([(float(x), float(y)) for x, y in pts],
+                             [[(float(x), float(y)) for x, y in h]
+                              for h in holes])
+
+    def cross(a, b, c):
+        return ((pts[b][0] - pts[a][0]) * (pts[c][1] - pts[a][1]) -
+                (pts[b][1] - pts[a][1]) * (pts[c][0] - pts[a][0]))
+
+    tris = []
+    while len(idx) > 3:
+        m = len(idx)
+        found = False
+        for k in range(m):
+            a, b, c = idx[k - 1], idx[k], idx[(k + 1) % m]
+            if cross(a, b, c) <= 0:
+                continue
+            corners = (pts[a], pts[b], pts[c])
+            ear = True
+            for p in idx:
+                if pts[p] in corners:
+                    continue
+                if (cross(a, b, p) >= 0 and cross(b, c, p) >= 0 and
+                    cross(c, a, p) >= 0):
+                    ear = False
+                    break
+            if ear:
+                tris.append((a, b, c))
+                del idx[k]
+                found = True
+                break
+        if not found:
+            # clip a degenerate (collinear) corner if there is one,
+            # keeping the surface closed, otherwise give up
+            for k in range(m):
+                a, b, c = idx[k - 1], idx[k], idx[(k + 1) % m]
+                if cross(a, b, c) == 0:
+                    tris.append((a, b, c))
+                    del idx[k]
+                    found = True
+                    break
+        if not found:
+            raise NotMeshable("Could not triangulate polygon")
+    tris.append(tuple(idx))
+    return tris
+
+
+def _is_simple(pts):
+    p = np.asarray(pts, dtype=float)
+    a = p
+    b = np.roll(p, -1, axis=0)
+
+    def orient(u, v, w):
+        return ((v[..., 0] - u[..., 0]) * (w[..., 1] - u[..., 1]) -
+                (v[..., 1] - u[..., 1]) * (w[..., 0] - u[..., 0]))
+    A, B = a[:, None], b[:, None]
+    d1 = orient(A, B, a[None, :])
+    d2 = orient(A, B, b[None, :])
+    return not ((d1 * d2 < 0) & (d1.T * d2.T < 0)).any()
+
+
+def _fill_regions(pts):
+    # Splits an outline into (outer, holes) regions using the even-odd
+    # rule OpenSCAD applies to self-intersecting polygons.  Outers are
+    # returned anticlockwise, holes clockwise.
+    if _is_simple(pts):
+        if _signed_area(pts) < 0:
+            pts = pts[::-1]
+        return [(pts, [])]
+    try:
+        import shapely.geometry
+        import shapely.ops
+    except ImportError:
+        raise NotMeshable("self-intersecting polygon needs shapely")
+    ring = shapely.geometry.LineString(list(pts) + [pts[0]])
+    faces = shapely.ops.polygonize(shapely.ops.unary_union(ring))
+    n = len(pts)
+    kept = []
+    for f in faces:
+        x, y = f.representative_point().coords[0]
+        inside = False
+        for i in range(n):
+            x1, y1 = pts[i - 1]
+            x2, y2 = pts[i]
+            if (y1 > y) != (y2 > y) and \
+               x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        if inside:
+            kept.append(f)
+    u = shapely.ops.unary_union(kept)
+    polys = getattr(u, 'geoms', [u])
+    r = []
+    for poly in polys:
+        poly = shapely.geometry.polygon.orient(poly)
+        r.append(([tuple(c) for c in poly.exterior.coords[:-1]],
+                  [[tuple(c) for c in i.coords[:-1]]
+                   for i in poly.interiors]))
+    return r
+
+
+def _circle_pts(r, n):
+    a = np.arange(n) * 2 * math.pi / n
+    return np.column_stack([r * np.cos(a), r * np.sin(a)])
+
+
+def _prism_mesh(pts, z0, z1, holes=(), tris=None):
+    # Straight extrusion of an anticlockwise 2D outline, with clockwise
+    # holes, between z0 and z1.
+    rings = [np.asarray(r, dtype=float) for r in [pts] + list(holes)]
+    if tris is None:
+        tris = triangulate_polygon(pts, holes)
+    tris = np.asarray(tris, dtype=int).reshape(-1, 3)
+    flat = np.concatenate(rings)
+    n = len(flat)
+    v = np.concatenate([np.column_stack([flat, np.full(n, z0)]),
+                        np.column_stack([flat, np.full(n, z1)])])
+    faces = [tris[:, ::-1], tris + n]
+    start = 0
+    for ring in rings:
+        i = np.arange(len(ring)) + start
+        j = np.roll(i, -1)
+        faces.append(np.column_stack([i, j, j + n]))
+        faces.append(np.column_stack([i, j + n, i + n]))
+        start += len(ring)
+    return Mesh(v, np.concatenate(faces))
+
+
+def _loft_rings(rings):
+    # Closes a stack of anticlockwise rings (bottom to top) into a
+    # solid.  A ring of radius zero collapses to a single apex vertex.
+    verts = []
+    ring_idx = []
+    for ring in rings:
+        if np.allclose(ring, ring[0]):
+            ring_idx.append(np.full(len(ring), len(verts), dtype=int))
+            verts.append(ring[0])
+        else:
+            ring_idx.append(np.arange(len(verts), len(verts) + len(ring)))
+            verts.extend(ring)
+    faces = []
+    for lo, hi in zip(ring_idx[:-1], ring_idx[1:]):
+        faces.append(np.column_stack([lo, np.roll(lo, -1), np.roll(hi, -1)]))
+        faces.append(np.column_stack([lo, np.roll(hi, -1), hi]))
+    for r, flip in ((ring_idx[0], True), (ring_idx[-1], False)):
+        fan = np.column_stack([np.full(len(r) - 2, r[0]), r[1:-1], r[2:]])
+        faces.append(fan[:, ::-1] if flip else fan)
+    f = np.concatenate(faces)
+    f = f[(f[:, 0] != f[:, 1]) & (f[:, 1] != f[:, 2]) & (f[:, 2] != f[:, 0])]
+    return Mesh(np.array(verts), f)
+
+
+def _cylinder_params(node):
+    r = _param(node, 'r', 1.0)
+    if _param(node, 'd') is not None:
+        r = _param(node, 'd') / 2.0
+    r1 = _param(node, 'r1', r)
+    r2 = _param(node, 'r2', r)
+    if _param(node, 'd1') is not None:
+        r1 = _param(node, 'd1') / 2.0
+    if _param(node, 'd2') is not None:
+        r2 = _param(node, 'd2') / 2.0
+    h = float(_param(node, 'h', 1.0))
+    z0 = -h / 2 if _param(node, 'center', False) else 0.0
+    n = get_fragments(max(r1, r2), _node_segments(node))
+    return float(r1), float(r2), z0, z0 + h, n
+
+
+def _cube_params(node):
+    size = _param(node, 'size', 1.0)
+    if not isinstance(size, (list, tuple, np.ndarray)):
+        size = [size, size, size]
+    size = np.array(size, dtype=float)
+    lo = -size / 2 if _param(node, 'center', False) else np.zeros(3)
+    return lo, lo + size
+
+
+def _sphere_params(node):
+    r = _param(node, 'r', 1.0)
+    if _param(node, 'd') is not None:
+        r = _param(node, 'd') / 2.0
+    return float(r), get_fragments(r, _node_segments(node))
+
+
+def _cube_mesh(node):
+    lo, hi = _cube_params(node)
+    pts = [(lo[0], lo[1]), (hi[0], lo[1]), (hi[0], hi[1]), (lo[0], hi[1])]
+    return _prism_mesh(pts, lo[2], hi[2], tris=[(0, 1, 2), (0, 2, 3)])
+
+
+def _cylinder_mesh(node):
+    r1, r2, z0, z1, n = _cylinder_params(node)
+    c = _circle_pts(1.0, n)
+    return _loft_rings([np.column_stack([c * r1, np.full(n, z0)]),
+                        np.column_stack([c * r2, np.full(n, z1)])])
+
+
+def _sphere_mesh(node):
+    r, n = _sphere_params(node)
+    rings = (n + 1) // 2
+    c = _circle_pts(1.0, n)
+    l = []
+    for i in reversed(range(rings)):
+        phi = math.pi * (i + 0.5) / rings
+        l.append(np.column_stack([c * r * math.sin(phi),
+                                  np.full(n, r * math.cos(phi))]))
+    return _loft_rings(l)
+
+
+def _outline_2d(node):
+    # single outline of a 2D child of linear_extrude
+    if node.name == 'polygon':
+        pts = [tuple(p[:2]) for p in _param(node, 'points')]
+        paths = _param(node, 'paths')
+        if paths is not None:
+            if len(paths) != 1:
+                raise NotMeshable("polygon with holes")
+            pts = [pts[i] for i in paths[0]]
+    elif node.name == 'square':
+        size = _param(node, 'size', 1.0)
+        if not isinstance(size, (list, tuple)):
+            size = [size, size]
+        w, h = float(size[0]), float(size[1])
+        x0, y0 = (-w/2, -h/2) if _param(node, 'center', False) else (0, 0)
+        pts = [(x0, y0), (x0 + w, y0), (x0 + w, y0 + h), (x0, y0 + h)]
+    elif node.name == 'circle':
+        r = _param(node, 'r', 1.0)
+        if _param(node, 'd') is not None:
+            r = _param(node, 'd') / 2.0
+        pts = [tuple(p) for p in
+               _circle_pts(r, get_fragments(r, _node_segments(node)))]
+    else:
+        raise NotMeshable("%s in linear_extrude" % node.name)
+    # drop repeated points, including a repeated start point
+    r = []
+    for p in pts:
+        if len(r) == 0 or p != r[-1]:
+            r.append(p)
+    if len(r) > 1 and r[0] == r[-1]:
+        r.pop()
+    return r
+
+
+def _extrude_mesh(node):
+    if (_param(node, 'twist', 0) or _param(node, 'scale', 1.0) != 1.0):
+        raise NotMeshable("twisted/scaled linear_extrude")
+    h = float(_param(node, 'height', 100.0))
+    z0 = -h / 2 if _param(node, 'center', False) else 0.0
+    meshes = []
+    for c in _rendered_children(node):
+        for outer, holes in _fill_regions(_outline_2d(c)):
+            meshes.append(_prism_mesh(outer, z0, z0 + h, holes))
+    return Mesh.concatenate(meshes)
+
+
+def _translated_cylinder(node):
+    # (x, y, z0, z1, r, n) for a straight cylinder reached through
+    # translate/colour nodes only, else None
+    offset = np.zeros(3)
+    while node.name in ('translate', 'color') and len(node.children) == 1:
+        if node.name == 'translate':
+            offset += node_matrix(node)[:3, 3]
+        node = node.children[0]
+    if node.name != 'cylinder':
+        return None
+    r1, r2, z0, z1, n = _cylinder_params(node)
+    if r1 != r2:
+        return None
+    return (offset[0], offset[1], offset[2] + z0, offset[2] + z1, r1, n)
+
+
+def _tube_mesh(outer, inner):
+    x, y, z0, z1, r_out, n_out = outer
+    r_in, n_in = inner[4], inner[5]
+    o = _circle_pts(r_out, n_out)
+    i = _circle_pts(r_in, n_in)
+    v = np.concatenate([np.column_stack([o, np.full(n_out, z0)]),
+                        np.column_stack([o, np.full(n_out, z1)]),
+                        np.column_stack([i, np.full(n_in, z0)]),
+                        np.column_stack([i, np.full(n_in, z1)])])
+    v[:, 0] += x
+    v[:, 1] += y
+    ob, ot = 0, n_out
+    ib, it = 2 * n_out, 2 * n_out + n_in
+    a = np.arange(n_out)
+    b = (a + 1) % n_out
+    c = np.arange(n_in)
+    d = (c + 1) % n_in
+    faces = [np.column_stack([ob + a, ob + b, ot + b]),
+             np.column_stack([ob + a, ot + b, ot + a]),
+             np.column_stack([ib + c, it + d, ib + d]),
+             np.column_stack([ib + c, it + c, it + d])]
+    # zip the two rings together by angle for the annular end caps
+    cap = []
+    j = 0
+    k = 0
+    while j < n_out or k < n_in:
+        if k == n_in or (j < n_out and
+                         float(j + 1) / n_out <= float(k + 1) / n_in):
+            cap.append((j, (j + 1) % n_out, n_out + k % n_in))
+            j += 1
+        else:
+            cap.append((j % n_out, n_out + (k + 1) % n_in, n_out + k))
+            k += 1
+    cap = np.array(cap)
+    top = np.where(cap < n_out, cap + ot, cap - n_out + it)
+    bottom = np.where(cap < n_out, cap + ob, cap - n_out + ib)[:, ::-1]
+    faces += [top, bottom]
+    return Mesh(v, np.concatenate(faces))
+
+
+def _bore_mesh(node):
+    # difference() of a cylinder and a coaxial through-bore, as made by
+    # pipe(), lm12uu() and MetricNut, is just a tube
+    children = _rendered_children(node)
+    if len(children) != 2:
+        return None
+    outer = _translated_cylinder(children[0])
+    inner = _translated_cylinder(children[1])
+    if outer is None or inner is None:
+        return None
+    if (abs(outer[0] - inner[0]) > 1e-9 or abs(outer[1] - inner[1]) > 1e-9
+        or inner[2] > outer[2] or inner[3] < outer[3]
+        or inner[4] >= outer[4] * math.cos(math.pi / outer[5])):
+        return None
+    return _tube_mesh(outer, inner)
+
+
+def _polyhedron_mesh(node):
+    mesh = getattr(node, 'poly_mesh', None)
+    if mesh is not None:
+        return mesh
+    faces = _param(node, 'faces', _param(node, 'triangles'))
+    # fans of OpenSCAD's clockwise faces
+    tris = [(f[0], f[i+1], f[i]) for f in faces
+            for i in range(1, len(f) - 1)]
+    return Mesh(_param(node, 'points'), tris)
+
+
+def _rendered_children(node):
+    return [c for c in node.children if c.modifier not in ('%', '*')]
+
+
+def _box_overlaps(boxes, tol=1e-6):
+    # index pairs of (lo, hi) boxes whose interiors overlap, by a sweep
+    # along x
+    if len(boxes) < 2:
+        return []
+    lo = np.array([b[0] for b in boxes], dtype=float)
+    hi = np.array([b[1] for b in boxes], dtype=float)
+    order = np.argsort(lo[:, 0], kind='mergesort')
+    lo, hi = lo[order], hi[order]
+    pairs = []
+    for i in range(len(lo) - 1):
+        n = np.searchsorted(lo[i+1:, 0], hi[i, 0] - tol)
+        if n == 0:
+            continue
+        j = np.arange(i + 1, i + 1 + n)
+        ov = ((np.minimum(hi[i], hi[j]) - np.maximum(lo[i], lo[j]))
+              > tol).all(axis=1)
+        pairs += [(order[i], order[k]) for k in j[ov]]
+    return pairs
+
+
+def _edges_cross(a, b, lo, hi, chunk=1000000):
+    # whether any edge of mesh a passes through a triangle of mesh b,
+    # looking only inside the box lo, hi
+    e = np.sort(np.concatenate([a.faces[:, [0, 1]], a.faces[:, [1, 2]],
+                                a.faces[:, [2, 0]]]), axis=1)
+    e = np.unique(e, axis=0)
+    p0, p1 = a.vertices[e[:, 0]], a.vertices[e[:, 1]]
+    keep = ((np.minimum(p0, p1) <= hi).all(axis=1) &
+            (np.maximum(p0, p1) >= lo).all(axis=1))
+    p0, d = p0[keep], (p1 - p0)[keep]
+    t = b.triangles()
+    keep = ((t.min(axis=1) <= hi).all(axis=1) &
+            (t.max(axis=1) >= lo).all(axis=1))
+    t = t[keep]
+    if len(p0) == 0 or len(t) == 0:
+        return False
+    eps = 1e-9
+    step = max(1, chunk // len(p0))
+    for s in range(0, len(t), step):
+        v0 = t[s:s + step, 0]
+        e1 = t[s:s + step, 1] - v0
+        e2 = t[s:s + step, 2] - v0
+        # Moller-Trumbore for every edge against every triangle
+        h = np.cross(d[:, None], e2[None])
+        det = (e1[None] * h).sum(axis=2)
+        ok = np.abs(det) > 1e-12
+        det[~ok] = 1.0
+        w = p0[:, None] - v0[None]
+        u = (w * h).sum(axis=2) / det
+        q = np.cross(w, e1[None])
+        v = (d[:, None] * q).sum(axis=2) / det
+        tt = (e2[None] * q).sum(axis=2) / det
+        hit = (ok & (u > eps) & (v > eps) & (u + v < 1 - eps) &
+               (tt > eps) & (tt < 1 - eps))
+        if hit.any():
+            return True
+    return False
+
+
+def _shells_overlap(a, b):
+    # whether two closed meshes share any volume; ones that only touch
+    # don't
+    lo = np.maximum(a.vertices.min(axis=0), b.vertices.min(axis=0))
+    hi = np.minimum(a.vertices.max(axis=0), b.vertices.max(axis=0))
+    if ((hi - lo) <= 1e-6).any():
+        return False
+    for x, y in ((a, b), (b, a)):
+        v = x.vertices
+        v = v[((v > lo) & (v < hi)).all(axis=1)]
+        if len(v) and points_inside(y, v).any():
+            return True
+    if _edges_cross(a, b, lo, hi) or _edges_cross(b, a, lo, hi):
+        return True
+    # flush faces hide overlaps from both tests above, so also try a
+    # coarse grid of the shared box
+    pts = _sample_grid(lo, hi, 1000)[0]
+    inside = points_inside(a, pts)
+    return points_inside(b, pts[inside]).any()
+
+
+def _disjoint_union(meshes):
+    # one mesh of shells that mustn't overlap, or NotMeshable so that
+    # OpenSCAD does the real union
+    meshes = [m for m in meshes if len(m.faces) > 0]
+    boxes = [(m.vertices.min(axis=0), m.vertices.max(axis=0))
+             for m in meshes]
+    for i, j in _box_overlaps(boxes):
+        if _shells_overlap(meshes[i], meshes[j]):
+            raise NotMeshable("overlapping union")
+    return Mesh.concatenate(meshes)
+
+
+def _mesh_node(node):
+    if node.is_hole:
+        raise NotMeshable("hole()")
+    name = node.name
+    if name in ('color', 'union', 'part', 'render'):
+        return _disjoint_union([_mesh_node(c)
+                                for c in _rendered_children(node)])
+    loop = _loop_instances(node)
+    if loop is not None:
+        body = _disjoint_union([_mesh_node(c) for c in loop[1]])
+        return _disjoint_union([body.transformed(m) for m in loop[0]])
+    m = node_matrix(node)
+    if m is not None:
+        return _disjoint_union([_mesh_node(c)
+                                for c in _rendered_children(node)]
+                               ).transformed(m)
+    if name == 'cube':
+        return _cube_mesh(node)
+    if name == 'cylinder':
+        return _cylinder_mesh(node)
+    if name == 'sphere':
+        return _sphere_mesh(node)
+    if name == 'linear_extrude':
+        return _extrude_mesh(node)
+    if name == 'polyhedron':
+        return _polyhedron_mesh(node)
+    if name == 'difference':
+        r = _bore_mesh(node)
+        if r is not None:
+            return r
+    raise NotMeshable("%s needs OpenSCAD" % name)
+
+
+def to_mesh(shape):
+    return _mesh_node(shape)
+
+
+def openscad_export(shape, filename):
+    fd, scad_fn = tempfile.mkstemp(suffix='.scad')
+    os.close(fd)
+    try:
+        t = mech_lib._tracer
+        s = t.begin() if t is not None else None
+        try:
+            scad_render_to_file(shape,
+                                filepath=scad_fn,
+                                include_orig_code=False,
+                                file_header='$fs = 0.01;')
+        finally:
+            if t is not None:
+                t.end('scad_render', None, s)
+        s = t.begin() if t is not None else None
+        try:
+            subprocess.check_call([openscad_binary, '-o', filename, scad_fn])
+        finally:
+            if t is not None:
+                t.end('openscad', None, s)
+    finally:
+        os.unlink(scad_fn)
+
+
+def export_stl(shape, filename, fallback=True):
+    # Returns 'mesh' if the numpy backend wrote the file, 'openscad' if
+    # it had to fall back to rendering through OpenSCAD.
+    try:
+        mesh = to_mesh(shape)
+    except NotMeshable:
+        if not fallback:
+            raise
+        openscad_export(shape, filename)
+        return 'openscad'
+    mesh.write_stl(filename)
+    return 'mesh'
+
+
+def read_stl(filename):
+    data = open(filename, 'rb').read()
+    if len(data) >= 84:
+        n = struct.unpack('<I', data[80:84])[0]
+    else:
+        n = -1
+    if len(data) == 84 + 50 * n:
+        rec = np.frombuffer(data, dtype=_stl_dtype, count=n, offset=84)
+        tris = rec['vertices'].astype(float).reshape(-1, 3)
+    else:
+        tris = np.array([[float(e) for e in l.split()[1:4]]
+                         for l in data.splitlines()
+                         if l.strip().startswith('vertex')]).reshape(-1, 3)
+    v, inv = np.unique(tris, axis=0, return_inverse=True)
+    return Mesh(v, inv.reshape(-1, 3))
+
+
+def openscad_mesh(shape):
+    fd, stl_fn = tempfile.mkstemp(suffix='.stl')
+    os.close(fd)
+    try:
+        openscad_export(shape, stl_fn)
+        return read_stl(stl_fn)
+    finally:
+        os.unlink(stl_fn)
+
+
+def shape_mesh(shape, fallback=True):
+    try:
+        return to_mesh(shape)
+    except NotMeshable:
+        if not fallback:
+            raise
+    try:
+        return openscad_mesh(shape)
+    except (OSError, subprocess.CalledProcessError), e:
+        raise NotMeshable("OpenSCAD failed: %s" % e)
+
+
+def points_inside(mesh, pts, chunk=2000000):
+    # Winding number along vertical rays against closed, outward facing
+    # shells: each face above a point counts +1 facing up and -1 facing
+    # down, and a point is inside if the sum is positive, which also
+    # holds where shells overlap.  Points sharing an (x, y) column share
+    # a ray, so a grid of samples costs one ray per column.
+    pts = np.asarray(pts, dtype=float).reshape(-1, 3)
+    r = np.zeros(len(pts), dtype=bool)
+    tris = mesh.triangles()
+    if len(tris) == 0 or len(pts) == 0:
+        return r
+    cols, inv = np.unique(pts[:, 0] + 1j * pts[:, 1], return_inverse=True)
+    cols = np.column_stack([cols.real, cols.imag])
+    tlo = tris[:, :, :2].min(axis=1)
+    thi = tris[:, :, :2].max(axis=1)
+    keep = ((tlo <= cols.max(axis=0)).all(axis=1) &
+            (thi >= cols.min(axis=0)).all(axis=1))
+    tris = tris[keep]
+    a, b, c = tris[:, 0], tris[:, 1], tris[:, 2]
+    # barycentric setup for the xy projection of each triangle, whose
+    # sign is that of the face normal's z
+    d = ((b[:, 1] - c[:, 1]) * (a[:, 0] - c[:, 0]) +
+         (c[:, 0] - b[:, 0]) * (a[:, 1] - c[:, 1]))
+    ok = d != 0
+    a, b, c, d = a[ok], b[ok], c[ok], d[ok]
+    if len(a) == 0:
+        return r
+    sign = np.sign(d)
+    step = max(1, chunk // len(a))
+    floor = min(pts[:, 2].min(), a[:, 2].min(), b[:, 2].min(),
+                c[:, 2].min()) - 1.0
+    span = max(pts[:, 2].max(), a[:, 2].max(), b[:, 2].max(),
+               c[:, 2].max()) - floor + 1.0
+    for s in range(0, len(cols), step):
+        p = cols[s:s + step, None, :]
+        l1 = ((b[:, 1] - c[:, 1]) * (p[..., 0] - c[:, 0]) +
+              (c[:, 0] - b[:, 0]) * (p[..., 1] - c[:, 1])) / d
+        l2 = ((c[:, 1] - a[:, 1]) * (p[..., 0] - c[:, 0]) +
+              (a[:, 0] - c[:, 0]) * (p[..., 1] - c[:, 1])) / d
+        l3 = 1.0 - l1 - l2
+        z = l1 * a[:, 2] + l2 * b[:, 2] + l3 * c[:, 2]
+        z[(l1 < 0) | (l2 < 0) | (l3 < 0)] = floor
+        # sum the signs above each point with one searchsorted over the
+        # sorted rows, each row shifted into its own band
+        order = np.argsort(z, axis=1)
+        rows = np.arange(len(z))[:, None]
+        z = z[rows, order] - floor + rows * span
+        w = sign[order]
+        # w[:, k:].sum() for every k, and 0 past the end
+        above = np.zeros((len(z), z.shape[1] + 1))
+        above[:, :-1] = np.cumsum(w[:, ::-1], axis=1)[:, ::-1]
+        sel = (inv >= s) & (inv < s + step)
+        row = inv[sel] - s
+        q = pts[sel, 2] - floor + row * span
+        k = np.searchsorted(z.ravel(), q, side='right') - row * z.shape[1]
+        r[sel] = above[row, k] > 0
+    return r
+
+
+# Analytic axis-aligned bounds.  Boxes are (lo, hi) pairs of numpy
+# arrays, or None for empty geometry.  Curved primitives use their true
+# radius, so the result may be slightly larger than the tessellation.
+
+def _box_union(boxes):
+    boxes = [b for b in boxes if b is not None]
+    if len(boxes) == 0:
+        return None
+    return (np.min([b[0] for b in boxes], axis=0),
+            np.max([b[1] for b in boxes], axis=0))
+
+
+def transform_bbox(box, m):
+    if box is None:
+        return None
+    lo, hi = box
+    corners = np.array([[x, y, z] for x in (lo[0], hi[0])
+                        for y in (lo[1], hi[1]) for z in (lo[2], hi[2])])
+    m = np.asarray(m, dtype=float)
+    c = corners.dot(m[:3, :3].T) + m[:3, 3]
+    return c.min(axis=0), c.max(axis=0)
+
+
+def _points_bbox(pts):
+    p = np.array([(list(e) + [0.0])[:3] for e in pts], dtype=float)
+    if len(p) == 0:
+        return None
+    return p.min(axis=0), p.max(axis=0)
+
+
+def shape_bbox(node):
+    if node.is_hole:
+        return None
+    name = node.name
+    children = _rendered_children(node)
+    m = node_matrix(node)
+    if m is not None:
+        return transform_bbox(_box_union([shape_bbox(c) for c in children]),
+                              m)
+    if name in ('color', 'union', 'part', 'render', 'hull'):
+        return _box_union([shape_bbox(c) for c in children])
+    loop = _loop_instances(node)
+    if loop is not None:
+        b = _box_union([shape_bbox(c) for c in loop[1]])
+        if b is None:
+            return None
+        return _box_union([transform_bbox(b, m) for m in loop[0]])
+    if name == 'difference':
+        return shape_bbox(children[0]) if children else None
+    if name == 'intersection':
+        boxes = [shape_bbox(c) for c in children]
+        if len(boxes) == 0 or None in boxes:
+            return None
+        lo = np.max([b[0] for b in boxes], axis=0)
+        hi = np.min([b[1] for b in boxes], axis=0)
+        if (lo > hi).any():
+            return None
+        return lo, hi
+    if name == 'minkowski':
+        boxes = [shape_bbox(c) for c in children]
+        if len(boxes) == 0 or None in boxes:
+            return None
+        return (np.sum([b[0] for b in boxes], axis=0),
+                np.sum([b[1] for b in boxes], axis=0))
+    if name == 'cube':
+        return _cube_params(node)
+    if name == 'cylinder':
+        r1, r2, z0, z1, n = _cylinder_params(node)
+        r = max(r1, r2)
+        return np.array([-r, -r, z0]), np.array([r, r, z1])
+    if name == 'sphere':
+        r = _sphere_params(node)[0]
+        return np.array([-r, -r, -r]), np.array([r, r, r])
+    if name == 'polyhedron':
+        mesh = getattr(node, 'poly_mesh', None)
+        if mesh is not None:
+            return _points_bbox(mesh.vertices)
+        return _points_bbox(_param(node, 'points'))
+    if name in ('polygon', 'square', 'circle'):
+        return _points_bbox(_outline_2d(node))
+    if name == 'offset':
+        b = _box_union([shape_bbox(c) for c in children])
+        if b is None:
+            return None
+        d = abs(_param(node, 'r', _param(node, 'delta', 0.0)))
+        return b[0] - [d, d, 0], b[1] + [d, d, 0]
+    if name == 'projection':
+        b = _box_union([shape_bbox(c) for c in children])
+        if b is None:
+            return None
+        return b[0] * [1, 1, 0], b[1] * [1, 1, 0]
+    if name == 'linear_extrude':
+        b = _box_union([shape_bbox(c) for c in children])
+        if b is None:
+            return None
+        h = float(_param(node, 'height', 100.0))
+        z0 = -h / 2 if _param(node, 'center', False) else 0.0
+        lo, hi = b[0].copy(), b[1].copy()
+        if _param(node, 'twist', 0):
+            r = np.abs(np.concatenate([lo[:2], hi[:2]])).max() * math.sqrt(2)
+            lo[:2], hi[:2] = -r, r
+        s = _param(node, 'scale', 1.0)
+        s = max(np.max(s), 1.0)
+        lo[:2] = np.minimum(lo[:2], lo[:2] * s)
+        hi[:2] = np.maximum(hi[:2], hi[:2] * s)
+        lo[2], hi[2] = z0, z0 + h
+        return lo, hi
+    if name == 'rotate_extrude':
+        b = _box_union([shape_bbox(c) for c in children])
+        if b is None:
+            return None
+        r = max(abs(b[0][0]), abs(b[1][0]))
+        return np.array([-r, -r, b[0][1]]), np.array([r, r, b[1][1]])
+    raise NotImplementedError, "Can't bound %s" % name
+
+
+def _find_placed(node, m, shapes, out):
+    c = shapes.get(id(node), None)
+    if c is not None and c not in out:
+        out[c] = m
+    tm = node_matrix(node)
+    if tm is not None:
+        m = m.dot(tm)
+    for child in node.children:
+        _find_placed(child, m, shapes, out)
+
+
+# 2D profiles of flat parts, written straight to DXF or SVG.  A profile
+# is a dict of 'outline' (closed list of x, y), optional 'cutouts'
+# (closed inner outlines), 'holes' ((N, 3) of x, y, dia) and 'slots'
+# ((N, 5) of x, y, length, angle, width, as for hole_pattern()).
+
+def slot_outline(x, y, length, angle, width):
+    # points and bulges of a closed slot outline, ends as true arcs
+    r = width / 2.0
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    pts = [(x + c*px - s*py, y + s*px + c*py) for px, py in
+           ((0.0, -r), (length, -r), (length, r), (0.0, r))]
+    return pts, [0.0, 1.0, 0.0, 1.0]
+
+
+def _profile_arrays(profile):
+    holes = np.asarray(profile.get('holes', []), dtype=float).reshape(-1, 3)
+    slots = np.asarray(profile.get('slots', []), dtype=float).reshape(-1, 5)
+    return holes, slots
+
+
+def profile_bounds(profile):
+    holes, slots = _profile_arrays(profile)
+    pts = [np.asarray(profile['outline'], dtype=float)[:, :2]]
+    for c in profile.get('cutouts', []):
+        pts.append(np.asarray(c, dtype=float)[:, :2])
+    if len(holes):
+        r = holes[:, 2:3] / 2
+        pts += [holes[:, :2] - r, holes[:, :2] + r]
+    if len(slots):
+        a = np.radians(slots[:, 3])
+        end = slots[:, :2] + slots[:, 2:3] * np.column_stack(
+            [np.cos(a), np.sin(a)])
+        r = slots[:, 4:5] / 2
+        pts += [slots[:, :2] - r, slots[:, :2] + r, end - r, end + r]
+    pts = np.concatenate(pts)
+    return pts.min(axis=0), pts.max(axis=0)
+
+
+class _DXFWriter(object):
+    # minimal R12 DXF, which every CAM package reads: the drawing
+    # extents in the HEADER, so viewers open zoomed to the part, then
+    # the ENTITIES
+    def __init__(self, f, bounds):
+        self.f = f
+        lo, hi = bounds
+        f.write('0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n'
+                '9\n$EXTMIN\n10\n%.6f\n20\n%.6f\n30\n0.0\n'
+                '9\n$EXTMAX\n10\n%.6f\n20\n%.6f\n30\n0.0\n'
+                '0\nENDSEC\n'
+                % (lo[0], lo[1], hi[0], hi[1]))
+        f.write('0\nSECTION\n2\nENTITIES\n')
+
+    def polyline(self, pts, layer, bulges=None):
+        w = self.f.write
+        w('0\nPOLYLINE\n8\n%s\n66\n1\n10\n0.0\n20\n0.0\n30\n0.0\n70\n1\n'
+          % layer)
+        for i, p in enumerate(pts):
+            w('0\nVERTEX\n8\n%s\n10\n%.6f\n20\n%.6f\n30\n0.0\n'
+              % (layer, p[0], p[1]))
+            if bulges is not None and bulges[i]:
+                w('42\n%.6f\n' % bulges[i])
+        w('0\nSEQEND\n8\n%s\n' % layer)
+
+    def circles(self, holes, layer):
+        t = '0\nCIRCLE\n8\n%s\n10\n%%.6f\n20\n%%.6f\n30\n0.0\n40\n%%.6f\n' \
+            % layer
+        self.f.write(''.join([t % (x, y, d/2) for x, y, d in
+                              holes.tolist()]))
+
+    def close(self):
+        self.f.write('0\nENDSEC\n0\nEOF\n')
+
+
+class _SVGWriter(object):
+    # y up, in mm, one path per contour
+    def __init__(self, f, bounds):
+        self.f = f
+        lo, hi = bounds
+        w, h = hi - lo
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<svg xmlns="http://www.w3.org/2000/svg" '
+                'width="%.6fmm" height="%.6fmm" '
+                'viewBox="%.6f %.6f %.6f %.6f">\n'
+                '<g transform="scale(1,-1)" fill="none" stroke="black" '
+                'stroke-width="0.1">\n'
+                % (w, h, lo[0], -hi[1], w, h))
+
+    def polyline(self, pts, layer, bulges=None):
+        d = ['M%.6f %.6f' % tuple(pts[0][:2])]
+        n = len(pts)
+        for i in range(n):
+            p, q = pts[i], pts[(i + 1) % n]
+            b = 0.0 if bulges is None else bulges[i]
+            if b:
+                chord = math.hypot(q[0] - p[0], q[1] - p[1])
+                r = chord * (1 + b*b) / (4 * abs(b))
+                d.append('A%.6f %.6f 0 %d %d %.6f %.6f'
+                         % (r, r, abs(b) > 1, b > 0, q[0], q[1]))
+            elif i < n - 1:
+                d.append('L%.6f %.6f' % (q[0], q[1]))
+        self.f.write('<path class="%s" d="%s Z"/>\n' % (layer, ' '.join(d)))
+
+    def circles(self, holes, layer):
+        t = '<circle class="%s" cx="%%.6f" cy="%%.6f" r="%%.6f"/>\n' % layer
+        self.f.write(''.join([t % (x, y, d/2) for x, y, d in
+                              holes.tolist()]))
+
+    def close(self):
+        self.f.write('</g>\n</svg>\n')
+
+
+profile_writers = {
+    'dxf' : _DXFWriter,
+    'svg' : _SVGWriter,
+}
+
+
+def write_profile(profile, f, format='dxf'):
+    # contours are written as they're generated, on layers OUTLINE,
+    # CUTOUTS, HOLES and SLOTS
+    def contour(pts):
+        # drop a repeated start point, as make_routed_slot() gives; CAM
+        # can't cut a contour that crosses itself
+        pts = [tuple(p[:2]) for p in pts]
+        if len(pts) > 1 and pts[0] == pts[-1]:
+            pts.pop()
+        if not _is_simple(pts):
+            raise ValueError, "profile contour crosses itself"
+        return pts
+
+    holes, slots = _profile_arrays(profile)
+    w = profile_writers[format](f, profile_bounds(profile))
+    w.polyline(contour(profile['outline']), 'OUTLINE')
+    for c in profile.get('cutouts', []):
+        w.polyline(contour(c), 'CUTOUTS')
+    if len(holes):
+        w.circles(holes, 'HOLES')
+    for s in slots.tolist():
+        pts, bulges = slot_outline(*s)
+        w.polyline(pts, 'SLOTS', bulges)
+    w.close()
+
+
+# CNC toolpaths.  Holes are grouped per drill and routed paths (e.g.
+# the centre lines given to make_routed_slot()) per cutter, with a tool
+# change between groups; holes within a group are toured nearest
+# neighbour first and then improved with 2-opt.  Distances are in mm,
+# feeds in mm/min and times in seconds.
+
+default_machine = {
+    'rapid' : 5000.0,
+    'feed' : 1000.0,
+    'plunge' : 300.0,
+    'tool_change' : 10.0,
+    'safe_z' : 5.0,
+    'depth' : 6.0,
+}
+
+
+def _kd_tree():
+    # scipy is only needed for drill tours, so say so rather than fail
+    # somewhere inside toolpath()
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        raise ImportError, "drill tours need scipy (scipy.spatial)"
+    return cKDTree
+
+
+def _nn_tour(pts, start):
+    cKDTree = _kd_tree()
+    n = len(pts)
+    visited = np.zeros(n, dtype=bool)
+    ids = np.arange(n)
+    tree = cKDTree(pts)
+    gone = 0
+    order = []
+    p = start
+    for _ in xrange(n):
+        k = 8
+        while True:
+            kk = min(k, len(ids))
+            j = np.atleast_1d(tree.query(p, kk)[1])
+            free = j[~visited[ids[j]]]
+            if len(free):
+                break
+            k *= 4
+        nxt = ids[free[0]]
+        visited[nxt] = True
+        order.append(nxt)
+        p = pts[nxt]
+        gone += 1
+        # rebuild without the visited points once they're half the tree
+        if gone * 2 > len(ids) and len(ids) > 64:
+            ids = ids[~visited[ids]]
+            tree = cKDTree(pts[ids])
+            gone = 0
+    return np.array(order, dtype=int)
+
+
+def _two_opt(pts, order, start, neighbours):
+    # 2-opt over an open path from start, trying only moves which join
+    # a point to one of its nearest neighbours
+    import collections
+    n = len(pts)
+    k = min(neighbours, n - 1)
+    # the point itself needn't come first among equally near ones, so
+    # drop it wherever it is
+    near = [[c for c in row if c != a] for a, row in
+            enumerate(_kd_tree()(pts).query(pts, k + 1)[1].tolist())]
+    xy = pts.tolist() + [list(start)]
+    t = np.concatenate([[n], order])
+    pos = np.empty(n + 1, dtype=int)
+    pos[t] = np.arange(n + 1)
+
+    def d(a, b):
+        if a is None or b is None:
+            return 0.0
+        p, q = xy[a], xy[b]
+        return math.hypot(p[0] - q[0], p[1] - q[1])
+
+    def at(i):
+        return int(t[i]) if 0 <= i <= n else None
+
+    def reverse(lo, hi):
+        t[lo:hi+1] = t[lo:hi+1][::-1].copy()
+        pos[t[lo:hi+1]] = np.arange(lo, hi + 1)
+
+    queue = collections.deque(range(n))
+    queued = [True] * n
+    while queue:
+        a = queue.popleft()
+        queued[a] = False
+        for c in near[a]:
+            i, j = int(pos[a]), int(pos[c])
+            # a and c each keep their predecessor, new edges a-c and
+            # successor-successor
+            if i == j:
+                continue
+            b, e = at(i + 1), at(j + 1)
+            if b is not None or e is not None:
+                gain = d(a, b) + d(c, e) - d(a, c) - d(b, e)
+                if gain > 1e-9:
+                    if i < j:
+                        reverse(i + 1, j)
+                    else:
+                        reverse(j + 1, i)
+                    break
+            # or each keeps its successor, new edges a-c and
+            # predecessor-predecessor
+            b, e = at(i - 1), at(j - 1)
+            gain = d(b, a) + d(e, c) - d(a, c) - d(b, e)
+            if gain > 1e-9:
+                if i < j:
+                    reverse(i, j - 1)
+                else:
+                    reverse(j, i - 1)
+                break
+        else:
+            continue
+        for x in (a, b, c, e):
+            if x is not None and x < n and not queued[x]:
+                queued[x] = True
+                queue.append(x)
+    return t[1:]
+
+
+def drill_tour(pts, start=(0.0, 0.0), neighbours=8):
+    # Order to visit (N, 2) pts in, starting from start.  Coincident
+    # points are toured once and come out next to each other.
+    pts = np.asarray(pts, dtype=float).reshape(-1, 2)
+    if len(pts) < 3:
+        return np.argsort(np.hypot(*(pts - start).T), kind='mergesort')
+    _kd_tree()
+    u, inverse = np.unique(pts, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    if len(u) < 3:
+        order = np.argsort(np.hypot(*(u - start).T), kind='mergesort')
+    else:
+        order = _two_opt(u, _nn_tour(u, start), start, neighbours)
+    rank = np.empty(len(u), dtype=int)
+    rank[order] = np.arange(len(u))
+    return np.argsort(rank[inverse], kind='mergesort')
+
+
+def _order_routes(paths, start):
+    # greedy nearest entry point, running a path backwards if its end
+    # is nearer
+    left = range(len(paths))
+    r = []
+    p = np.asarray(start, dtype=float)
+    while left:
+        ends = np.array([[paths[i][0], paths[i][-1]] for i in left])
+        dist = np.hypot(*(ends - p).transpose(2, 0, 1))
+        i, flip = np.unravel_index(np.argmin(dist), dist.shape)
+        path = paths[left.pop(i)]
+        if flip:
+            path = path[::-1]
+        r.append(path)
+        p = path[-1]
+    return r
+
+
+def _plan_time(ops, start, machine):
+    # rapid xy moves, plunge and retract for every hole and path, cutting
+    # along paths, and a tool change per op
+    m = dict(default_machine, **machine)
+    z = m['safe_z'] + m['depth']
+    rapid = 0.0
+    cut = 0.0
+    plunges = 0
+    p = np.asarray(start, dtype=float)
+    for op in ops:
+        if op['kind'] == 'drill':
+            pts = np.concatenate([[p], op['points']])
+            plunges += len(op['points'])
+        else:
+            pts = [p]
+            for path in op['paths']:
+                pts.append(path[0])
+                cut += np.hypot(*np.diff(path, axis=0).T).sum()
+                pts.append(path[-1])
+            pts = np.array(pts)
+            rapid -= sum([np.hypot(*(path[-1] - path[0]))
+                          for path in op['paths']])
+            plunges += len(op['paths'])
+        rapid += np.hypot(*np.diff(pts, axis=0).T).sum()
+        p = pts[-1]
+    time = (60.0 * (rapid + plunges * z) / m['rapid']
+            + 60.0 * (plunges * z / m['plunge'] + cut / m['feed'])
+            + len(ops) * m['tool_change'])
+    return {'time' : time, 'rapid' : rapid, 'tool_changes' : len(ops)}
+
+
+def _naive_ops(holes, routes):
+    # the given order, changing tool whenever the next one differs
+    ops = []
+    for dia, x, y in [(h[2], h[0], h[1]) for h in holes]:
+        if not ops or ops[-1]['kind'] != 'drill' or ops[-1]['tool'] != dia:
+            ops.append({'kind' : 'drill', 'tool' : dia, 'points' : []})
+        ops[-1]['points'].append((x, y))
+    for path, dia in routes:
+        if not ops or ops[-1]['kind'] != 'route' or ops[-1]['tool'] != dia:
+            ops.append({'kind' : 'route', 'tool' : dia, 'paths' : []})
+        ops[-1]['paths'].append(path)
+    for op in ops:
+        if op['kind'] == 'drill':
+            op['points'] = np.array(op['points'])
+    return ops
+
+
+def plan_toolpath(holes=(), routes=(), start=(0.0, 0.0), machine={},
+                  neighbours=8):
+    # holes are (N, 3) x, y, dia, routes (path, tool_dia) pairs.  Returns
+    # the ops in machining order, each a dict with 'kind' 'drill' and
+    # (M, 2) 'points' or 'route' and a list of 'paths', and the estimated
+    # cycle time, rapid distance and tool changes of the plan and of
+    # working through holes and routes as given.
+    holes = np.asarray(holes, dtype=float).reshape(-1, 3)
+    routes = [(np.asarray(path, dtype=float)[:, :2], float(dia))
+              for path, dia in routes]
+    ops = []
+    p = np.asarray(start, dtype=float)
+    for dia in np.unique(holes[:, 2]):
+        pts = holes[holes[:, 2] == dia, :2]
+        pts = pts[drill_tour(pts, p, neighbours)]
+        ops.append({'kind' : 'drill', 'tool' : float(dia), 'points' : pts})
+        p = pts[-1]
+    for dia in sorted(set([dia for path, dia in routes])):
+        paths = _order_routes([path for path, d in routes if d == dia], p)
+        ops.append({'kind' : 'route', 'tool' : dia, 'paths' : paths})
+        p = paths[-1][-1]
+    return {
+        'ops' : ops,
+        'machine' : dict(default_machine, **machine),
+        'start' : tuple(start),
+        'estimate' : _plan_time(ops, start, machine),
+        'naive' : _plan_time(_naive_ops(holes, routes), start, machine),
+    }
+
+
+def write_gcode(plan, f):
+    # G81 drilling cycles per drill, plunge-and-follow for routes, one
+    # numbered tool per op
+    m = plan['machine']
+    w = f.write
+    w('(%d ops, estimated %.1fs against %.1fs as given)\n'
+      % (len(plan['ops']), plan['estimate']['time'], plan['naive']['time']))
+    w('G21 G90 G17\n')
+    for tool, op in enumerate(plan['ops']):
+        w('(%s %.3f)\nT%d M6\nM3\nG0 Z%.3f\n'
+          % (op['kind'], op['tool'], tool + 1, m['safe_z']))
+        if op['kind'] == 'drill':
+            x, y = op['points'][0]
+            w('G0 X%.3f Y%.3f\n' % (x, y))
+            w('G81 X%.3f Y%.3f Z%.3f R%.3f F%.1f\n'
+              % (x, y, -m['depth'], m['safe_z'], m['plunge']))
+            w(''.join(['X%.3f Y%.3f\n' % (x, y)
+                       for x, y in op['points'][1:].tolist()]))
+            w('G80\n')
+        else:
+            for path in op['paths']:
+                w('G0 X%.3f Y%.3f\nG1 Z%.3f F%.1f\n'
+                  % (path[0][0], path[0][1], -m['depth'], m['plunge']))
+                w(''.join(['G1 X%.3f Y%.3f F%.1f\n' % (x, y, m['feed'])
+                           for x, y in path[1:].tolist()]))
+                w('G0 Z%.3f\n' % m['safe_z'])
+    w('M5\nM30\n')
+
+
+class TransformTree(object):
+    # World matrices for every node under root, in root's frame.  Nodes
+    # are held in depth-first order so each subtree is a contiguous
+    # range, and matrices are composed one tree level at a time with a
+    # single batched matmul per level.  Nodes whose placement changes are
+    # marked dirty and only their subtrees are recomputed.
+
+    def __init__(self, root):
+        self.root = root
+        self.stale = True
+        self.dirty = set()
+
+    def build(self):
+        nodes = []
+        parent = []
+        depth = []
+        stack = [(self.root, -1, 0)]
+        while stack:
+            n, p, d = stack.pop()
+            nodes.append(n)
+            parent.append(p)
+            depth.append(d)
+            i = len(nodes) - 1
+            for c in reversed(n.children):
+                stack.append((c, i, d + 1))
+        self.nodes = nodes
+        self.index = dict([(n, i) for i, n in enumerate(nodes)])
+        self.parent = np.array(parent)
+        self.depth = np.array(depth)
+        # end of each node's subtree range
+        self.end = np.arange(len(nodes)) + 1
+        for i in reversed(range(1, len(nodes))):
+            p = parent[i]
+            self.end[p] = max(self.end[p], self.end[i])
+        self.local = np.empty((len(nodes), 4, 4))
+        self.world = np.empty((len(nodes), 4, 4))
+        self.stale = False
+        self.dirty = set()
+        self._compute(np.arange(len(nodes)))
+
+    def _compute(self, idx):
+        # Reading a local transform can place its parent's children,
+        # marking them dirty, but before they're read, so marks within
+        # idx are spent once it's computed.
+        for i in idx:
+            n = self.nodes[i]
+            if n is self.root:
+                self.local[i] = np.identity(4)
+            else:
+                self.local[i] = n.get_local_transform()
+        depth = self.depth[idx]
+        for d in np.unique(depth):
+            level = idx[depth == d]
+            top = self.parent[level] < 0
+            self.world[level[top]] = self.local[level[top]]
+            level = level[~top]
+            self.world[level] = np.matmul(self.world[self.parent[level]],
+                                          self.local[level])
+        self.dirty.difference_update(idx.tolist())
+
+    def mark_dirty(self, node):
+        if not self.stale:
+            if node in self.index:
+                self.dirty.add(self.index[node])
+            else:
+                self.stale = True
+
+    def update(self):
+        if self.stale:
+            self.build()
+        elif self.dirty:
+            idx = np.unique(np.concatenate([np.arange(i, self.end[i])
+                                            for i in self.dirty]))
+            self._compute(idx)
+
+    def world_of(self, node):
+        self.update()
+        return self.world[self.index[node]]
+
+    def world_matrices(self):
+        self.update()
+        return self.nodes, self.world
+
+
+def iter_parts(root):
+    # (node, world_matrix) for every leaf part under root, in the root's
+    # frame
+    nodes, world = root.get_transform_tree().world_matrices()
+    for i, n in enumerate(nodes):
+        if len(n.children) == 0:
+            yield n, world[i]
+
+
+def connector_frame(origin, axis=(0, 0, 1), xdir=None):
+    # 4x4 frame at origin with its z axis along axis; for faces the axis
+    # is the outward normal
+    z = np.asarray(axis, dtype=float)
+    z = z / np.linalg.norm(z)
+    if xdir is None:
+        xdir = (1, 0, 0) if abs(z[0]) < 0.9 else (0, 1, 0)
+    x = np.asarray(xdir, dtype=float)
+    x = x - z * x.dot(z)
+    x = x / np.linalg.norm(x)
+    m = np.identity(4)
+    m[:3, 0] = x
+    m[:3, 1] = np.cross(z, x)
+    m[:3, 2] = z
+    m[:3, 3] = origin
+    return m
+
+
+_flip = [1.0, -1.0, -1.0, 1.0]
+
+
+class Mate(object):
+    # Places node b so that its connector b_conn meets connector a_conn
+    # on node a.  'coincident' puts the frames face to face (z axes
+    # opposed), 'concentric' lines the axes up pointing the same way.
+    # offset moves b along a's connector axis, angle turns it about it.
+
+    kinds = ('coincident', 'concentric', 'offset')
+
+    def __init__(self, kind, a, a_conn, b, b_conn, offset=0.0, angle=0.0):
+        if kind not in self.kinds:
+            raise ValueError, "unknown mate kind %s" % kind
+        self.kind = kind
+        self.a = a
+        self.a_conn = a_conn
+        self.b = b
+        self.b_conn = b_conn
+        self.offset = offset
+        self.angle = angle
+
+    def relative(self):
+        # b's connector frame expressed in a's connector frame
+        r = translation_matrix([0, 0, self.offset]).dot(
+            rotation_matrix(self.angle))
+        if self.kind != 'concentric':
+            r = r.dot(np.diag(_flip))
+        return r
+
+    def target(self, a_world):
+        ca = self.a.get_connectors()[self.a_conn]
+        cb = self.b.get_connectors()[self.b_conn]
+        return a_world.dot(ca).dot(self.relative()).dot(np.linalg.inv(cb))
+
+
+class MateSolver(object):
+    # Places the nodes of an assembly from mates.  Mates link nodes into
+    # islands (connected components); within an island nodes that no
+    # mate drives keep their placement and the rest are placed outwards
+    # from them.  Only islands touched since the last solve are solved
+    # again.
+
+    def __init__(self, root):
+        self.root = root
+        self.mates = []
+        self.island_of = {}
+        self.dirty = set()
+        self.residuals = {}
+
+    def _find(self, n):
+        p = self.island_of.setdefault(n, n)
+        if p is not n:
+            p = self.island_of[n] = self._find(p)
+        return p
+
+    def add(self, mate):
+        ra = self._find(mate.a)
+        rb = self._find(mate.b)
+        if ra is not rb:
+            self.island_of[rb] = ra
+            if rb in self.dirty:
+                self.dirty.discard(rb)
+        self.mates.append(mate)
+        self.dirty.add(ra)
+        return mate
+
+    def touch(self, node):
+        # node was moved or one of its mates edited
+        if node in self.island_of:
+            self.dirty.add(self._find(node))
+
+    def move(self, node, m):
+        node.set_transform(m)
+        self.touch(node)
+
+    def set_offset(self, mate, offset=None, angle=None):
+        if offset is not None:
+            mate.offset = offset
+        if angle is not None:
+            mate.angle = angle
+        self.touch(mate.a)
+
+    def islands(self):
+        r = {}
+        for m in self.mates:
+            r.setdefault(self._find(m.a), []).append(m)
+        return r
+
+    def solve(self, tol=1e-6):
+        # Returns the number of islands solved.  Mates that disagree
+        # with the placement chosen by earlier ones are left in
+        # self.residuals with their error.
+        dirty = set([self._find(n) for n in self.dirty])
+        self.dirty = set()
+        if not dirty:
+            return 0
+        islands = self.islands()
+        for key in dirty:
+            self._solve_island(islands.get(key, []), tol)
+        return len(dirty)
+
+    def _solve_island(self, mates, tol):
+        for m in mates:
+            self.residuals.pop(m, None)
+        driven = set([m.b for m in mates])
+        placed = set([m.a for m in mates if m.a not in driven])
+        pending = list(mates)
+        while pending:
+            left = []
+            for m in pending:
+                if m.a not in placed:
+                    left.append(m)
+                    continue
+                target = m.target(m.a.get_world_matrix())
+                if m.b in placed:
+                    err = np.abs(target - m.b.get_world_matrix()).max()
+                    if err > tol:
+                        self.residuals[m] = err
+                    continue
+                parent = m.b.parent.get_world_matrix()
+                m.b.set_transform(np.linalg.inv(parent).dot(target))
+                placed.add(m.b)
+            if len(left) == len(pending):
+                # a loop with nothing fixed - hold its first node still
+                placed.add(left[0].a)
+            pending = left
+
+
+def _box_distance(lo, hi, p):
+    d = np.maximum(np.maximum(lo - p, p - hi), 0.0)
+    return np.sqrt((d * d).sum(axis=-1))
+
+
+class BVH(object):
+    # Bounding volume hierarchy over a set of boxes, built by median
+    # splits along the longest axis.  Nodes are held in flat arrays.
+
+    def __init__(self, items, lo, hi, leaf_size=4):
+        self.items = list(items)
+        self.lo = np.asarray(lo, dtype=float).reshape(-1, 3)
+        self.hi = np.asarray(hi, dtype=float).reshape(-1, 3)
+        self.leaf_size = leaf_size
+        self.unbounded = []
+        self._build()
+
+    @classmethod
+    def from_assembly(cls, root, leaf_size=4):
+        # Parts that can't be bounded, even from a mesh, are left out
+        # and listed in the tree's unbounded attribute.
+        items = []
+        boxes = []
+        unbounded = []
+        for n, m in iter_parts(root):
+            try:
+                b = transform_bbox(n.get_bbox(), m)
+            except NotImplementedError:
+                unbounded.append(n)
+                continue
+            if b is not None:
+                items.append(n)
+                boxes.append(b)
+        r = cls(items, [b[0] for b in boxes], [b[1] for b in boxes],
+                leaf_size)
+        r.unbounded = unbounded
+        return r
+
+    def _build(self):
+        n = len(self.items)
+        self.order = np.arange(n)
+        centres = (self.lo + self.hi) / 2
+        node_lo = []
+        node_hi = []
+        node_start = []
+        node_count = []
+        node_left = []
+        node_right = []
+
+        def new_node(start, end):
+            idx = self.order[start:end]
+            node_lo.append(self.lo[idx].min(axis=0))
+            node_hi.append(self.hi[idx].max(axis=0))
+            node_start.append(start)
+            node_count.append(end - start)
+            node_left.append(-1)
+            node_right.append(-1)
+            return len(node_lo) - 1
+
+        if n == 0:
+            self.node_lo = np.zeros((0, 3))
+            self.node_hi = np.zeros((0, 3))
+            return
+        stack = [(new_node(0, n), 0, n)]
+        while stack:
+            k, start, end = stack.pop()
+            if end - start <= self.leaf_size:
+                continue
+            idx = self.order[start:end]
+            c = centres[idx]
+            axis = np.argmax(c.max(axis=0) - c.min(axis=0))
+            mid = (end - start) // 2
+            part = np.argpartition(c[:, axis], mid)
+            self.order[start:end] = idx[part]
+            node_left[k] = new_node(start, start + mid)
+            node_right[k] = new_node(start + mid, end)
+            stack.append((node_left[k], start, start + mid))
+            stack.append((node_right[k], start + mid, end))
+        self.node_lo = np.array(node_lo)
+        self.node_hi = np.array(node_hi)
+        self.node_start = np.array(node_start)
+        self.node_count = np.array(node_count)
+        self.node_left = np.array(node_left)
+        self.node_right = np.array(node_right)
+
+    def _leaf_items(self, k):
+        s = self.node_start[k]
+        return self.order[s:s + self.node_count[k]]
+
+    def query_box(self, lo, hi, tol=0.0):
+        # items whose boxes overlap the box lo-hi by more than tol
+        lo = np.asarray(lo, dtype=float)
+        hi = np.asarray(hi, dtype=float)
+        r = []
+        stack = [0] if len(self.node_lo) else []
+        while stack:
+            k = stack.pop()
+            if ((self.node_lo[k] >= hi - tol).any() or
+                (self.node_hi[k] <= lo + tol).any()):
+                continue
+            if self.node_left[k] < 0:
+                idx = self._leaf_items(k)
+                hit = ((self.lo[idx] < hi - tol).all(axis=1) &
+                       (self.hi[idx] > lo + tol).all(axis=1))
+                r.extend([self.items[i] for i in idx[hit]])
+            else:
+                stack.extend([self.node_left[k], self.node_right[k]])
+        return r
+
+    def query_point(self, p):
+        return self.query_box(p, p, tol=-1e-9)
+
+    def nearest(self, p, k=1):
+        # [(distance, item)] for the k items whose boxes are closest to p
+        import heapq
+        p = np.asarray(p, dtype=float)
+        best = []
+        heap = []
+        if len(self.node_lo):
+            heap.append((_box_distance(self.node_lo[0], self.node_hi[0], p),
+                         0))
+        while heap:
+            d, n = heapq.heappop(heap)
+            if len(best) == k and d > -best[0][0]:
+                break
+            if self.node_left[n] < 0:
+                idx = self._leaf_items(n)
+                for dist, i in zip(_box_distance(self.lo[idx],
+                                                 self.hi[idx], p), idx):
+                    if len(best) < k:
+                        heapq.heappush(best, (-dist, i))
+                    elif dist < -best[0][0]:
+                        heapq.heapreplace(best, (-dist, i))
+            else:
+                for c in (self.node_left[n], self.node_right[n]):
+                    heapq.heappush(heap, (_box_distance(self.node_lo[c],
+                                                        self.node_hi[c], p),
+                                          c))
+        return [(-d, self.items[i]) for d, i in sorted(best, reverse=True)]
+
+    def overlapping_pairs(self, tol=0.0):
+        # index pairs (i, j), i < j, of items whose boxes overlap by more
+        # than tol, found by a dual traversal of the tree
+        r = []
+        if len(self.node_lo) == 0:
+            return r
+
+        def overlap(a, b):
+            return ((self.node_lo[a] < self.node_hi[b] - tol).all() and
+                    (self.node_lo[b] < self.node_hi[a] - tol).all())
+
+        stack = [(0, 0)]
+        while stack:
+            a, b = stack.pop()
+            if not overlap(a, b):
+                continue
+            leaf_a = self.node_left[a] < 0
+            leaf_b = self.node_left[b] < 0
+            if leaf_a and leaf_b:
+                ia = self._leaf_items(a)
+                ib = self._leaf_items(b)
+                hit = ((self.lo[ia][:, None] < self.hi[ib][None] - tol) &
+                       (self.lo[ib][None] < self.hi[ia][:, None] - tol)
+                       ).all(axis=2)
+                for x, y in zip(*np.nonzero(hit)):
+                    i, j = ia[x], ib[y]
+                    if a != b or i < j:
+                        r.append((min(i, j), max(i, j)))
+            elif a == b:
+                l, rt = self.node_left[a], self.node_right[a]
+                stack.extend([(l, l), (rt, rt), (l, rt)])
+            elif leaf_b or (not leaf_a and
+                            self.node_count[a] >= self.node_count[b]):
+                stack.extend([(self.node_left[a], b),
+                              (self.node_right[a], b)])
+            else:
+                stack.extend([(a, self.node_left[b]),
+                              (a, self.node_right[b])])
+        return r
+
+    def overlapping_items(self, tol=0.0):
+        return [(self.items[i], self.items[j])
+                for i, j in self.overlapping_pairs(tol)]
+
+
+def _sample_grid(lo, hi, samples):
+    size = hi - lo
+    vol = np.prod(size)
+    if vol <= 0:
+        return np.zeros((0, 3)), 0.0
+    cell = (vol / samples) ** (1.0 / 3)
+    n = np.maximum(np.ceil(size / cell), 1).astype(int)
+    # cell centres, nudged off round numbers so the vertical rays in
+    # points_inside() don't run down the faces of axis aligned parts
+    axes = [lo[i] + (np.arange(n[i]) + f) * size[i] / n[i]
+            for i, f in enumerate((0.4987, 0.5031, 0.5))]
+    g = np.meshgrid(*axes, indexing='ij')
+    return np.column_stack([e.ravel() for e in g]), vol / np.prod(n)
+
+
+def _solid_pieces(node):
+    # The solid of a CSG tree as (mesh, holes) pieces: closed meshes,
+    # each less the union of its hole meshes.  Unions, loops and
+    # transforms are taken apart, so a drilled part keeps one mesh per
+    # hole and the meshes are mostly convex.
+    if node.is_hole:
+        raise NotMeshable("hole()")
+    name = node.name
+    children = _rendered_children(node)
+    loop = _loop_instances(node)
+    if loop is not None:
+        body = [p for c in loop[1] for p in _solid_pieces(c)]
+        return [_piece_transformed(p, m) for m in loop[0] for p in body]
+    m = node_matrix(node)
+    if m is not None:
+        return [_piece_transformed(p, m)
+                for c in children for p in _solid_pieces(c)]
+    if name in ('color', 'union', 'part', 'render'):
+        return [p for c in children for p in _solid_pieces(c)]
+    if name == 'difference' and children:
+        cut = []
+        for c in children[1:]:
+            for mesh, holes in _solid_pieces(c):
+                if holes:
+                    raise NotMeshable("difference() of a difference()")
+                cut.append(mesh)
+        return [(mesh, holes + cut)
+                for mesh, holes in _solid_pieces(children[0])]
+    return [(_mesh_node(node), [])]
+
+
+def _piece_transformed(piece, m):
+    return piece[0].transformed(m), [h.transformed(m) for h in piece[1]]
+
+
+def _in_pieces(pieces, pts):
+    r = np.zeros(len(pts), dtype=bool)
+    for mesh, holes in pieces:
+        lo, hi = _mesh_box(mesh)
+        sel = np.nonzero(~r & (pts >= lo).all(axis=1) &
+                         (pts <= hi).all(axis=1))[0]
+        inside = points_inside(mesh, pts[sel])
+        for h in holes:
+            i = np.nonzero(inside)[0]
+            inside[i] = ~points_inside(h, pts[sel[i]])
+        r[sel] = inside
+    return r
+
+
+def _mesh_box(mesh):
+    return mesh.vertices.min(axis=0), mesh.vertices.max(axis=0)
+
+
+def _boxes_meet(a, b, tol=0.0):
+    return (a[0] < b[1] - tol).all() and (b[0] < a[1] - tol).all()
+
+
+def _convex_faces(mesh):
+    # a closed mesh as one anticlockwise polygon per face plane, or None
+    # if it isn't convex
+    tol = 1e-9 * max(np.abs(mesh.vertices).max(), 1.0)
+    t = mesh.triangles()
+    n = np.cross(t[:, 1] - t[:, 0], t[:, 2] - t[:, 0])
+    l = np.sqrt((n * n).sum(axis=1))
+    keep = l > 1e-12
+    n = n[keep] / l[keep][:, None]
+    d = (n * t[keep, 0]).sum(axis=1)
+    key = np.round(np.column_stack([n * 1e6, d / tol]))
+    i = np.unique(key, axis=0, return_index=True)[1]
+    n, d = n[i], d[i]
+    v = np.unique(mesh.vertices, axis=0)
+    s = v.dot(n.T) - d
+    if (s > tol).any():
+        return None
+    return [_plane_polygon(v[np.abs(s[:, k]) <= tol], n[k])
+            for k in range(len(n))]
+
+
+def _plane_polygon(pts, n):
+    # points of a convex polygon in order, anticlockwise about n
+    c = pts.mean(axis=0)
+    u = np.cross(n, [1.0, 0, 0] if abs(n[0]) < 0.9 else [0, 1.0, 0])
+    u /= np.linalg.norm(u)
+    v = np.cross(n, u)
+    return pts[np.argsort(np.arctan2((pts - c).dot(v), (pts - c).dot(u)))]
+
+
+def _clip_convex(faces, n, d, tol):
+    # the part of a convex polytope, given as outward facing polygons,
+    # where n.x <= d
+    r = []
+    cap = []
+    flush = False
+    for f in faces:
+        s = f.dot(n) - d
+        if (np.abs(s) <= tol).all():
+            # a face already in the plane is the cut face, if it faces
+            # the same way
+            if _face_plane(f)[0].dot(n) > 0:
+                r.append(f)
+                flush = True
+            continue
+        if (s <= tol).all():
+            r.append(f)
+            cap.extend(f[s >= -tol])
+            continue
+        if (s >= -tol).all():
+            cap.extend(f[s <= tol])
+            continue
+        out = []
+        for i in range(len(f)):
+            p, sp, q, sq = f[i - 1], s[i - 1], f[i], s[i]
+            if (sp > tol) != (sq > tol):
+                x = p + (q - p) * min(max(sp / (sp - sq), 0.0), 1.0)
+                out.append(x)
+                cap.append(x)
+            if sq <= tol:
+                out.append(q)
+                if sq >= -tol:
+                    cap.append(q)
+        if len(out) >= 3:
+            r.append(np.array(out))
+    if not r or (flush and len(r) == 1):
+        return []
+    if len(cap) >= 3 and not flush:
+        cap = _plane_polygon(np.array(cap), n)
+        keep = np.ones(len(cap), dtype=bool)
+        keep[1:] = (np.abs(np.diff(cap, axis=0)) > tol).any(axis=1)
+        if keep.sum() >= 3:
+            r.append(cap[keep])
+    return r
+
+
+def _face_plane(f):
+    # Newell's normal, which doesn't mind points in line
+    n = np.cross(f, np.roll(f, -1, axis=0)).sum(axis=0)
+    n /= np.linalg.norm(n)
+    return n, n.dot(f.mean(axis=0))
+
+
+def _faces_box(faces):
+    pts = np.concatenate(faces)
+    return pts.min(axis=0), pts.max(axis=0)
+
+
+def _polytope_volume(faces):
+    return sum([(f[0] * np.cross(f[1:-1], f[2:])).sum()
+                for f in faces]) / 6.0
+
+
+def _convex_overlap(a, b, holes, tol, vol_tol):
+    # volume common to convex polytopes a and b less the convex holes,
+    # all as face polygons, cutting away one face plane at a time
+    if len(b) < len(a):
+        a, b = b, a
+    cell = a
+    for f in b:
+        n, d = _face_plane(f)
+        cell = _clip_convex(cell, n, d, tol)
+        if not cell:
+            return 0.0
+    cells = [cell]
+    for h in holes:
+        box = _faces_box(h)
+        r = []
+        for cell in cells:
+            if not _boxes_meet(_faces_box(cell), box, tol):
+                r.append(cell)
+                continue
+            # what's outside each face of the hole in turn is kept
+            for f in h:
+                n, d = _face_plane(f)
+                out = _clip_convex(cell, -n, -d, tol)
+                if _polytope_volume(out) > vol_tol:
+                    r.append(out)
+                cell = _clip_convex(cell, n, d, tol)
+                if _polytope_volume(cell) <= vol_tol:
+                    break
+        cells = r
+        if not cells:
+            return 0.0
+    v = sum([_polytope_volume(c) for c in cells])
+    return v if v > vol_tol else 0.0
+
+
+def _pieces_overlap(a, b, convex, samples):
+    # Whether two (mesh, holes) pieces share any volume, as None or
+    # (volume, how).  how is 'exact' when convex meshes were cut up to
+    # find the volume, 'mesh' when only the meshes were compared and the
+    # volume is None, and 'sampled' when the holes could only be allowed
+    # for at grid points.
+    ba, bb = _mesh_box(a[0]), _mesh_box(b[0])
+    lo, hi = np.maximum(ba[0], bb[0]), np.minimum(ba[1], bb[1])
+    holes = [h for h in a[1] + b[1] if _boxes_meet(_mesh_box(h), (lo, hi))]
+    if not holes:
+        if _shells_overlap(a[0], b[0]):
+            return None, 'mesh'
+        return None
+    faces = [convex(m) for m in [a[0], b[0]] + holes]
+    if all([f is not None for f in faces]):
+        tol = 1e-9 * max(np.abs(lo).max(), np.abs(hi).max(), 1.0)
+        v = _convex_overlap(faces[0], faces[1], faces[2:], tol,
+                            1e-10 * (hi - lo).max() ** 3)
+        return (v, 'exact') if v > 0 else None
+    if not _shells_overlap(a[0], b[0]):
+        return None
+    pts, cell_vol = _sample_grid(lo, hi, samples)
+    n = (_in_pieces([a], pts) & _in_pieces([b], pts)).sum()
+    return (n * cell_vol, 'sampled') if n else None
+
+
+def interference(root, tol=0.0, samples=8000, min_volume=0.0,
+                 fallback=True):
+    # Pairs of leaf parts under root that overlap.  Candidate pairs come
+    # from a BVH over the part bounds.  Each part is then taken apart
+    # into meshes less the meshes of their holes, and whether the pair
+    # overlaps is decided from those: convex ones are cut against each
+    # other, giving the shared volume exactly, and others compared by
+    # _shells_overlap().  Other volumes are estimated from a grid of
+    # samples over the shared bounds; pairs found to overlap are kept
+    # however little of it the grid catches.  Parts that can't be
+    # meshed at all are reported from their bounds with method 'bbox',
+    # and ones that can't even be bounded alone with method 'unbounded'.
+    bvh = BVH.from_assembly(root)
+    matrices = dict(iter_parts(root))
+    pieces = {}
+    faces = {}
+
+    def world_pieces(n):
+        if n not in pieces:
+            try:
+                p = _solid_pieces(n._generate())
+            except NotMeshable:
+                try:
+                    p = [(n.get_mesh(fallback), [])]
+                except NotMeshable:
+                    p = None
+            if p is not None:
+                p = [_piece_transformed(e, matrices[n]) for e in p]
+            pieces[n] = p
+        return pieces[n]
+
+    def convex(mesh):
+        if id(mesh) not in faces:
+            faces[id(mesh)] = _convex_faces(mesh)
+        return faces[id(mesh)]
+
+    r = []
+    for i, j in bvh.overlapping_pairs(tol):
+        a, b = bvh.items[i], bvh.items[j]
+        lo = np.maximum(bvh.lo[i], bvh.lo[j])
+        hi = np.minimum(bvh.hi[i], bvh.hi[j])
+        pa = world_pieces(a)
+        pb = world_pieces(b)
+        if pa is None or pb is None:
+            vol = np.prod(np.maximum(hi - lo, 0))
+            method = 'bbox'
+        else:
+            hits = []
+            for x in pa:
+                for y in pb:
+                    if _boxes_meet(_mesh_box(x[0]), _mesh_box(y[0]), tol):
+                        h = _pieces_overlap(x, y, convex, samples)
+                        if h is not None:
+                            hits.append((x[0], y[0], h))
+            if not hits:
+                continue
+            boxes = [(np.maximum(_mesh_box(x)[0], _mesh_box(y)[0]),
+                      np.minimum(_mesh_box(x)[1], _mesh_box(y)[1]))
+                     for x, y, h in hits]
+            lo, hi = _box_union(boxes)
+            if len(hits) == 1 and hits[0][2][1] != 'mesh':
+                vol, method = hits[0][2]
+            else:
+                pts, cell_vol = _sample_grid(lo, hi, samples)
+                inside = _in_pieces(pa, pts)
+                inside[inside] = _in_pieces(pb, pts[inside])
+                vol = inside.sum() * cell_vol
+                method = 'mesh'
+                if 'sampled' in [h[1] for x, y, h in hits]:
+                    method = 'sampled'
+        if vol < min_volume:
+            continue
+        r.append({'a': a,
+                  'b': b,
+                  'volume': vol,
+                  'bbox': (lo, hi),
+                  'method': method})
+    for n in bvh.unbounded:
+        r.append({'a': n,
+                  'b': None,
+                  'volume': None,
+                  'bbox': None,
+                  'method': 'unbounded'})
+    return r
+
+
+def print_interference(result):
+    for d in result:
+        if d['b'] is None:
+            print d['a'].identifier, "can't be checked"
+        else:
+            print d['a'].identifier, d['b'].identifier, d['volume'], \
+                d['method']
+
+
+# Mass properties.  Units are mm and kg, so densities are kg/mm^3 and
+# inertias kg.mm^2.
+
+material_densities = {
+    'aluminium': 2.70e-6,
+    'steel': 7.85e-6,
+    'stainless': 8.00e-6,
+    'copper': 8.96e-6,
+    'brass': 8.50e-6,
+    'pla': 1.24e-6,
+    'abs': 1.04e-6,
+    'nylon': 1.15e-6,
+}
+
+# material guessed from the colour a part is drawn in
+colour_materials = [
+    (aluminium_colour, 'aluminium'),
+    (steel_colour, 'steel'),
+    (copper_colour, 'copper'),
+    (Steel, 'steel'),
+    (Black, 'steel'),           # black oxide bearing blocks, motors
+    ([0.1, 0.1, 0.1], 'steel'), # metric_bolt
+]
+
+default_material = 'steel'
+
+
+def colour_density(colour):
+    if colour is None:
+        return None
+    c = tuple(colour)[:3]
+    for col, material in colour_materials:
+        if np.allclose(c, tuple(col)[:3]):
+            return material_densities[material]
+    return None
+
+
+class MassProperties(object):
+    # Raw moments of a solid about its frame's origin: mass, first
+    # moment (integral of r dm) and second moment (integral of r r^T
+    # dm), plus its volume.
+
+    def __init__(self, volume=0.0, mass=0.0, first=None, second=None):
+        self.volume = volume
+        self.mass = mass
+        self.first = np.zeros(3) if first is None else first
+        self.second = np.zeros((3, 3)) if second is None else second
+
+    def __add__(self, other):
+        return MassProperties(self.volume + other.volume,
+                              self.mass + other.mass,
+                              self.first + other.first,
+                              self.second + other.second)
+
+    def __sub__(self, other):
+        return self + other.scaled(-1.0, -1.0)
+
+    def scaled(self, density, volume_scale=1.0):
+        return MassProperties(self.volume * volume_scale,
+                              self.mass * density,
+                              self.first * density,
+                              self.second * density)
+
+    def transformed(self, m):
+        m = np.asarray(m, dtype=float)
+        a = m[:3, :3]
+        t = m[:3, 3]
+        det = abs(np.linalg.det(a))
+        f = a.dot(self.first)
+        return MassProperties(
+            self.volume * det,
+            self.mass * det,
+            det * (f + self.mass * t),
+            det * (a.dot(self.second).dot(a.T) + np.outer(f, t) +
+                   np.outer(t, f) + self.mass * np.outer(t, t)))
+
+    def get_com(self):
+        if self.mass == 0:
+            return np.zeros(3)
+        return self.first / self.mass
+
+    def get_inertia(self):
+        # inertia tensor about the centre of mass
+        c = self.get_com()
+        s = self.second - self.mass * np.outer(c, c)
+        return np.trace(s) * np.identity(3) - s
+
+    com = property(get_com)
+    inertia = property(get_inertia)
+
+    @staticmethod
+    def from_mesh(mesh, density=1.0):
+        # sum of signed tetrahedra from the origin to each face
+        t = mesh.triangles()
+        a, b, c = t[:, 0], t[:, 1], t[:, 2]
+        det = np.einsum('ij,ij->i', a, np.cross(b, c))
+        s = a + b + c
+        second = (np.einsum('i,ij,ik->jk', det, a, a) +
+                  np.einsum('i,ij,ik->jk', det, b, b) +
+                  np.einsum('i,ij,ik->jk', det, c, c) +
+                  np.einsum('i,ij,ik->jk', det, s, s)) / 120.0
+        v = det.sum() / 6.0
+        return MassProperties(v, v, (det[:, None] * s).sum(axis=0) / 24.0,
+                              second).scaled(density)
+
+
+def _solid_moments(volume, com, spread):
+    # unit density moments of a solid with its second moment about the
+    # centre of mass given as spread
+    com = np.asarray(com, dtype=float)
+    return MassProperties(volume, volume, volume * com,
+                          volume * (np.outer(com, com) + spread))
+
+
+def _box_moments(lo, hi):
+    s = np.asarray(hi, dtype=float) - lo
+    return _solid_moments(np.prod(s), (np.asarray(lo) + hi) / 2.0,
+                          np.diag(s * s / 12.0))
+
+
+def _cylinder_moments(r, z0, z1):
+    h = z1 - z0
+    return _solid_moments(math.pi * r * r * h, (0, 0, (z0 + z1) / 2.0),
+                          np.diag([r * r / 4, r * r / 4, h * h / 12]))
+
+
+def _prism_moments(pts, z0, z1):
+    # Polygon area moments (signed, so clockwise holes subtract) swept
+    # between z0 and z1
+    p = np.asarray(pts, dtype=float)
+    x, y = p[:, 0], p[:, 1]
+    xn, yn = np.roll(x, -1), np.roll(y, -1)
+    cr = x * yn - xn * y
+    area = cr.sum() / 2
+    sx = ((x + xn) * cr).sum() / 6
+    sy = ((y + yn) * cr).sum() / 6
+    sxx = ((x * x + x * xn + xn * xn) * cr).sum() / 12
+    syy = ((y * y + y * yn + yn * yn) * cr).sum() / 12
+    sxy = ((x * yn + 2 * x * y + 2 * xn * yn + xn * y) * cr).sum() / 24
+    h = z1 - z0
+    zm = (z1 * z1 - z0 * z0) / 2
+    zz = (z1 ** 3 - z0 ** 3) / 3
+    return MassProperties(area * h, area * h,
+                          np.array([sx * h, sy * h, area * zm]),
+                          np.array([[sxx * h, sxy * h, sx * zm],
+                                    [sxy * h, syy * h, sy * zm],
+                                    [sx * zm, sy * zm, area * zz]]))
+
+
+def _shape_moments(node, density, forced):
+    # Mass moments of a CSG tree; analytic where possible, otherwise
+    # from a tessellation of the subtree that can't be done exactly.
+    try:
+        return _analytic_moments(node, density, forced)
+    except NotMeshable:
+        pass
+    try:
+        return MassProperties.from_mesh(shape_mesh(node), density)
+    except NotMeshable:
+        if node.is_hole:
+            raise
+    return _sampled_moments(node, density)
+
+
+def _untransformed(pts, m):
+    inv = np.linalg.inv(m)
+    return pts.dot(inv[:3, :3].T) + inv[:3, 3]
+
+
+def _inside(node, pts):
+    # which pts are inside the solid of a CSG tree, working through the
+    # booleans that can't be tessellated directly
+    try:
+        return points_inside(to_mesh(node), pts)
+    except NotMeshable:
+        pass
+    r = np.zeros(len(pts), dtype=bool)
+    name = node.name
+    children = _rendered_children(node)
+    loop = _loop_instances(node)
+    if loop is not None:
+        box = _box_union([shape_bbox(c) for c in loop[1]])
+        if box is None:
+            return r
+        for m in loop[0]:
+            lo, hi = transform_bbox(box, m)
+            sel = np.nonzero(~r & (pts >= lo).all(axis=1) &
+                             (pts <= hi).all(axis=1))[0]
+            local = _untransformed(pts[sel], m)
+            for c in loop[1]:
+                r[sel] |= _inside(c, local)
+        return r
+    m = node_matrix(node)
+    if m is not None:
+        pts = _untransformed(pts, m)
+    elif name == 'difference' or name == 'intersection':
+        if children:
+            r = _inside(children[0], pts)
+        for c in children[1:]:
+            sel = np.nonzero(r)[0]
+            inside = _inside(c, pts[sel])
+            r[sel] = inside if name == 'intersection' else ~inside
+        return r
+    elif name not in ('color', 'union', 'part', 'render'):
+        return points_inside(shape_mesh(node), pts)
+    for c in children:
+        sel = np.nonzero(~r)[0]
+        r[sel] = _inside(c, pts[sel])
+    return r
+
+
+def _sampled_moments(node, density, samples=200000):
+    # Estimate for geometry that nothing could tessellate, from a grid
+    # of points classified against the CSG tree.
+    box = shape_bbox(node)
+    if box is None:
+        return MassProperties()
+    pts, cell_vol = _sample_grid(box[0], box[1], samples)
+    p = pts[_inside(node, pts)]
+    return MassProperties(len(p) * cell_vol, len(p) * cell_vol,
+                          p.sum(axis=0) * cell_vol,
+                          p.T.dot(p) * cell_vol).scaled(density)
+
+
+def _check_apart(children):
+    # children may only be summed if their bounds don't overlap
+    boxes = [b for b in [shape_bbox(c) for c in children] if b is not None]
+    if _box_overlaps(boxes):
+        raise NotMeshable("overlapping union")
+
+
+def _analytic_moments(node, density, forced):
+    if node.is_hole:
+        raise NotMeshable("hole()")
+    name = node.name
+    children = _rendered_children(node)
+    if name == 'color' and not forced:
+        d = colour_density(_param(node, 'c'))
+        if d is not None:
+            density = d
+    if name in ('color', 'union', 'part', 'render'):
+        _check_apart(children)
+        return sum([_shape_moments(c, density, forced) for c in children],
+                   MassProperties())
+    loop = _loop_instances(node)
+    if loop is not None:
+        _check_apart(loop[1])
+        box = _box_union([shape_bbox(c) for c in loop[1]])
+        if box is not None and _box_overlaps([transform_bbox(box, m)
+                                              for m in loop[0]]):
+            raise NotMeshable("overlapping loop")
+        body = sum([_shape_moments(c, density, forced) for c in loop[1]],
+                   MassProperties())
+        return sum([body.transformed(m) for m in loop[0]], MassProperties())
+    m = node_matrix(node)
+    if m is not None:
+        _check_apart(children)
+        return sum([_shape_moments(c, density, forced) for c in children],
+                   MassProperties()).transformed(m)
+    if name == 'cube':
+        lo, hi = _cube_params(node)
+        return _box_moments(lo, hi).scaled(density)
+    if name == 'cylinder':
+        r1, r2, z0, z1, n = _cylinder_params(node)
+        if r1 == r2:
+            return _cylinder_moments(r1, z0, z1).scaled(density)
+    if name == 'sphere':
+        r = _sphere_params(node)[0]
+        return _solid_moments(4.0 / 3 * math.pi * r ** 3, (0, 0, 0),
+                              np.identity(3) * r * r / 5).scaled(density)
+    if name == 'linear_extrude':
+        if not (_param(node, 'twist', 0) or _param(node, 'scale', 1.0) != 1.0):
+            h = float(_param(node, 'height', 100.0))
+            z0 = -h / 2 if _param(node, 'center', False) else 0.0
+            r = MassProperties()
+            for c in children:
+                for outer, holes in _fill_regions(_outline_2d(c)):
+                    for ring in [outer] + holes:
+                        r = r + _prism_moments(ring, z0, z0 + h)
+            return r.scaled(density)
+    if name == 'difference' and len(children) == 2:
+        outer = _translated_cylinder(children[0])
+        inner = _translated_cylinder(children[1])
+        if (_bore_mesh(node) is not None and outer[5] == inner[5] and
+            outer[5] >= 30):
+            # round tube; faceted ones (nuts) go through the mesh
+            m = np.identity(4)
+            m[:2, 3] = outer[:2]
+            return (_cylinder_moments(outer[4], outer[2], outer[3]) -
+                    _cylinder_moments(inner[4], outer[2], outer[3])
+                    ).scaled(density).transformed(m)
+    raise NotMeshable("%s needs a mesh" % name)
+
+
+def shape_mass(shape, density=None):
+    # Mass properties of generated geometry.  With no density, colours
+    # in the tree pick the material and default_material fills in.
+    if density is None:
+        return _shape_moments(shape, material_densities[default_material],
+                              False)
+    return _shape_moments(shape, density, True)
+
+
+def mirror_points_x(pts, x_val):
+    r = []
+    for x,y in pts:
+        x = 2 * x_val - x
+        r.append((x,y))
+    r.reverse()
+    return r
+
+def shift_points(pts, s):
+    r = []
+    for x,y in pts:
+        x += s[0]
+        y += s[1]
+        r.append([x, y])
+    return r
+
+def rotate_points(pts, angle):
+    ca = math.cos(angle)
+    sa = math.sin(angle)
+    r = []
+    for x,y in pts:
+        nx = x * ca - y * sa
+        ny = x * sa + y * ca
+        r.append([nx, ny])
+    return r
+
+
+def rounded_slot(length, width, height):
+    u = union()(
+        translate([0, -width/2, 0])(
+            cube([length, width, height]),
+        ),
+        cylinder(r=width/2, h=height),
+        translate([length,0,0])(
+            cylinder(r=width/2, h=height),
+        )
+    )
+    return u
+
+
+def hole_pattern(p):
+    # Holes of one 'grid' or 'circular' pattern as an (N, 3) array of
+    # x, y, dia, or slots of a 'slot' pattern as (N, 5) of x, y, length,
+    # angle, width.  x, y are the pattern's origin, a grid of slots
+    # uses nx, ny and pitches as for holes.
+    kind = p.get('pattern', 'grid')
+    if kind == 'slot':
+        m = pattern_matrices(dict(p, pattern='grid'))
+        r = np.empty((len(m), 5))
+        r[:, 2] = p['length']
+        r[:, 3] = p.get('angle', 0.0)
+        r[:, 4] = p['width']
+    else:
+        m = pattern_matrices(p)
+        r = np.empty((len(m), 3))
+        r[:, 2] = p['dia']
+    r[:, 0] = m[:, 0, 3] + p.get('x', 0.0)
+    r[:, 1] = m[:, 1, 3] + p.get('y', 0.0)
+    return r
+
+
+def obround(length, width):
+    # outline of a slot from (0, 0) to (length, 0)
+    r = width / 2.0
+    n = max(get_fragments(r) // 2, 2)
+    a = np.linspace(-math.pi/2, math.pi/2, n + 1)
+    right = np.column_stack([length + r*np.cos(a), r*np.sin(a)])
+    left = np.column_stack([-r*np.cos(a), -r*np.sin(a)])
+    return np.concatenate([right, left]).tolist()
+
+
+def metric_bolt(d, l, style='socket_head'):
+    r = float(d)/2.0
+    if style == 'socket_head':
+        try:
+            b = lookup('metric_bolt', d)
+            head_r = b['head_dia']/2
+            head_h = b['head_height']
+            socket_r = b['socket']/math.sqrt(3)
+            socket_depth = b['socket_depth']
+        except KeyError:
+            # not a standard size, use rough proportions
+            head_r = 2*r
+            head_h = float(d)
+            socket_r = r
+            socket_depth = r
+        head = cylinder(r=head_r, h=head_h)
+        head = difference()(head, 
+                            translate([0, 0, head_h-socket_depth])(
+                                cylinder(r=socket_r, h=socket_depth+1,
+                                         segments=6)))
+        remaining_len = l - head_h
+    else:
+        raise NotImplementedError, 'unknown head style %s' % style
+    return color([0.1,0.1,0.1])(union()(
+        head,
+        translate([0,0,-remaining_len])(
+            cylinder(r=r,
+                     h=remaining_len)))
+    )
+    
+
+
+def beam20x20(l):
+    beam_corner = circle(r=1.5)
+    beam_square = minkowski()(translate([1.5, 1.5, 0])(square(20.0 - 3)),
+                              beam_corner)
+    #beam_square = union()(square(20.0 - 3), beam_corner)
+    tslot = [
+        (0,   3.8),
+        (0,   2.7),
+        (2.4, 0),
+        (8.6, 0),
+        (11,  2.7),
+        (11,  3.8),
+        (8.6, 3.8),
+        (8.6, 6.1),
+        (2.4, 6.1),
+        (2.4, 3.8),
+        (0,   3.8),
+    ]
+        
+    beam_shape = difference()(
+        beam_square,
+        translate([4.5,6.1,0])(rotate([180,0,0])(polygon(tslot))),
+        translate([4.5,13.9,0])(rotate([0,0,0])(polygon(tslot))),
+        translate([6.1,4.5,0])(rotate([0,0,90])(polygon(tslot))),
+        translate([14,4.5,0])(rotate([180,0,90])(polygon(tslot)))
+    )
+                                           
+    beam = linear_extrude(l)(beam_shape)
+                                           
+    return color(aluminium_colour)( 
+        beam
+    )
+
+
+
+
+def beam40x20(l):
+    beam_corner = circle(r=1.5)
+    beam_square = minkowski()(translate([1.5, 1.5, 0])(square([20.0 - 3,
+                                                               40.0 - 3])),
+                              beam_corner)
+
+    
+    tslot = [
+        (0,   3.8),
+        (0,   2.7),
+        (2.4, 0),
+        (8.6, 0),
+        (11,  2.7),
+        (11,  3.8),
+        (8.6, 3.8),
+        (8.6, 6.1),
+        (2.4, 6.1),
+        (2.4, 3.8),
+        (0,   3.8),
+    ]
+
+    hollow = [
+        (-7.0, -2.0),
+        (-8.0, -2.0),
+        (-8.0, 2.0),
+        (-7.0, 2.0),
+        
+        (-2.0, 7.0),
+        (-2.0, 8.0),
+        (2.0, 8.0),
+        (2.0, 7.0),
+
+        (7.0, 2.0),
+        (8.0, 2.0),
+        (8.0, -2.0),
+        (7.0, -2.0),
+
+        (2.0, -7.0),
+        (2.0, -8.0),
+        (-2.0, -8.0),
+        (-2.0, -7.0),
+
+        (-7.0, -2.0)
+    ]
+        
+    beam_shape = difference()(
+        beam_square,
+        translate([10.0, 20.0, 0])(polygon(hollow)),
+        translate([4.5,6.1,0])(rotate([180,0,0])(polygon(tslot))),
+
+        translate([4.5,13.9+20.01,0])(rotate([0,0,0])(polygon(tslot))),
+
+        translate([6.1,4.5,0])(rotate([0,0,90])(polygon(tslot))),
+        translate([6.1,4.5+20,0])(rotate([0,0,90])(polygon(tslot))),
+
+        translate([14,4.5,0])(rotate([180,0,90])(polygon(tslot))),
+        translate([14,4.5+20.0,0])(rotate([180,0,90])(polygon(tslot)))
+    )
+                                           
+    beam = linear_extrude(l)(beam_shape)
+                                           
+    return color(aluminium_colour)( 
+        beam
+    )
+
+
+def beam40x40_profile():
+    pts = [
+        [5.5, 4.1],
+        [5.5, -4.1],
+        [13.0, -10.25],
+        [18.2, -10.25],
+        [18.2, -6.4],
+        [15.5, -6.4],
+        [15.5, -4.1],
+        [20.0, -4.1],
+        [20.0, -20.0],
+        [4.1, -20.0],
+        [4.1, -15.5],
+        [6.4, -15.5],
+        [6.4, -18.2],
+        [10.25, -18.2],
+        [10.25, -13.0],
+        [4.1, -5.5],
+    ]
+
+    return (pts + rotate_points(pts, math.radians(90))
+            + rotate_points(pts, math.radians(180)) 
+            + rotate_points(pts, math.radians(270)))
+
+def beam40x40(l):
+    beam = linear_extrude(l)(polygon(beam40x40_profile()))
+                                           
+    return color(aluminium_colour)( 
+        beam
+    )
+
+
+def mgn12_rail(l):
+
+    h = 13.0 - 5.0
+    c = 0.25
+    p = [
+        (-6.0, 0),
+        (-6.0, 3.0),
+        (-6.0, 4.5),
+        (-5.0, 5.5),
+        (-4.8, 5.5),
+        (-4.8, 6.0),
+        (-5.0, 6.0),
+        (-6.0, 7.0),       
+        (-6.0, h-c),
+        (-6.0+c, h),
+
+        (6.0-c, h),
+        (6.0, h-c),
+        (6.0, 7.0),       
+        (5.0, 6.0),
+        (4.8, 6.0),
+        (4.8, 5.5),
+        (5.0, 5.5),
+        (6.0, 4.5),
+        (6.0, 3.0),
+        (6.0, 0.0),
+        (-6.0, 0.0)
+        ]
+    beam = linear_extrude(l)(polygon(p))
+    beam = rotate([90,0,90])(beam)
+    return color(steel_colour)( 
+        beam
+    )
+
+
+
+def mgn12h_slider():
+    w = 27.0
+    l = 45.4
+    red_l = 1.0
+    green_l = 4.0
+    steel_l = l - 2*(red_l + green_l)
+    s = union()(
+        color(steel_colour)(
+            translate([-steel_l/2, -w/2, 3])(cube([steel_l, w, 10]))
+        ),
+        color([0, 0.7, 0])(
+            translate([steel_l/2, -w/2, 3])(cube([green_l, w, 10]))
+        ),
+        color([0.8, 0.0, 0])(
+            translate([steel_l/2 + green_l, -w/2, 3])(cube([red_l, w, 10]))
+        ),
+
+        color([0, 0.7, 0])(
+            translate([-steel_l/2 - green_l, -w/2, 3])(cube([green_l, w, 10]))
+        ),
+        color([0.8, 0.0, 0])(
+            translate([-steel_l/2 - green_l - red_l, -w/2, 3])(
+                cube([red_l, w, 10])
+            )
+        ),
+        
+    )
+
+    
+    beam = translate([-1-l/2, 0, 0])(mgn12_rail(l + 2))
+
+    C = 20.0
+    B = 20.0
+    s = difference()(
+        s,
+        beam,
+        translate([-C/2, -B/2, 10])(cylinder(r=2.6/2, h=20.0)),
+        translate([-C/2,  B/2, 10])(cylinder(r=2.6/2, h=20.0)),
+        translate([ C/2, -B/2, 10])(cylinder(r=2.6/2, h=20.0)),
+        translate([ C/2,  B/2, 10])(cylinder(r=2.6/2, h=20.0)),
+    )
+    return s
+    
+
+def shaft(dia=10.0, length=300.0):
+    return color(steel_colour)(cylinder(r=float(dia)/2, h=length))
+
+
+def linear_bearing_block_sc10uu():
+    pts = [
+        [40.0, 0.0],
+        [40.0, 6.0],
+        [39.0, 7.0],
+        [39.0, 21.0],
+        [32.0, 21.0],
+        [27.0, 26.0],
+        ]
+        
+    pts = pts + mirror_points_x(pts, 20.0)
+
+    pts = shift_points(pts, [-20.0, -13.0])
+
+    u = linear_extrude(35.0)(polygon(pts))
+
+    u = difference()(
+        u,
+        translate([0,0,-1])(
+            cylinder(r=5.0, h=37.0)
+        ),
+        translate([-14.0, -15.0, 35.0/2-10.5])(
+            rotate([-90, 0, 0])(
+                cylinder(r=5.0/2, h=40.0)
+            )
+        ),
+        translate([-14.0, -15.0, 35.0/2+10.5])(
+            rotate([-90, 0, 0])(
+                cylinder(r=5.0/2, h=40.0)
+            )
+        ),
+        translate([14.0, -15.0, 35.0/2-10.5])(
+            rotate([-90, 0, 0])(
+                cylinder(r=5.0/2, h=40.0)
+            )
+        ),
+        translate([14.0, -15.0, 35.0/2+10.5])(
+            rotate([-90, 0, 0])(
+                cylinder(r=5.0/2, h=40.0)
+            )
+        )
+    )
+    
+    return color(aluminium_colour)(u)
+
+def sbr(size, l, h=None):
+    c = lookup('sbr', size)
+    if h is None:
+        h = c['height']
+    pts = [
+        [c['base_width']/2, 0.0],
+        [c['base_width']/2, c['base_thickness']],
+        [c['web_base']/2, c['base_thickness']],
+        [c['web_top']/2, c['web_height']],        
+        ]
+        
+    pts = pts + mirror_points_x(pts, 0.0)
+
+    pts = shift_points(pts, [0.0, -h])
+
+    u = linear_extrude(l)(polygon(pts))
+
+    u = u + cylinder(r=c['rail_dia']/2, h=l)
+
+    return color(steel_colour)(u)
+
+def sbr12(l, h = 20.46):
+    return sbr(12, l, h)
+
+
+def sbr_uu(size):
+    c = lookup('sbr_uu', size)
+    w = c['width']/2
+    pts = [
+        [c['slot']/2, c['slot_depth']],
+        [c['slot']/2+c['slot_flare'], 0.0],
+        [w, 0.0],
+        [w, c['height']],
+    ]
+    
+    pts = pts + mirror_points_x(pts, 0.0)
+
+    pts = shift_points(pts, [0.0, -c['height']+c['top']])
+    
+    l = c['length']
+    u = linear_extrude(l, convexity=4)(polygon(pts))
+
+    holes = []
+    for x, z in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
+        holes.append(
+            translate([x*c['hole_x'], c['height']-c['top']-1,
+                       l/2+z*c['hole_z']])(
+                rotate([-90, 0, 0])(
+                    cylinder(r=c['hole_dia']/2, h=c['hole_depth'])
+                )
+            ))
+    u = difference()(
+        u,
+        translate([0,0,-1])(cylinder(r=c['bore']/2, h=l+2)),
+        *holes
+    )
+    u = translate([0.0, 0.0, -l/2])(
+        u
+    )
+    return color(aluminium_colour)(u)
+
+def sbr12uu():
+    return sbr_uu(12)
+
+
+# Threads.  A thread is the helical sweep of a periodic profile, given
+# as (fraction of the pitch, radius) knots.  One pitch of it is built
+# once per (pitch, profile, segments) and tiled along the length as a
+# single polyhedron.
+
+# segments per turn of modelled threads; 0 draws threaded parts as plain
+# cylinders
+thread_lod = 0
+
+_thread_cache = {}
+
+
+def _thread_pitch(pitch, profile, segments):
+    # radii of one pitch, rows segments apart along z, and the faces
+    # joining it to the next pitch
+    key = (pitch, profile, segments)
+    r = _thread_cache.get(key, None)
+    if r is None:
+        s = segments
+        xs, ys = zip(*profile)
+        j, i = np.mgrid[0:s, 0:s]
+        radii = np.interp(((j - i) % s) / float(s), xs, ys, period=1.0)
+        # quads split along the helix, which keeps the profile's shape
+        a = (j * s + i).ravel()
+        b = (j * s + (i + 1) % s).ravel()
+        c, d = b + s, a + s
+        faces = np.concatenate([np.column_stack([a, b, c]),
+                                np.column_stack([a, c, d])])
+        a = 2 * math.pi * np.arange(s) / s
+        r = (radii, np.cos(a), np.sin(a), faces)
+        _thread_cache[key] = r
+    return r
+
+
+def thread_mesh(pitch, profile, length, segments):
+    # right hand, from z = 0 to length
+    radii, cos, sin, faces = _thread_pitch(pitch, profile, segments)
+    s = segments
+    dz = pitch / float(s)
+    n = int(length / dz + 1e-9)
+    z = np.arange(n + 1) * dz
+    r = radii[np.arange(n + 1) % s]
+    if length - z[-1] > 1e-9:
+        xs, ys = zip(*profile)
+        z = np.append(z, length)
+        r = np.vstack([r, np.interp(
+            (length / pitch - np.arange(s) / float(s)) % 1.0,
+            xs, ys, period=1.0)])
+    rows = len(z)
+    v = np.empty((rows * s + 2, 3))
+    v[:-2, 0] = (r * cos).ravel()
+    v[:-2, 1] = (r * sin).ravel()
+    v[:-2, 2] = np.repeat(z, s)
+    v[-2] = [0.0, 0.0, 0.0]
+    v[-1] = [0.0, 0.0, length]
+    # whole pitches by offsetting the cached faces, then what's left
+    bands = rows - 1
+    f = [faces + k * s * s for k in range(bands // s)]
+    left = bands % s
+    if left:
+        f.append(faces.reshape(2, s, s, 3)[:, :left].reshape(-1, 3)
+                 + (bands // s) * s * s)
+    ring = np.arange(s)
+    top = (rows - 1) * s
+    f.append(np.column_stack([np.full(s, rows * s), (ring + 1) % s, ring]))
+    f.append(np.column_stack([np.full(s, rows * s + 1), top + ring,
+                              top + (ring + 1) % s]))
+    return Mesh(v, np.concatenate(f))
+
+
+def thread(pitch, profile, length, segments=None):
+    # segments defaults to thread_lod, or 12 if that's 0
+    if segments is None:
+        segments = thread_lod or 12
+    return mesh_polyhedron(thread_mesh(float(pitch),
+                                       tuple(map(tuple, profile)),
+                                       float(length), int(segments)))
+
+
+# ball screw: ground to 12mm, 10mm at the root
+sfu1204_thread_profile = ((0.0, 6.0), (0.2, 6.0), (0.5, 5.0), (0.8, 6.0))
+
+
+def sfu1204_screw(l, show_thread=None):
+    # show_thread defaults to thread_lod being set
+    thread_len = l - 15 - 39 - 10
+    if show_thread is None:
+        show_thread = thread_lod > 0
+    if show_thread:
+        s = thread(4.0, sfu1204_thread_profile, thread_len)
+    else:
+        s = cylinder(r=12.0/2,
+                     h=thread_len)
+    u = union()(
+        cylinder(r=8.0/2,
+                 h=l),
+        translate([0.0, 0.0, 15.0])(
+            cylinder(r=10.0/2,
+                     h=l - 15 - 10)
+        ),
+        translate([0,0,15.0+39.0])(
+            s
+        )
+    )
+    return color(Steel)(u)
+
+
+def sfu1204_nut(show_thread=False):
+    u = union()(
+        cylinder(r=42.0/2, h=8.0),
+        translate([0,0,-10.0])(
+            cylinder(r=22.0/2,
+                     h = 10.0 + 0.1)
+        ),
+        translate([0,0,8.0-35.0])(
+            cylinder(r=21.8/2,
+                     h=35.0 - 10.0 - 8.0 + 0.1)
+        )
+    )
+
+
+    drill = translate([0.0,16.0,-0.6])(cylinder(r=4.5/2, h=10.0))
+    h1 = 30.0
+    u = difference()(
+        u,
+        translate([h1/2,-15,-1])(
+            cube([30, 30, 30])
+        ),
+        translate([-h1/2-30,-15,-1])(
+            cube([30, 30, 30])
+        ),
+        translate([0,0,-50])(
+            cylinder(r=12.0/2,
+                     h=60)
+        ),
+        drill,
+        rotate([0,0,45])(drill),
+        rotate([0,0,-45])(drill),
+        rotate([0,0,180])(drill),
+        rotate([0,0,180-45])(drill),
+        rotate([0,0,180+45])(drill),
+    )
+    return color(Steel)(u)
+
+
+def lm_bearing(size, long=False):
+    c = lookup('lm_luu' if long else 'lm_uu', size)
+    u = difference()(
+        cylinder(r=c['outer_dia']/2, h=c['length']),
+        translate([0,0,-1])(
+            cylinder(r=c['bore']/2, h=c['length']+2)
+        )
+    )
+    return color(Steel)(u)
+
+def lm12uu():
+    return lm_bearing(12)
+
+
+def lm12luu():
+    return lm_bearing(12, long=True)
+
+def lm10uu():
+    return lm_bearing(10)
+
+
+def nema(size=23, l=76.0, shaft_dia=8.0):
+    try:
+        w = lookup('nema', size)['width']
+    except KeyError:
+        raise NotImplementedError
+
+    return union()(
+        color(Black)(
+            translate([-w/2,-w/2,-l])(
+                cube([w,w,l])
+            ),
+        ),
+        color(Steel)(
+            cylinder(r=shaft_dia/2, h=21.0)
+        )
+    )
+
+
+def end_support_block(family, size):
+    # BK (two rows of mounting holes) and BF (one row) style blocks
+    c = lookup(family, size)
+    x0 = c['x0']
+    h = c['height']
+    boss = c['boss']
+    holes = []
+    if c['hole_rows'] > 0:
+        rows = [-c['hole_rows']/2+h/2, c['hole_rows']/2+h/2]
+    else:
+        rows = [h/2]
+    for y in [-c['hole_pitch']/2, c['hole_pitch']/2]:
+        for z in rows:
+            holes.append(
+                translate([x0, y, z])(
+                    rotate([0,90,0])(
+                        translate([0,0,-1])(
+                            cylinder(r=c['hole_dia']/2, h=c['depth']+2)
+                        )
+                    )
+                ))
+    return color(Black)(
+        difference()(
+            union()(
+                translate([x0, -c['width']/2, 0.0])(
+                    cube([c['depth'], c['width'], h])
+                ),
+                translate([-boss/2, -boss/2, 0.0])(
+                    cube([boss, boss, c['boss_height']])
+                )
+            ),
+            translate([0,0,-1])(
+                cylinder(r=c['bore']/2, h=c['boss_height']+2)
+            ),
+            *holes
+        )
+    )
+
+def bk10():
+    return end_support_block('bk', 10)
+
+
+def bf10():
+    return end_support_block('bf', 10)
+
+
+def flange_support(family, size):
+    # FK and FF style flanged supports, flange above the spigot
+    c = lookup(family, size)
+    f = c['flange']
+    z0 = c['spigot_height']
+    top = z0 + c['flange_height']
+    if family == 'fk':
+        hole_z = z0 - 1
+    else:
+        hole_z = -1
+    holes = []
+    for a in range(4):
+        holes.append(
+            rotate([0,0,45+90*a])(
+                translate([c['pcd']/2, 0, hole_z])(
+                    cylinder(r=c['hole_dia']/2, h=top+1-hole_z)
+                )
+            ))
+    return color(Black)(
+        difference()(
+            union()(
+                translate([-f/2, -f/2, z0])(
+                    cube([f, f, c['flange_height']])
+                ),
+                cylinder(r=c['spigot']/2, h=z0 + 1.0)
+            ),
+            translate([0,0,-1])(
+                cylinder(r=c['bore']/2, h=top+2)
+            ),
+            *holes
+        )
+    )
+
+def fk10():
+    return flange_support('fk', 10)
+
+
+def ff10():
+    return flange_support('ff', 10)
+
+
+def gt2_pulley(nt, shaft_dia=8.0, belt_width=6.0):
+    d = nt * 2 / math.pi
+    ed = 16 / 12.7 * d
+    hub_h = 8.0
+    u = union()(
+        cylinder(r=ed/2, h=hub_h),
+        translate([0.0, 0.0, hub_h-0.5])(
+            cylinder(r=d/2, h=belt_width+1+1.0)
+        ),
+        translate([0.0, 0.0, hub_h + belt_width + 1])(
+            cylinder(r=ed/2, h=1.0),
+        )
+    )
+
+    u = difference()(
+        u,
+        translate([0,0,-1])(
+            cylinder(r=shaft_dia/2, h=hub_h + belt_width + 2)
+        )
+    )
+    return color(aluminium_colour)(u)
+
+def shaft_support(size, hole_dias=None):
+    # hole_dias, if given, is (left, right) in place of the catalogue's
+    c = lookup('sk', size)
+    y0 = -c['base_offset']
+    t = c['thickness']
+    g = c['base_thickness']
+    if hole_dias is None:
+        hole_dias = (c['hole_dia'], c['hole_dia'])
+    u = union()(
+        translate([-c['body_width']/2, y0, 0.0])(
+            cube([c['body_width'], c['depth'], t])
+        ),
+        translate([-c['width']/2, y0, 0.0])(
+            cube([c['width'], c['base_thickness'], t])
+        )
+    )
+    u = difference()(
+        u,
+        translate([0,0,-1])(
+            cylinder(r=c['bore']/2, h=t+2)
+        ),
+        translate([-c['hole_pitch']/2, y0+g+1, t/2])(
+            rotate([90,0,0])(
+                cylinder(r=hole_dias[0]/2, h=g+2)
+            )
+        ),
+        translate([c['hole_pitch']/2, y0+g+1, t/2])(
+            rotate([90,0,0])(
+                cylinder(r=hole_dias[1]/2, h=g+2)
+            )
+        ),
+    )
+    return color(aluminium_colour)(u)
+
+def sk12():
+    # as first modelled, with a 5.0 right hand hole
+    return shaft_support(12, (5.5, 5.0))
+
+
+def pattern_matrices(data):
+    # (N, 4, 4) placements for a fastener pattern's data.  Patterns are
+    # 'grid' (nx by ny at pitch_x, pitch_y), 'circular' (count on pcd
+    # from start_angle, each turned to face out) or 'explicit'
+    # (placements, a list of 4x4 matrices).
+    kind = data.get('pattern', 'explicit')
+    if kind == 'grid':
+        nx = int(data.get('nx', 1))
+        ny = int(data.get('ny', 1))
+        px = float(data.get('pitch_x', 0.0))
+        py = float(data.get('pitch_y', px))
+        m = np.tile(np.identity(4), (nx * ny, 1, 1))
+        m[:, 0, 3] = np.repeat(np.arange(nx) * px, ny)
+        m[:, 1, 3] = np.tile(np.arange(ny) * py, nx)
+        return m
+    if kind == 'circular':
+        n = int(data['count'])
+        a = np.radians(float(data.get('start_angle', 0.0)) +
+                       np.arange(n) * 360.0 / n)
+        r = float(data['pcd']) / 2
+        m = np.tile(np.identity(4), (n, 1, 1))
+        m[:, 0, 0] = m[:, 1, 1] = np.cos(a)
+        m[:, 1, 0] = np.sin(a)
+        m[:, 0, 1] = -m[:, 1, 0]
+        m[:, 0, 3] = r * np.cos(a)
+        m[:, 1, 3] = r * np.sin(a)
+        return m
+    if kind == 'explicit':
+        return np.asarray(data['placements'], dtype=float).reshape(-1, 4, 4)
+    raise NotImplementedError, 'unknown pattern %s' % kind
+
+
+# however this module came to be imported, the part classes in mech_lib
+# can now use its names
+mech_lib._load_geometry()
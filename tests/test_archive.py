@@ -0,0 +1,90 @@
+import numpy as np
+
+import mech_lib as m
+
+
+def screw_assembly():
+    a = m.SFU1204ScrewAssembly({'length' : 350.0})
+    a.finalise_calcs()
+    a.gen_unique_ids()
+    return a
+
+
+def tree_state(root):
+    return [(n.identifier, n.__class__, n.name, n.data,
+             [c.identifier for c in n.children]) for n in root.iter_nodes()]
+
+
+def test_round_trip(tmpdir):
+    a = screw_assembly()
+    for compress in (True, False):
+        fn = str(tmpdir.join('a%d.arc' % compress))
+        a.save_archive(fn, compress)
+        for lazy in (False, True):
+            b = m.load_archive(fn, lazy)
+            assert tree_state(b) == tree_state(a)
+            assert b.content_hash() == a.content_hash()
+        assert m.verify_archive(a, fn) == {}
+
+
+def test_placements_survive(tmpdir):
+    a = screw_assembly()
+    fn = str(tmpdir.join('a.arc'))
+    a.save_archive(fn)
+    b = m.load_archive(fn, False)
+    for x, y in zip(a.iter_nodes(), b.iter_nodes()):
+        assert np.allclose(x.get_world_matrix(), y.get_world_matrix())
+
+
+def test_verify_finds_changes(tmpdir):
+    a = screw_assembly()
+    fn = str(tmpdir.join('a.arc'))
+    a.save_archive(fn)
+    a.children[1].set_data('spare', True)
+    r = m.verify_archive(a, fn)
+    assert r == {a.children[1].identifier : ['eager: data', 'lazy: data']}
+
+
+def test_not_an_archive(tmpdir):
+    fn = tmpdir.join('x.arc')
+    fn.write('x' * 64)
+    try:
+        m.load_archive(str(fn))
+    except IOError:
+        pass
+    else:
+        assert False, 'loaded a file that is not an archive'
+
+
+def test_lazy_load_reads_on_use(tmpdir, monkeypatch):
+    a = screw_assembly()
+    fn = str(tmpdir.join('a.arc'))
+    a.save_archive(fn)
+
+    def calculate(self):
+        raise AssertionError('recalculated %s' % self.identifier)
+    monkeypatch.setattr(m.SFU1204ScrewAssembly, 'calculate', calculate)
+    b = m.load_archive(fn, True)
+    nodes = list(b.iter_nodes())
+    assert all(['_loader' in n.__dict__ for n in nodes])
+    assert b.data['length'] == 350.0
+    assert [n for n in nodes if '_loader' not in n.__dict__] == [b]
+    # attributes calculate() set come back pointing at the loaded nodes
+    assert b.screw is b.children[0]
+    assert b.finalise_calcs()
+
+
+def test_reader_without_loading(tmpdir):
+    a = screw_assembly()
+    fn = str(tmpdir.join('a.arc'))
+    a.save_archive(fn)
+    r = m.ArchiveReader(fn)
+    try:
+        assert r.ids() == [n.identifier for n in a.iter_nodes()]
+        info = r.node_info(a.identifier)
+        assert info['class'] == 'SFU1204ScrewAssembly'
+        assert info['children'] == [c.identifier for c in a.children]
+        assert r.read_data(a.children[0].identifier) == \
+            a.children[0].data
+    finally:
+        r.close()
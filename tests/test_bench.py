@@ -0,0 +1,44 @@
+import json
+
+import mech_lib_bench as bench
+
+
+def results(path, **seconds):
+    json.dump({'meta' : {}, 'results' : dict(
+        [(k, {'seconds' : v, 'scad_bytes' : 1000})
+         for k, v in seconds.items()])}, open(path, 'w'))
+    return path
+
+
+def test_build_tree():
+    nodes = bench.build_tree(111)
+    assert len(nodes) == 111
+    assert len(list(nodes[0].iter_nodes())) == 111
+    assert max([len(n.children) for n in nodes]) == 10
+
+
+def test_run(tmpdir):
+    out = str(tmpdir.join('b.json'))
+    assert bench.main(['run', '-o', out, '--sizes', '20',
+                       '--repeat', '1']) == 0
+    doc = json.load(open(out))
+    assert doc['meta']['sizes'] == [20]
+    assert 'tree/20/make_bom' in doc['results']
+    assert all([e['seconds'] >= 0 for e in doc['results'].values()])
+    # a run compared with itself has no regressions
+    assert bench.main(['compare', out, out]) == 0
+
+
+def test_compare(tmpdir, capsys):
+    base = results(str(tmpdir.join('a.json')), a=1.0, b=1.0, gone=1.0)
+    same = results(str(tmpdir.join('b.json')), a=1.1, b=0.5, added=1.0)
+    assert bench.main(['compare', base, same]) == 0
+    out = capsys.readouterr()[0]
+    assert 'missing' in out and 'new' in out
+    slow = results(str(tmpdir.join('c.json')), a=1.5, b=1.0)
+    assert bench.main(['compare', base, slow]) == 1
+    out = capsys.readouterr()[0].split('\n')
+    assert [l.split()[0] for l in out if 'SLOWER' in l] == ['a']
+    assert out[-2] == '1 regressions'
+    # unless the threshold allows it
+    assert bench.main(['compare', base, slow, '--threshold', '0.6']) == 0
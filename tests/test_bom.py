@@ -0,0 +1,81 @@
+import StringIO
+import csv
+import json
+
+import numpy as np
+
+import mech_lib as m
+
+
+class Machine(m.AssemblyBase):
+    def __init__(self, lengths):
+        m.AssemblyBase.__init__(self, 'Machine', {})
+        self.lengths = lengths
+
+    def calculate(self):
+        for l in self.lengths:
+            self.add_child(m.SFU1204ScrewAssembly({'length' : l}))
+        return True
+
+
+def machine():
+    a = Machine([400.0, 300.0, 400.0])
+    a.finalise_calcs()
+    return m.BOM(a)
+
+
+def quantities(bom, assemblies=None):
+    return sorted([(l['class'], l['data'].get('length'), l['quantity'])
+                   for l in bom.iter_lines(assemblies)])
+
+
+def test_quantities():
+    bom = machine()
+    assert quantities(bom, False) == [
+        ('BF10Bearing', None, 3), ('BK10Bearing', None, 3),
+        ('SFU1204Screw', 300.0, 1), ('SFU1204Screw', 400.0, 2)]
+    assert quantities(bom, True) == [
+        ('Machine', None, 1),
+        ('SFU1204ScrewAssembly', 300.0, 1),
+        ('SFU1204ScrewAssembly', 400.0, 2)]
+
+
+def test_nested_contents():
+    bom = machine()
+    contents = {}
+    for a, q, line in bom.iter_nested():
+        contents.setdefault((a['class'], a['data'].get('length')), []) \
+            .append((line['class'], line['data'].get('length'), q))
+    assert sorted(contents[('Machine', None)]) == [
+        ('SFU1204ScrewAssembly', 300.0, 1),
+        ('SFU1204ScrewAssembly', 400.0, 2)]
+    assert sorted(contents[('SFU1204ScrewAssembly', 400.0)]) == [
+        ('BF10Bearing', None, 1), ('BK10Bearing', None, 1),
+        ('SFU1204Screw', 400.0, 1)]
+
+
+def test_csv_and_json():
+    bom = machine()
+    f = StringIO.StringIO()
+    bom.write_csv(f)
+    rows = list(csv.reader(StringIO.StringIO(f.getvalue())))
+    assert rows[0] == ['ref', 'quantity', 'class', 'name', 'assembly',
+                       'data']
+    assert len(rows) == 1 + len(list(bom.iter_lines()))
+    f = StringIO.StringIO()
+    bom.write_json(f)
+    d = json.loads(f.getvalue())
+    assert sorted([l['ref'] for l in d['lines']]) == \
+        sorted([l['ref'] for l in bom.iter_lines()])
+    # contents are listed once per distinct sub-assembly
+    assert sum([c['quantity'] for c in d['contents']]) == 3 + 2 * 3
+
+
+def test_numpy_data():
+    p = m.GenericRectangularPrism('p', {'width' : np.float64(2.0),
+                                        'hole' : np.array([1.0, 2.0])})
+    p.finalise_calcs()
+    f = StringIO.StringIO()
+    m.BOM(p).write_json(f)
+    line = json.loads(f.getvalue())['lines'][0]
+    assert line['data'] == {'width' : 2.0, 'hole' : [1.0, 2.0]}
@@ -0,0 +1,105 @@
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+class Fixture(m.AssemblyBase):
+    def __init__(self, parts):
+        m.AssemblyBase.__init__(self, 'Fixture', {})
+        self.parts = parts
+
+    def calculate(self):
+        for p, offset in self.parts:
+            self.add_child(p)
+            p.set_transform(m.translation_matrix(offset))
+        return True
+
+    def generate(self):
+        return m.union()()
+
+
+class Shape(m.AssemblyBase):
+    def __init__(self, name, fn):
+        m.AssemblyBase.__init__(self, name, {})
+        self.fn = fn
+
+    def calculate(self):
+        return True
+
+    def generate(self):
+        return self.fn()
+
+
+def fixture():
+    f = Fixture([(Shape('a', lambda: m.cube(10)), (0, 0, 0)),
+                 (Shape('b', lambda: m.cube(10)), (5, 0, 0)),
+                 (Shape('c', lambda: m.cube(10)), (50, 0, 0)),
+                 (Shape('label', lambda: m.text('hi')), (0, 0, 0))])
+    f.finalise_calcs()
+    return f
+
+
+def test_unbounded_parts_are_listed(monkeypatch):
+    def no_openscad(shape):
+        raise m.NotMeshable("OpenSCAD failed")
+    monkeypatch.setattr(m, 'openscad_mesh', no_openscad)
+    f = fixture()
+    bvh = m.BVH.from_assembly(f)
+    assert [n.name for n in bvh.unbounded] == ['label']
+    assert sorted([n.name for n in bvh.items]) == ['a', 'b', 'c']
+    r = m.interference(f)
+    assert [(d['a'].name, d['b'] and d['b'].name, d['method'])
+            for d in r] == [('a', 'b', 'mesh'),
+                            ('label', None, 'unbounded')]
+
+
+def test_bounds_from_mesh(monkeypatch):
+    # what OpenSCAD would make of the text
+    box = m.to_mesh(m.cube([12, 5, 1]))
+    monkeypatch.setattr(m, 'openscad_mesh', lambda shape: box)
+    f = fixture()
+    label = f.children[3]
+    lo, hi = label.get_bbox()
+    assert lo.tolist() == [0, 0, 0] and hi.tolist() == [12, 5, 1]
+    assert m.BVH.from_assembly(f).unbounded == []
+
+
+def test_overlapping_pairs():
+    pts = np.array([[0, 0, 0], [5, 0, 0], [20, 0, 0], [21, 0, 0]],
+                   dtype=float)
+    bvh = m.BVH(range(4), pts - 1, pts + 1, leaf_size=1)
+    assert sorted(bvh.overlapping_pairs()) == [(2, 3)]
+
+
+def test_shape_bbox_contains_mesh():
+    # the analytic bounds are exact on primitives and never tighter than
+    # the tessellation
+    for shape in [m.cube([1, 2, 3]),
+                  m.translate([1, 2, 3])(m.cylinder(r=2, h=5)),
+                  m.rotate([30, 40, 0])(m.cube(2, center=True)),
+                  m.linear_extrude(4)(m.polygon([[0, 0], [10, 0], [5, 8]]))]:
+        lo, hi = m.shape_bbox(shape)
+        v = m.to_mesh(shape).vertices
+        assert (lo <= v.min(axis=0) + 1e-9).all()
+        assert (hi >= v.max(axis=0) - 1e-9).all()
+    lo, hi = m.shape_bbox(m.translate([1, 2, 3])(m.cylinder(r=2, h=5)))
+    assert np.allclose(lo, [-1, 0, 3]) and np.allclose(hi, [3, 4, 8])
+
+
+def test_queries_match_brute_force():
+    rs = np.random.RandomState(1)
+    lo = rs.rand(200, 3) * 100
+    hi = lo + rs.rand(200, 3) * 10
+    bvh = m.BVH(range(200), lo, hi)
+    q_lo, q_hi = np.array([20, 20, 20]), np.array([50, 40, 60])
+    expect = [i for i in range(200)
+              if (lo[i] < q_hi).all() and (hi[i] > q_lo).all()]
+    assert sorted(bvh.query_box(q_lo, q_hi)) == expect
+    p = np.array([50.0, 50.0, 50.0])
+    dist = np.sqrt((np.maximum(np.maximum(lo - p, p - hi), 0) ** 2)
+                   .sum(axis=1))
+    got = bvh.nearest(p, k=3)
+    assert np.allclose([d for d, i in got], sorted(dist)[:3])
+    pairs = [(i, j) for i in range(200) for j in range(i + 1, 200)
+             if (lo[i] < hi[j]).all() and (lo[j] < hi[i]).all()]
+    assert sorted(bvh.overlapping_pairs()) == pairs
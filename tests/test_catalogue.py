@@ -0,0 +1,37 @@
+import mech_lib as m
+
+
+def test_lookup():
+    nut = m.lookup('metric_nut', 4)
+    assert nut['size'] == 4.0
+    assert nut['outer_dia'] == 7.66 and nut['height'] == 3.2
+    # sizes match whatever their type
+    assert m.lookup('metric_nut', '4.0') is nut
+    assert m.lookup('metric_nut', 4.0000001) is nut
+    assert m.lookup('metric_nut', 1.6)['height'] == 1.3
+
+
+def test_missing():
+    for family, size in (('metric_nut', 7), ('no_such_part', 4)):
+        try:
+            m.lookup(family, size)
+        except KeyError, e:
+            assert str(size) in str(e) and family in str(e)
+        else:
+            assert False
+
+
+def test_sizes():
+    sizes = m.catalogue_sizes('metric_nut')
+    assert sizes == sorted(sizes)
+    assert sizes[0] == 1.0 and sizes[-1] == 64.0
+    assert 4.0 in sizes
+    for family in m.catalogue():
+        for size in m.catalogue_sizes(family):
+            assert m.lookup(family, size)['size'] == size
+
+
+def test_parts_use_the_catalogue():
+    nut = m.MetricNut({'thread_size' : 5})
+    nut.finalise_calcs()
+    assert nut.data['outer_dia'] == m.lookup('metric_nut', 5)['outer_dia']
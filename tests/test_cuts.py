@@ -0,0 +1,88 @@
+import mech_lib as m
+
+
+class Frame(m.AssemblyBase):
+    def __init__(self, parts):
+        m.AssemblyBase.__init__(self, 'Frame', {})
+        self.parts = parts
+
+    def calculate(self):
+        for p in self.parts:
+            self.add_child(p)
+        return True
+
+
+def lengths(plan):
+    return [(b['stock'], [c[0] for c in b['cuts']]) for b in plan['bars']]
+
+
+def test_exact_fit_with_kerf():
+    # each cut takes its length plus a kerf, so two of 497 fill 1000
+    plan = m.cut_plan([(497.0, 'a'), (497.0, 'b')], [1000.0], kerf=3.0)
+    assert lengths(plan) == [(1000.0, [497.0, 497.0])]
+    assert plan['bars'][0]['offcut'] == 0.0
+    # and two of 498 don't
+    plan = m.cut_plan([(498.0, 'a'), (498.0, 'b')], [1000.0], kerf=3.0)
+    assert lengths(plan) == [(1000.0, [498.0]), (1000.0, [498.0])]
+
+
+def test_zero_kerf():
+    plan = m.cut_plan([(500.0, 'a'), (500.0, 'b')], [1000.0], kerf=0.0)
+    assert lengths(plan) == [(1000.0, [500.0, 500.0])]
+    assert plan['waste'] == 0.0 and plan['efficiency'] == 1.0
+
+
+def test_too_long_and_no_stock_left():
+    # a cut that fits the stock but not with its kerf
+    for cuts, stock in (([(999.0, 'a')], [1000.0]),
+                        ([(600.0, 'a'), (600.0, 'b')], {1000.0 : 1})):
+        try:
+            m.cut_plan(cuts, stock, kerf=3.0)
+        except ValueError:
+            pass
+        else:
+            assert False
+
+
+def test_shortest_stock_and_counts():
+    cuts = [(700.0, 'a'), (280.0, 'b'), (300.0, 'c'), (100.0, 'd')]
+    plan = m.cut_plan(cuts, {2000.0 : 1, 1000.0 : None, 500.0 : 2})
+    assert sorted(c[1] for b in plan['bars'] for c in b['cuts']) == \
+        ['a', 'b', 'c', 'd']
+    for b in plan['bars']:
+        used = sum([c[0] + 3.0 for c in b['cuts']])
+        assert b['offcut'] == b['stock'] - used >= 0
+        assert b['stock'] == min([l for l in (2000.0, 1000.0, 500.0)
+                                  if l >= used])
+    assert sum(plan['stock'].values()) == len(plan['bars'])
+    assert plan['stock'].get(2000.0, 0) <= 1
+    assert plan['cut_length'] == 1380.0
+    assert plan['waste'] == plan['stock_length'] - 1380.0
+    assert m.cut_plan([], [1000.0])['bars'] == []
+
+
+def test_cut_list(capsys):
+    f = Frame([m.Beam40x40({'length' : 600.0}),
+               m.Beam40x40({'length' : 300.0}),
+               m.GenericShaft('shaft', {'dia' : 8.0, 'length' : 250.0}),
+               m.GenericShaft('shaft', {'dia' : 10.0, 'length' : 250.0})])
+    f.finalise_calcs()
+    f.gen_unique_ids()
+    items = f.make_cut_list([1000.0])
+    # shafts of each diameter are cut from their own stock
+    assert sorted([(i['class'], len(i['plan']['bars'])) for i in items]) \
+        == [('Beam40x40', 1), ('GenericShaft', 1), ('GenericShaft', 1)]
+    items = m.cut_list(f, {'Beam40x40' : [1000.0],
+                           'GenericShaft' : {300.0 : 2}})
+    assert [lengths(i['plan']) for i in items
+            if i['class'] == 'GenericShaft'] == [[(300.0, [250.0])]] * 2
+    try:
+        m.cut_list(f, {'Beam40x40' : [1000.0]})
+    except ValueError:
+        pass
+    else:
+        assert False
+    capsys.readouterr()
+    m.print_cut_list(items)
+    out = capsys.readouterr()[0]
+    assert '1000: 600 300 (offcut 94)' in out
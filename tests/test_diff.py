@@ -0,0 +1,71 @@
+import mech_lib_geometry as m
+
+
+def screw_assembly(length=400.0):
+    a = m.SFU1204ScrewAssembly({'length' : length})
+    a.finalise_calcs()
+    a.gen_unique_ids()
+    return a
+
+
+def test_content_hash():
+    a = screw_assembly()
+    b = screw_assembly()
+    assert a.content_hash() == b.content_hash()
+    h = a.content_hash()
+    a.children[1].set_data('x', 5)
+    assert a.content_hash() != h
+    # the untouched siblings keep theirs
+    assert a.children[2].content_hash() == b.children[2].content_hash()
+
+
+def test_same_trees():
+    a = screw_assembly()
+    d = m.diff_assemblies(a, screw_assembly())
+    assert d == {'added': [], 'removed': [], 'modified': []}
+
+
+def test_modified():
+    a = screw_assembly()
+    b = screw_assembly()
+    b.children[1].set_data('x', 5)
+    d = m.diff_assemblies(a, b)
+    assert d['added'] == [] and d['removed'] == []
+    assert [e['identifier'] for e in d['modified']] == \
+        [b.children[1].identifier]
+    assert d['modified'][0]['changes'] == {'x' : (None, 5)}
+
+
+def test_added_and_removed():
+    a = screw_assembly()
+    b = screw_assembly()
+    nut = m.MetricNut({'thread_size' : 4})
+    b.add_child(nut)
+    d = m.diff_assemblies(a, b)
+    assert [e['class'] for e in d['added']] == ['MetricNut']
+    assert d['removed'] == []
+    d = m.diff_assemblies(b, a)
+    assert [e['class'] for e in d['removed']] == ['MetricNut']
+    assert d['added'] == []
+
+
+def test_archives_match_trees(tmpdir, capsys):
+    a = screw_assembly()
+    b = screw_assembly()
+    b.children[1].set_data('x', 5)
+    fa = str(tmpdir.join('a.arc'))
+    fb = str(tmpdir.join('b.arc'))
+    a.save_archive(fa)
+    b.save_archive(fb)
+    d = m.diff_archives(fa, fb)
+    e = m.diff_assemblies(a, b)
+    # an archive has no nodes to give, only identifiers
+    assert [x['identifier'] for x in d['modified']] == \
+        [x['identifier'] for x in e['modified']]
+    assert d['modified'][0]['changes'] == e['modified'][0]['changes']
+    assert d['modified'][0]['before'] == a.children[1].identifier
+    capsys.readouterr()
+    m.print_diff(d)
+    out = capsys.readouterr()[0].split('\n')
+    assert out[0].split()[:2] == ['~', b.children[1].identifier]
+    assert out[1].split() == ['x', 'None', '->', '5']
@@ -0,0 +1,56 @@
+import mech_lib_geometry as m
+
+
+def screw_assembly():
+    a = m.SFU1204ScrewAssembly({'length' : 400.0})
+    a.finalise_calcs()
+    return a
+
+
+def test_fork_reads_share_the_source():
+    a = screw_assembly()
+    f = a.fork()
+    assert f.data is a.data
+    assert f.children[1].data is a.children[1].data
+    assert f.screw is f.children[0]
+    assert f.children[0].parent is f
+    assert f.content_hash() == a.content_hash()
+    assert m.scad_render(f.generate()) == m.scad_render(a.generate())
+
+
+def test_fork_copies_on_write():
+    a = screw_assembly()
+    f = a.fork()
+    f.children[1].set_data('x', 5)
+    assert a.children[1].data == {}
+    assert f.children[1].data == {'x' : 5}
+    # only the written node has its own copy
+    assert f.children[2].data is a.children[2].data
+    assert f.content_hash() != a.content_hash()
+    f.children[2].note = 'spare'
+    assert not hasattr(a.children[2], 'note')
+    f.add_child(m.MetricNut({'thread_size' : 4}))
+    assert len(f.children) == 4 and len(a.children) == 3
+
+
+def test_writing_the_source_keeps_the_fork():
+    a = screw_assembly()
+    before = a.content_hash()
+    f = a.fork()
+    # the fork hasn't looked below its top yet
+    a.children[1].set_data('x', 5)
+    a.set_data('length', 200.0)
+    assert f.children[1].data == {}
+    assert f.data['length'] == 400.0
+    assert f.content_hash() == before
+
+
+def test_fork_of_fork():
+    a = screw_assembly()
+    f = a.fork()
+    g = f.fork()
+    f.children[0].set_data('length', 100.0)
+    assert g.children[0].data['length'] == 400.0
+    g.children[0].set_data('length', 50.0)
+    assert f.children[0].data['length'] == 100.0
+    assert a.children[0].data['length'] == 400.0
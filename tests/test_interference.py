@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+class Fixture(m.AssemblyBase):
+    def __init__(self, parts):
+        m.AssemblyBase.__init__(self, 'Fixture', {})
+        self.parts = parts
+
+    def calculate(self):
+        for p, offset in self.parts:
+            self.add_child(p)
+            p.set_transform(m.translation_matrix(offset))
+        return True
+
+    def generate(self):
+        return m.union()()
+
+
+class Bolt(m.AssemblyBase):
+    def __init__(self, d, l):
+        m.AssemblyBase.__init__(self, 'Bolt', {'d' : d, 'l' : l})
+
+    def calculate(self):
+        return True
+
+    def generate(self):
+        return m.metric_bolt(self.data['d'], self.data['l'])
+
+
+class Block(m.AssemblyBase):
+    def __init__(self, size):
+        m.AssemblyBase.__init__(self, 'Block', {'size' : size})
+
+    def calculate(self):
+        return True
+
+    def generate(self):
+        return m.cube(self.data['size'])
+
+
+def bolted_plate(dia):
+    plate = m.GenericDrilledPlate('plate', {'width' : 50.0, 'depth' : 50.0,
+                                            'height' : 6.0,
+                                            'drills' : [(25.0, 25.0, dia)]})
+    f = Fixture([(plate, (0, 0, 0)), (Bolt(3, 16), (25, 25, 6))])
+    f.finalise_calcs()
+    return f
+
+
+def polygon_area(r):
+    n = m.get_fragments(r)
+    return 0.5 * n * r * r * math.sin(2 * math.pi / n)
+
+
+def test_bolt_through_clearance_hole():
+    assert m.interference(bolted_plate(3.4)) == []
+    # the same size as the bolt, so the faces meet but don't overlap
+    assert m.interference(bolted_plate(3.0)) == []
+
+
+def test_bolt_in_tight_hole():
+    r = m.interference(bolted_plate(2.8))
+    assert len(r) == 1
+    assert r[0]['method'] == 'exact'
+    expected = (polygon_area(1.5) - polygon_area(1.4)) * 6.0
+    assert abs(r[0]['volume'] - expected) < 1e-6
+
+
+def test_blocks():
+    f = Fixture([(Block([10, 10, 10]), (0, 0, 0)),
+                 (Block([10, 10, 10]), (10, 0, 0))])
+    f.finalise_calcs()
+    assert m.interference(f) == []
+    # a sliver thinner than the sample grid is still reported
+    f = Fixture([(Block([10, 10, 10]), (0, 0, 0)),
+                 (Block([10, 10, 10]), (9.999, 0, 0))])
+    f.finalise_calcs()
+    r = m.interference(f, samples=1000)
+    assert len(r) == 1
+    assert r[0]['volume'] < 1.0
+
+
+def test_screw_assembly_is_clear():
+    a = m.SFU1204ScrewAssembly()
+    a.finalise_calcs()
+    assert m.interference(a) == []
+
+
+def test_min_volume_and_method():
+    f = Fixture([(Block([10, 10, 10]), (0, 0, 0)),
+                 (Block([10, 10, 10]), (5, 5, 5))])
+    f.finalise_calcs()
+    r = f.check_interference()
+    assert len(r) == 1
+    # no holes, so the meshes decide and the volume is sampled
+    assert r[0]['method'] == 'mesh'
+    assert abs(r[0]['volume'] - 125.0) < 12.5
+    assert f.check_interference(min_volume=200.0) == []
+
+
+def test_print_interference(capsys):
+    r = m.interference(bolted_plate(2.8))
+    m.print_interference(r)
+    out = capsys.readouterr()[0].split()
+    assert out[:2] == [r[0]['a'].identifier, r[0]['b'].identifier]
+    assert out[-1] == 'exact'
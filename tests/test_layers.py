@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+calc_run = '''
+import StringIO
+import sys
+import mech_lib as m
+a = m.SFU1204ScrewAssembly({'length' : 400.0})
+a.finalise_calcs()
+a.make_bom()
+m.BOM(a).write_csv(StringIO.StringIO())
+p = m.GenericDrilledPlate('plate', {'width' : 50.0, 'depth' : 50.0,
+                                    'height' : 6.0,
+                                    'drills' : [(25.0, 25.0, 3.4)]})
+p.finalise_calcs()
+m.BOM(p).write_csv(StringIO.StringIO())
+print sorted(k for k in ('numpy', 'solid', 'mech_lib_geometry')
+             if k in sys.modules)
+a.children[0].generate()
+print sorted(k for k in ('numpy', 'solid', 'mech_lib_geometry')
+             if k in sys.modules)
+'''
+
+
+def test_calculation_needs_no_geometry():
+    out = subprocess.check_output([sys.executable, '-c', calc_run], cwd=root)
+    before, after = out.strip().split('\n')[-2:]
+    assert before == '[]'
+    assert after == "['mech_lib_geometry', 'numpy', 'solid']"
+
+
+def test_geometry_names():
+    import mech_lib
+    import mech_lib_geometry
+    mech_lib._load_geometry()
+    # the part classes see the real SolidPython classes
+    assert mech_lib.cube is mech_lib_geometry.cube
+    assert mech_lib_geometry.AssemblyBase is mech_lib.AssemblyBase
+    nut = mech_lib.MetricNut({'thread_size' : 4})
+    nut.finalise_calcs()
+    shape = nut.generate()
+    assert isinstance(shape, mech_lib_geometry.OpenSCADObject)
@@ -0,0 +1,83 @@
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+class Block(m.AssemblyBase):
+    def __init__(self, size, data={}):
+        m.AssemblyBase.__init__(self, 'Block', dict(data, size=size))
+
+    def calculate(self):
+        return True
+
+    def generate(self):
+        return m.cube(self.get_data('size'))
+
+
+class Pair(m.AssemblyBase):
+    def __init__(self, data={}):
+        m.AssemblyBase.__init__(self, 'Pair', dict(data))
+
+    def calculate(self):
+        self.add_child(Block([10, 20, 30]))
+        self.add_child(Block([10, 10, 10], {'material' : 'aluminium'}))
+        self.children[1].set_transform(m.translation_matrix([100, 0, 0]))
+        return True
+
+    def generate(self):
+        return m.union()()
+
+
+def box_inertia(mass, a, b, c):
+    return np.diag([b*b + c*c, a*a + c*c, a*a + b*b]) * mass / 12.0
+
+
+def test_box():
+    d = 2.0
+    p = m.shape_mass(m.cube([10, 20, 30]), d)
+    assert abs(p.mass - 6000 * d) < 1e-9
+    assert np.allclose(p.com, [5, 10, 15])
+    assert np.allclose(p.inertia, box_inertia(p.mass, 10, 20, 30))
+    # the same from the mesh
+    q = m.MassProperties.from_mesh(m.to_mesh(m.cube([10, 20, 30])), d)
+    assert abs(q.mass - p.mass) < 1e-9
+    assert np.allclose(q.com, p.com) and np.allclose(q.inertia, p.inertia)
+
+
+def test_transformed_cylinder():
+    # a true cylinder, not its tessellation, turned onto the y axis
+    shape = m.rotate([90, 0, 0])(m.translate([1, 2, 3])
+                                 (m.cylinder(r=2, h=5)))
+    p = m.shape_mass(shape, 1.0)
+    mass = np.pi * 4 * 5
+    assert abs(p.mass - mass) < 1e-9
+    assert np.allclose(p.com, [1, -5.5, 2])
+    side = mass * (3 * 4 + 25) / 12.0
+    assert np.allclose(p.inertia, np.diag([side, mass * 2, side]))
+
+
+def test_densities():
+    assert m.colour_density(m.aluminium_colour) == \
+        m.material_densities['aluminium']
+    assert m.colour_density((0.3, 0.2, 0.9)) is None
+    assert m.colour_density(None) is None
+
+
+def test_assembly_roll_up():
+    a = Pair()
+    a.finalise_calcs()
+    steel = m.material_densities[m.default_material]
+    alu = m.material_densities['aluminium']
+    p = a.get_mass_properties()
+    masses = [6000 * steel, 1000 * alu]
+    assert abs(p.mass - sum(masses)) < 1e-12
+    com = (masses[0] * np.array([5, 10, 15]) +
+           masses[1] * np.array([105, 5, 5])) / sum(masses)
+    assert np.allclose(p.com, com)
+    # cached until something changes
+    assert a.get_mass_properties() is p
+    a.children[0].set_data('size', [10, 20, 60])
+    assert abs(a.get_mass_properties().mass -
+               (12000 * steel + masses[1])) < 1e-12
+    a.set_data('density', 1e-6)
+    assert abs(a.get_mass_properties().mass - 13000e-6) < 1e-12
@@ -0,0 +1,87 @@
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+class Stack(m.AssemblyBase):
+    def __init__(self, n):
+        m.AssemblyBase.__init__(self, 'Stack', {})
+        self.n = n
+
+    def calculate(self):
+        for i in range(self.n):
+            self.add_child(m.GenericRectangularPrism(
+                'p%d' % i, {'width' : 10.0, 'depth' : 10.0,
+                            'height' : 2.0 + i}))
+        return True
+
+    def generate(self):
+        return m.union()()
+
+
+def stack(n):
+    s = Stack(n)
+    s.finalise_calcs()
+    return s
+
+
+def z_of(node):
+    return node.get_world_matrix()[2, 3]
+
+
+def test_connector_frame():
+    f = m.connector_frame([1, 2, 3], [0, 0, -2])
+    assert np.allclose(f[:3, :3].dot(f[:3, :3].T), np.identity(3))
+    assert np.allclose(f[:3, 2], [0, 0, -1])
+    assert np.allclose(f[:3, 3], [1, 2, 3])
+    assert abs(np.linalg.det(f[:3, :3]) - 1) < 1e-12
+
+
+def test_coincident_chain():
+    s = stack(3)
+    a, b, c = s.children
+    # added out of order, so b is only placed once a is
+    s.add_mate('coincident', b, 'top', c, 'bottom')
+    s.add_mate('coincident', a, 'top', b, 'bottom', offset=1.0)
+    assert s.solve_mates() == 1
+    assert z_of(b) == 3.0 and z_of(c) == 6.0
+    # faces meet, so the frames are opposed
+    top = a.get_world_matrix().dot(a.get_connectors()['top'])
+    bottom = b.get_world_matrix().dot(b.get_connectors()['bottom'])
+    assert np.allclose(top[:3, 2], -bottom[:3, 2])
+    assert s.solve_mates() == 0
+
+
+def test_islands_solve_separately():
+    s = stack(4)
+    a, b, c, d = s.children
+    solver = s.get_mate_solver()
+    s.add_mate('coincident', a, 'top', b, 'bottom')
+    mate = s.add_mate('concentric', c, 'top', d, 'top', offset=5.0)
+    assert s.solve_mates() == 2
+    assert z_of(d) == 4.0 + 5.0 - 5.0
+    solver.set_offset(mate, offset=1.0)
+    assert s.solve_mates() == 1
+    assert z_of(d) == 4.0 + 1.0 - 5.0
+    assert z_of(b) == 2.0
+
+
+def test_residuals():
+    s = stack(2)
+    a, b = s.children
+    s.add_mate('coincident', a, 'top', b, 'bottom')
+    bad = s.add_mate('coincident', a, 'bottom', b, 'top')
+    s.solve_mates()
+    assert z_of(b) == 2.0
+    assert s.get_mate_solver().residuals.keys() == [bad]
+
+
+def test_unknown_kind():
+    s = stack(2)
+    a, b = s.children
+    try:
+        m.Mate('glued', a, 'top', b, 'bottom')
+    except ValueError:
+        pass
+    else:
+        assert False, 'unknown mate kind accepted'
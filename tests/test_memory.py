@@ -0,0 +1,64 @@
+import mech_lib_geometry as m
+
+
+calls = []
+
+
+class Rod(m.GenericShaft):
+    def generate(self):
+        calls.append(self.name)
+        return m.GenericShaft.generate(self)
+
+
+class Row(m.AssemblyBase):
+    def __init__(self, name, parts):
+        m.AssemblyBase.__init__(self, name, {})
+        self.parts = parts
+
+    def calculate(self):
+        for p in self.parts:
+            self.add_child(p)
+        return True
+
+    def generate(self):
+        calls.append(self.name)
+        return m.union()(*[m.translate([i * 20, 0, 0])(c.generate())
+                           for i, c in enumerate(self.children)
+                           if not isinstance(c, Label)])
+
+
+class Label(m.AssemblyBase):
+    def calculate(self):
+        return True
+
+
+def rod(name):
+    return Rod(name, {'dia' : 10.0, 'length' : 100.0})
+
+
+def tree():
+    top = Row('top', [Row('left', [rod('a'), rod('b')]),
+                      Row('right', [rod('c')]), Label('label', {})])
+    top.finalise_calcs()
+    return top
+
+
+def test_each_node_generated_once():
+    top = tree()
+    del calls[:]
+    r = m.memory_report(top, geometry=True)
+    assert sorted(calls) == ['a', 'b', 'c', 'left', 'right', 'top']
+    assert r['ungenerated'] == ['label']
+    # the nodes generate() was swapped on are back as they were
+    assert 'generate' not in top.children[0].__dict__
+
+
+def test_geometry_charged_once():
+    top = tree()
+    r = m.memory_report(top, geometry=True)
+    count, size = m.scad_size(top.generate())
+    assert r['total']['geometry_nodes'] == count
+    rods = r['classes']['Rod']['geometry_nodes']
+    assert rods == 3 * m.scad_size(rod('x').generate())[0]
+    assert r['classes']['Row']['geometry_nodes'] == count - rods
+    assert 'geometry' in r['total'] and r['total']['geometry'] > 0
@@ -0,0 +1,101 @@
+import math
+import os
+import tempfile
+
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+def closed(mesh):
+    # every edge used once each way, with coincident vertices welded
+    key = {}
+    ids = [key.setdefault(tuple(np.round(v, 6)), len(key))
+           for v in mesh.vertices]
+    edges = {}
+    for f in mesh.faces:
+        a, b, c = [ids[i] for i in f]
+        for e in ((a, b), (b, c), (c, a)):
+            edges[e] = edges.get(e, 0) + 1
+    return all([n == 1 and edges.get((e[1], e[0])) == 1
+                for e, n in edges.items()])
+
+
+def polygon_area(r):
+    n = m.get_fragments(r)
+    return 0.5 * n * r * r * math.sin(2 * math.pi / n)
+
+
+def check(shape, volume):
+    mesh = m.to_mesh(shape)
+    assert closed(mesh)
+    assert abs(mesh.volume() - volume) < 1e-6 * max(1.0, volume)
+    return mesh
+
+
+def test_primitives():
+    check(m.cube([1, 2, 3]), 6.0)
+    check(m.cube(2, center=True), 8.0)
+    check(m.cylinder(r=2, h=5), polygon_area(2) * 5)
+    cone = m.to_mesh(m.cylinder(r1=2, r2=1, h=5))
+    assert closed(cone)
+    # both ends take the fragment count of the larger radius
+    a1 = polygon_area(2)
+    a2 = a1 / 4
+    assert abs(cone.volume() - 5 / 3.0 * (a1 + a2 + math.sqrt(a1 * a2))) \
+        < 1e-6
+    sphere = m.to_mesh(m.sphere(r=3))
+    assert closed(sphere)
+    assert 0.9 * 36 * math.pi < sphere.volume() < 36 * math.pi
+
+
+def test_extrusions_and_tubes():
+    square = m.polygon([[0, 0], [10, 0], [10, 10], [0, 10]])
+    check(m.linear_extrude(4)(square), 400.0)
+    check(m.linear_extrude(3)(m.circle(r=2)), polygon_area(2) * 3)
+    tube = m.difference()(m.cylinder(r=5, h=10),
+                          m.translate([0, 0, -1])(m.cylinder(r=3, h=12)))
+    check(tube, (polygon_area(5) - polygon_area(3)) * 10)
+
+
+def test_transforms_keep_faces_outward():
+    check(m.mirror([1, 0, 0])(m.cube([1, 2, 3])), 6.0)
+    check(m.rotate([30, 40, 50])(m.translate([1, 2, 3])(m.cube([1, 2, 3]))),
+          6.0)
+    mesh = check(m.translate([5, 0, 0])(m.union()(m.cube(1),
+                                                  m.translate([3, 0, 0])
+                                                  (m.cube(1)))), 2.0)
+    assert np.allclose(mesh.vertices.min(axis=0), [5, 0, 0])
+
+
+def test_not_meshable():
+    for shape in [m.rotate_extrude()(m.translate([5, 0, 0])(m.square(2))),
+                  m.difference()(m.cube(10),
+                                 m.translate([5, 5, -1])
+                                 (m.cylinder(r=2, h=12)))]:
+        try:
+            m.to_mesh(shape)
+        except m.NotMeshable:
+            pass
+        else:
+            assert False, 'meshed %s' % shape.name
+    try:
+        m.shape_mesh(m.text('x'), fallback=False)
+    except m.NotMeshable:
+        pass
+    else:
+        assert False, 'meshed text'
+
+
+def test_stl_round_trip():
+    shape = m.cylinder(r=2, h=5)
+    fd, fn = tempfile.mkstemp(suffix='.stl')
+    os.close(fd)
+    try:
+        assert m.export_stl(shape, fn) == 'mesh'
+        mesh = m.read_stl(fn)
+    finally:
+        os.remove(fn)
+    assert closed(mesh)
+    assert len(mesh.faces) == len(m.to_mesh(shape).faces)
+    assert abs(mesh.volume() - polygon_area(2) * 5) < 1e-3
@@ -0,0 +1,81 @@
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+class Frame(m.AssemblyBase):
+    def __init__(self, parts):
+        m.AssemblyBase.__init__(self, 'Frame', {})
+        self.parts = parts
+
+    def calculate(self):
+        for p in self.parts:
+            self.add_child(p)
+        return True
+
+    def generate(self):
+        return m.union()()
+
+
+def test_grid():
+    d = {'pattern' : 'grid', 'nx' : 3, 'ny' : 2, 'pitch_x' : 10.0,
+         'pitch_y' : 5.0}
+    mats = m.pattern_matrices(d)
+    assert m.pattern_count(d) == len(mats) == 6
+    assert np.allclose(mats[:, :3, :3], np.identity(3))
+    assert sorted(map(tuple, mats[:, :3, 3].tolist())) == \
+        [(x, y, 0.0) for x in (0.0, 10.0, 20.0) for y in (0.0, 5.0)]
+    # pitch_y defaults to pitch_x
+    d = {'pattern' : 'grid', 'nx' : 1, 'ny' : 2, 'pitch_x' : 7.0}
+    assert m.pattern_matrices(d)[1, 1, 3] == 7.0
+
+
+def test_circular():
+    d = {'pattern' : 'circular', 'count' : 4, 'pcd' : 20.0,
+         'start_angle' : 90.0}
+    mats = m.pattern_matrices(d)
+    assert m.pattern_count(d) == len(mats) == 4
+    assert np.allclose(mats[:, :3, 3],
+                       [[0, 10, 0], [-10, 0, 0], [0, -10, 0], [10, 0, 0]])
+    # each turned to face out, so its x axis points away from the centre
+    for mat in mats:
+        assert np.allclose(mat[:3, 0] * 10, mat[:3, 3])
+        assert np.allclose(np.linalg.det(mat[:3, :3]), 1.0)
+
+
+def test_explicit_and_unknown():
+    p = [m.translation_matrix((1, 2, 3)), m.translation_matrix((4, 5, 6))]
+    d = {'placements' : p}
+    assert m.pattern_count(d) == 2
+    assert np.allclose(m.pattern_matrices(d), p)
+    try:
+        m.pattern_matrices({'pattern' : 'spiral'})
+    except NotImplementedError:
+        pass
+    else:
+        assert False
+
+
+def test_bom_counts_each_placement():
+    grid = {'pattern' : 'grid', 'nx' : 2, 'ny' : 3, 'pitch_x' : 10.0}
+    f = Frame([m.FastenerPattern(dict(grid, thread_size=4, length=12)),
+               m.FastenerPattern(dict(grid, fastener='nut', thread_size=4)),
+               m.FastenerPattern({'fastener' : 'washer', 'thread_size' : 4,
+                                  'pattern' : 'circular', 'count' : 5,
+                                  'pcd' : 30.0})])
+    f.finalise_calcs()
+    q = dict([(l['name'], l['quantity'])
+              for l in m.BOM(f).iter_lines(False)])
+    assert q['M4x12Bolt'] == 6
+    assert q['M4Nut'] == 6
+    assert q['M4Washer'] == 5
+
+
+def test_generate_loops():
+    p = m.FastenerPattern({'fastener' : 'nut', 'thread_size' : 4,
+                           'pattern' : 'grid', 'nx' : 4, 'pitch_x' : 10.0})
+    p.finalise_calcs()
+    shape = p.generate()
+    assert np.allclose(shape.loop_matrices, m.pattern_matrices(p.data))
+    # the nut is written out once however many are placed
+    assert m.scad_render(shape).count('cylinder') == 2
@@ -0,0 +1,88 @@
+import mech_lib_geometry as m
+
+
+class Stand(m.AssemblyBase):
+    def __init__(self, child):
+        m.AssemblyBase.__init__(self, 'Stand', {'height' : 10.0})
+        self.child = child
+
+    def calculate(self):
+        self.add_child(self.child)
+        return True
+
+    def place_children(self):
+        self.child.set_transform(
+            m.translation_matrix([0, 0, self.data['height']]))
+
+    def generate(self):
+        return m.union()()
+
+
+def screw_assembly():
+    a = m.SFU1204ScrewAssembly({'length' : 400.0})
+    a.finalise_calcs()
+    return a
+
+
+def test_set_data_places_children_again():
+    a = screw_assembly()
+    tree = a.get_transform_tree()
+    nut = a.floating_nut
+    assert tree.world_of(nut)[2, 3] == 390.0
+    h = a.content_hash()
+    a.set_data('screw_float_pos', 300.0)
+    assert tree.world_of(nut)[2, 3] == 300.0
+    assert nut.get_world_matrix()[2, 3] == 300.0
+    assert a.content_hash() != h
+    a.data['screw_float_pos'] = 250.0
+    a.invalidate()
+    assert tree.world_of(nut)[2, 3] == 250.0
+
+
+def test_nested_placement():
+    a = screw_assembly()
+    s = Stand(a)
+    s.finalise_calcs()
+    nut = a.floating_nut
+    assert nut.get_world_matrix()[2, 3] == 400.0
+    a.set_data('screw_float_pos', 300.0)
+    assert nut.get_world_matrix()[2, 3] == 310.0
+    s.set_data('height', 20.0)
+    assert nut.get_world_matrix()[2, 3] == 320.0
+    assert a.get_transform_tree().world_of(nut)[2, 3] == 300.0
+
+
+def test_world_matrices_match_products():
+    s = Stand(screw_assembly())
+    s.finalise_calcs()
+    nodes, world = s.get_transform_tree().world_matrices()
+    assert nodes == list(s.iter_nodes())
+    for n, w in zip(nodes, world):
+        expected = m.np.identity(4)
+        p = n
+        while p is not s:
+            expected = m.np.dot(p.get_local_transform(), expected)
+            p = p.parent
+        assert m.np.allclose(w, expected)
+    parts = list(m.iter_parts(s))
+    assert [n for n, w in parts] == [n for n in nodes if not n.children]
+
+
+def test_only_moved_subtrees_are_recomputed():
+    a = screw_assembly()
+    tree = a.get_transform_tree()
+    tree.update()
+    nut = a.floating_nut
+    before = tree.world.copy()
+    nut.set_transform(m.translation_matrix([1, 2, 3]))
+    assert not tree.stale and tree.dirty == set([tree.index[nut]])
+    assert m.np.allclose(tree.world_of(nut)[:3, 3], [1, 2, 3])
+    moved = set(range(tree.index[nut], tree.end[tree.index[nut]]))
+    for i in range(len(tree.nodes)):
+        if i not in moved:
+            assert (tree.world[i] == before[i]).all()
+    # a new node needs the tree rebuilt
+    extra = m.MetricNut({'thread_size' : 4})
+    a.add_child(extra)
+    assert tree.stale
+    assert m.np.allclose(tree.world_of(extra), m.np.identity(4))
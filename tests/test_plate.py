@@ -0,0 +1,98 @@
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+def plate(**data):
+    d = {'width' : 100.0, 'depth' : 60.0, 'height' : 6.0}
+    d.update(data)
+    p = m.GenericDrilledPlate('plate', d)
+    p.finalise_calcs()
+    return p
+
+
+def test_hole_pattern():
+    h = m.hole_pattern({'pattern' : 'grid', 'x' : 5.0, 'y' : 10.0,
+                        'nx' : 2, 'ny' : 2, 'pitch_x' : 20.0, 'dia' : 3.4})
+    assert h.shape == (4, 3)
+    assert sorted(map(tuple, h.tolist())) == \
+        [(5.0, 10.0, 3.4), (5.0, 30.0, 3.4),
+         (25.0, 10.0, 3.4), (25.0, 30.0, 3.4)]
+    h = m.hole_pattern({'pattern' : 'circular', 'x' : 50.0, 'y' : 30.0,
+                        'count' : 6, 'pcd' : 40.0, 'dia' : 5.0})
+    assert h.shape == (6, 3)
+    assert np.allclose(np.hypot(h[:, 0] - 50.0, h[:, 1] - 30.0), 20.0)
+    s = m.hole_pattern({'pattern' : 'slot', 'x' : 10.0, 'nx' : 3,
+                        'pitch_x' : 15.0, 'length' : 8.0, 'angle' : 90.0,
+                        'width' : 4.0})
+    assert s.shape == (3, 5)
+    assert s[:, 0].tolist() == [10.0, 25.0, 40.0]
+    assert s[:, 2:].tolist() == [[8.0, 90.0, 4.0]] * 3
+
+
+def test_plate_arrays():
+    p = plate(drills=[(10.0, 10.0, 3.4), (-10.0, -10.0, 3.4)],
+              hole_patterns=[{'pattern' : 'grid', 'x' : -30.0, 'y' : 20.0,
+                              'nx' : 2, 'pitch_x' : 10.0, 'dia' : 5.0},
+                             {'pattern' : 'slot', 'x' : 20.0, 'y' : 40.0,
+                              'length' : 10.0, 'width' : 4.0}])
+    holes, slots, cutouts = p.plate_arrays()
+    # negative positions are from the far edges
+    assert holes.tolist() == [[10.0, 10.0, 3.4], [90.0, 50.0, 3.4],
+                              [70.0, 20.0, 5.0], [80.0, 20.0, 5.0]]
+    assert slots.tolist() == [[20.0, 40.0, 10.0, 0.0, 4.0]]
+    assert cutouts == []
+    assert p.plate_arrays() is p.plate_arrays()
+    assert len([k for k in p.get_connectors() if k.startswith('hole_')]) == 4
+    # as given when remapping is off
+    p = plate(drills=[(-10.0, -10.0, 3.4)], remap_negative=False)
+    assert p.plate_arrays()[0].tolist() == [[-10.0, -10.0, 3.4]]
+
+
+def test_no_holes():
+    holes, slots, cutouts = plate().plate_arrays()
+    assert holes.shape == (0, 3) and slots.shape == (0, 5)
+    assert cutouts == []
+
+
+def test_holes_loop_per_diameter():
+    p = plate(drills=[(10.0, 10.0, 3.4), (20.0, 10.0, 3.4),
+                      (30.0, 10.0, 5.0)])
+    loops = p.generate_holes()
+    assert len(loops) == 2
+    assert sorted([len(l.loop_matrices) for l in loops]) == [1, 2]
+
+
+def test_slot_resolution():
+    assert m.slot_resolution(6.0, 5.0) == 1
+    for dia, tol in ((6.0, 0.01), (20.0, 0.001), (3.0, 0.1)):
+        n = m.slot_resolution(dia, tol)
+        # chords of n per quarter keep within tolerance, n - 1 don't
+        sag = lambda k: dia / 2.0 * (1 - np.cos(np.pi / 4 / k))
+        assert sag(n) <= tol < sag(n - 1)
+
+
+def test_routed_slots():
+    path = [(0.0, 0.0), (20.0, 0.0)]
+    a, b, c = m.routed_slots([path, [(0, 0), (20, 0)], [(0, 0), (0, 10)]],
+                             6.0)
+    # the same path is cut once and shared
+    assert a is b and a is not c
+    assert a[0] == a[-1]
+    pts = np.array(a)
+    assert np.allclose([pts[:, 0].min(), pts[:, 0].max()], [-3.0, 23.0])
+    assert np.allclose([pts[:, 1].min(), pts[:, 1].max()], [-3.0, 3.0])
+    # within tolerance of the true obround's area
+    x, y = pts[:, 0], pts[:, 1]
+    area = abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+    assert 0 < 20 * 6 + np.pi * 9 - area < 0.01 * 2 * (20 + np.pi * 3)
+    assert m.routed_slots([path], 6.0, 0.5)[0] is not a
+
+
+def test_routes_are_cut_out():
+    p = plate(routes=[([(10.0, 10.0), (30.0, 10.0), (30.0, -10.0)], 6.0),
+                      ([(-10.0, 10.0), (-10.0, 20.0)], 4.0)])
+    cutouts = p.plate_arrays()[2]
+    assert len(cutouts) == 2
+    xs = [min([q[0] for q in c]) for c in cutouts]
+    assert np.allclose(sorted(xs), [7.0, 88.0])
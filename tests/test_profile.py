@@ -0,0 +1,70 @@
+import StringIO
+
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+def plate():
+    p = m.GenericDrilledPlate('plate', {'width' : 100.0, 'depth' : 60.0,
+                                        'height' : 6.0,
+                                        'width_offset' : -10.0,
+                                        'drills' : [(20.0, 20.0, 5.0),
+                                                    (80.0, 40.0, 8.0)]})
+    p.finalise_calcs()
+    return p
+
+
+def dxf_pairs(text):
+    lines = text.split('\n')
+    return [(int(lines[i]), lines[i + 1]) for i in range(0, len(lines) - 1, 2)]
+
+
+def dxf_header(pairs):
+    # {variable: [group values]} from the HEADER section
+    r = {}
+    var = None
+    for code, value in pairs[pairs.index((2, 'HEADER')) + 1:]:
+        if code == 0:
+            break
+        if code == 9:
+            var = value
+            r[var] = []
+        else:
+            r[var].append(value)
+    return r
+
+
+def test_dxf_extents():
+    profile = plate().profile_2d()
+    f = StringIO.StringIO()
+    m.write_profile(profile, f, 'dxf')
+    pairs = dxf_pairs(f.getvalue())
+    sections = [pairs[i + 1][1] for i, p in enumerate(pairs)
+                if p == (0, 'SECTION')]
+    assert sections == ['HEADER', 'ENTITIES']
+    assert pairs[-1] == (0, 'EOF')
+    header = dxf_header(pairs)
+    lo, hi = m.profile_bounds(profile)
+    assert np.allclose([float(v) for v in header['$EXTMIN'][:2]], lo)
+    assert np.allclose([float(v) for v in header['$EXTMAX'][:2]], hi)
+    assert np.allclose(lo, [-10.0, 0.0]) and np.allclose(hi, [90.0, 60.0])
+    assert [v for c, v in pairs if c == 0].count('CIRCLE') == 2
+
+
+def test_svg_view_box():
+    f = StringIO.StringIO()
+    m.write_profile(plate().profile_2d(), f, 'svg')
+    assert 'viewBox="-10.000000 -60.000000 100.000000 60.000000"' \
+        in f.getvalue()
+    assert f.getvalue().count('<circle') == 2
+
+
+def test_crossing_contour():
+    profile = {'outline' : [(0, 0), (10, 10), (10, 0), (0, 10)]}
+    try:
+        m.write_profile(profile, StringIO.StringIO())
+    except ValueError:
+        pass
+    else:
+        assert False, 'crossing outline written'
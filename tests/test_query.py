@@ -0,0 +1,69 @@
+import mech_lib as m
+
+
+class Node(m.AssemblyBase):
+    def __init__(self, name, data={}, children=()):
+        m.AssemblyBase.__init__(self, name, dict(data))
+        self.parts = children
+
+    def calculate(self):
+        for c in self.parts:
+            self.add_child(c)
+        return True
+
+
+class Plate(Node):
+    pass
+
+
+def frame():
+    top = Node('top', {'colour' : (1, 0, 0), 'width' : 3},
+               [Node('side', {}, [Plate('a', {'width' : 3.0}),
+                                  Plate('b', {'colour' : (0, 0, 1)})]),
+                Node('base', {}, [Node('inner', {'colour' : (0, 1, 0)})]),
+                Plate('c', {'width' : 5})])
+    top.finalise_calcs()
+    return top
+
+
+def by_get_data(root, key, test):
+    r = []
+    for n in root.iter_nodes():
+        v = n.get_data(key)
+        if v is not None and test(v):
+            r.append(n)
+    return r
+
+
+def names(nodes):
+    return [n.name for n in nodes]
+
+
+def test_query_matches_get_data():
+    top = frame()
+    for colour in [(1, 0, 0), (0, 0, 1), (0, 1, 0), [1, 0, 0]]:
+        assert top.query(colour=colour) == \
+            by_get_data(top, 'colour', lambda v: list(v) == list(colour))
+    # inherited from above
+    assert 'a' in names(top.query(colour=(1, 0, 0)))
+    # found below, as get_data() does
+    assert names(top.query(Node, colour=(0, 1, 0))) == ['base', 'inner']
+
+
+def test_query_normalises_numbers():
+    top = frame()
+    assert names(top.query(width=3)) == names(top.query(width=3.0))
+    assert names(top.query('Plate', width=3)) == ['a', 'b']
+    assert names(top.query(width=lambda w: w > 4)) == ['c']
+    side = top.children[0]
+    assert names(side.query(width=3)) == ['side', 'a', 'b']
+
+
+def test_query_follows_changes():
+    top = frame()
+    top.get_index()
+    top.set_data('colour', (0, 0, 0))
+    assert names(top.query(colour=(1, 0, 0))) == []
+    assert 'a' in names(top.query(colour=(0, 0, 0)))
+    top.children[2].set_data('colour', (1, 0, 0))
+    assert names(top.query(colour=(1, 0, 0))) == ['c']
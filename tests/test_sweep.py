@@ -0,0 +1,68 @@
+import StringIO
+import csv
+
+import mech_lib_geometry as m
+
+
+def broken(params):
+    if params['length'] > 300.0:
+        raise ValueError('too long')
+    return m.SFU1204ScrewAssembly(params)
+
+
+def test_sweep_points():
+    assert m.sweep_points({'b' : [1, 2], 'a' : ['x']}) == \
+        [{'a' : 'x', 'b' : 1}, {'a' : 'x', 'b' : 2}]
+    assert m.sweep_points([{'a' : 1}]) == [{'a' : 1}]
+
+
+def test_sweep():
+    t = m.sweep(m.SFU1204ScrewAssembly, {'length' : [200.0, 400.0]}, jobs=1)
+    assert t['length'] == [200.0, 400.0]
+    assert t['ok'] == [True, True]
+    assert t['error'] == [None, None]
+    assert t['hash'][0] != t['hash'][1]
+    assert t['lines'][0] == t['lines'][1]
+    a = m.SFU1204ScrewAssembly({'length' : 400.0})
+    a.finalise_calcs()
+    assert t['hash'][1] == a.content_hash()
+    assert abs(t['mass'][1] - a.get_mass_properties().mass) < 1e-6
+    assert t['mass'][0] < t['mass'][1]
+
+
+def test_parallel_matches_serial():
+    grid = {'length' : [200.0, 300.0, 400.0]}
+    a = m.sweep(m.SFU1204ScrewAssembly, grid, jobs=1, mass=False)
+    b = m.sweep(m.SFU1204ScrewAssembly, grid, jobs=2, mass=False)
+    assert a['hash'] == b['hash']
+    assert a['parts'] == b['parts']
+    assert b['mass'] == [None] * 3
+
+
+def test_failed_points_are_kept():
+    t = m.sweep(broken, {'length' : [200.0, 400.0]}, jobs=1, mass=False)
+    assert t['ok'] == [True, False]
+    assert t['error'][0] is None
+    assert t['error'][1] == 'ValueError: too long'
+    assert t['hash'][1] is None
+
+
+def test_export(tmpdir):
+    m.sweep(m.SFU1204ScrewAssembly, {'length' : [200.0]}, mass=False,
+            export_dir=str(tmpdir))
+    a = m.load_archive(str(tmpdir.join('0.arc')))
+    assert a.data['length'] == 200.0
+
+
+def test_write_table_csv():
+    t = m.sweep(m.SFU1204ScrewAssembly, {'length' : [200.0, 400.0]},
+                jobs=1, mass=False)
+    f = StringIO.StringIO()
+    m.write_table_csv(t, f)
+    rows = list(csv.reader(StringIO.StringIO(f.getvalue())))
+    assert rows[0] == ['length'] + m.sweep_columns
+    assert len(rows) == 3
+    assert rows[2][0] == '400.0'
+    f = StringIO.StringIO()
+    m.write_table_csv(t, f, ['hash', 'length'])
+    assert f.getvalue().split()[1] == '%s,200.0' % t['hash'][0]
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+
+import mech_lib_geometry as m
+from test_mesh import closed
+
+
+def prism_volume(r, s, length):
+    return 0.5 * s * r * r * math.sin(2 * math.pi / s) * length
+
+
+def test_thread_mesh_closed():
+    profile = m.sfu1204_thread_profile
+    for length, s in ((8.0, 12), (9.3, 12), (0.5, 16), (40.0, 30)):
+        mesh = m.thread_mesh(4.0, profile, length, s)
+        assert closed(mesh)
+        lo, hi = mesh.vertices.min(0), mesh.vertices.max(0)
+        assert np.allclose([lo[2], hi[2]], [0.0, length])
+        assert hi[0] <= 6.0 + 1e-9
+        # between the root and the outside of the thread
+        v = mesh.volume()
+        assert prism_volume(5.0, s, length) < v < \
+            prism_volume(6.0, s, length)
+
+
+def test_flat_profile_is_a_prism():
+    mesh = m.thread_mesh(2.0, ((0.0, 3.0), (0.5, 3.0)), 7.0, 20)
+    assert closed(mesh)
+    assert abs(mesh.volume() - prism_volume(3.0, 20, 7.0)) < 1e-6
+
+
+def test_pitches_are_shared():
+    a = m.thread_mesh(4.0, m.sfu1204_thread_profile, 8.0, 12)
+    b = m.thread_mesh(4.0, m.sfu1204_thread_profile, 16.0, 12)
+    assert len(b.faces) - len(a.faces) == len(a.faces) - 2 * 12
+    assert (4.0, m.sfu1204_thread_profile, 12) in m._thread_cache
+
+
+def test_thread_lod(monkeypatch):
+    monkeypatch.setattr(m, 'thread_lod', 0)
+    plain = m.scad_render(m.sfu1204_screw(200.0))
+    assert 'polyhedron' not in plain
+    assert 'polyhedron' in m.scad_render(m.sfu1204_screw(200.0, True))
+    monkeypatch.setattr(m, 'thread_lod', 24)
+    shape = m.sfu1204_screw(200.0)
+    assert 'polyhedron' in m.scad_render(shape)
+    # thread() takes its segments from thread_lod
+    mesh = m.thread_mesh(4.0, m.sfu1204_thread_profile, 8.0, 24)
+    assert m.scad_render(m.thread(4.0, m.sfu1204_thread_profile, 8.0)) == \
+        m.scad_render(m.mesh_polyhedron(mesh))
@@ -0,0 +1,76 @@
+import StringIO
+
+import numpy as np
+
+import mech_lib_geometry as m
+
+
+def test_drill_tour_duplicate_points():
+    pts = np.array([[0, 0], [0, 0], [1, 0], [1, 0], [2, 0]], dtype=float)
+    order = m.drill_tour(pts)
+    assert sorted(order.tolist()) == range(5)
+    # coincident holes are visited together, along the row
+    assert pts[order].tolist() == sorted(pts.tolist())
+
+
+def test_drill_tour_is_permutation():
+    np.random.seed(0)
+    pts = np.random.rand(500, 2) * 100
+    pts = np.concatenate([pts, pts[:50]])
+    order = m.drill_tour(pts, (-1.0, -1.0))
+    assert sorted(order.tolist()) == range(len(pts))
+
+
+def test_drill_tour_improves_on_given_order():
+    np.random.seed(1)
+    pts = np.random.rand(300, 2) * 100
+
+    def length(p):
+        p = np.concatenate([[[0.0, 0.0]], p])
+        return np.hypot(*np.diff(p, axis=0).T).sum()
+    assert length(pts[m.drill_tour(pts)]) < length(pts) / 3
+
+
+def test_plan_toolpath_groups_by_tool():
+    holes = [[10, 10, 3], [20, 10, 5], [30, 10, 3], [10, 10, 3]]
+    plan = m.plan_toolpath(holes, [([[0, 0], [0, 50]], 6.0)])
+    kinds = [(op['kind'], op['tool']) for op in plan['ops']]
+    assert kinds == [('drill', 3.0), ('drill', 5.0), ('route', 6.0)]
+    assert len(plan['ops'][0]['points']) == 3
+    assert plan['estimate']['time'] <= plan['naive']['time']
+
+
+def test_plate_toolpath_with_pattern_over_drill():
+    p = m.GenericDrilledPlate('p', {
+        'width': 100.0, 'depth': 50.0, 'height': 5.0,
+        'drills': [[10.0, 10.0, 3.0]],
+        'hole_patterns': [{'pattern': 'grid', 'x': 10.0, 'y': 10.0,
+                           'nx': 3, 'ny': 2, 'pitch_x': 10.0,
+                           'pitch_y': 10.0, 'dia': 3.0}]})
+    p.finalise_calcs()
+    plan = p.toolpath()
+    assert len(plan['ops'][0]['points']) == 7
+
+
+def test_routes_start_from_the_nearer_end():
+    # the second path is cut backwards rather than rapid to its far end
+    plan = m.plan_toolpath([], [([[0, 0], [0, 50]], 6.0),
+                                ([[10, 0], [10, 50]], 6.0)])
+    paths = plan['ops'][0]['paths']
+    assert [p.tolist() for p in paths] == [[[0, 0], [0, 50]],
+                                           [[10, 50], [10, 0]]]
+    assert plan['estimate']['rapid'] < plan['naive']['rapid']
+
+
+def test_write_gcode():
+    plan = m.plan_toolpath([[10, 10, 3], [20, 10, 3]],
+                           [([[0, 0], [0, 50]], 6.0)], machine={'depth' : 2})
+    f = StringIO.StringIO()
+    m.write_gcode(plan, f)
+    lines = f.getvalue().split('\n')
+    assert lines[1] == 'G21 G90 G17'
+    assert [l for l in lines if l.endswith('M6')] == ['T1 M6', 'T2 M6']
+    assert 'G81 X10.000 Y10.000 Z-2.000 R5.000 F300.0' in lines
+    assert 'X20.000 Y10.000' in lines
+    assert 'G1 X0.000 Y50.000 F1000.0' in lines
+    assert lines[-3:] == ['M5', 'M30', '']
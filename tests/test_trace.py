@@ -0,0 +1,78 @@
+import StringIO
+import json
+
+import mech_lib_geometry as m
+
+
+def traced(f):
+    t = m.start_tracing()
+    try:
+        f()
+    finally:
+        assert m.stop_tracing() is t
+    return t
+
+
+def build():
+    a = m.SFU1204ScrewAssembly({'length' : 400.0})
+    a.finalise_calcs()
+    a.generate()
+    return a
+
+
+def test_set_tracer():
+    assert m.set_tracer(None) is None
+    t = m.Tracer()
+    assert m.set_tracer(t) is None
+    assert m.set_tracer(None) is t
+    # nothing recorded with no tracer set
+    t = m.start_tracing()
+    m.stop_tracing()
+    build()
+    assert t.events == [] and t.lookups == {}
+
+
+def test_events_nest():
+    t = traced(build)
+    totals = t.totals()
+    assert totals[('calculate', 'SFU1204ScrewAssembly')][0] == 1
+    # the children are generated within the top's generate()
+    assert totals[('generate', 'BK10Bearing')][0] == 1
+    for calls, total, own, most in totals.values():
+        assert 0 <= own <= total + 1e-9 and most <= total + 1e-9
+    by_node = t.totals(True)
+    assert ('generate', 'BK10') in by_node
+    assert ('generate', 'BF10') in by_node
+    # self time leaves out what was traced inside
+    t = m.Tracer()
+    outer = t.begin()
+    inner = t.begin()
+    t.end('generate', None, inner)
+    t.end('calculate', None, outer)
+    gen, calc = t.events
+    assert calc[0] == 'calculate' and gen[5] == gen[4]
+    assert abs(calc[5] - (calc[4] - gen[4])) < 1e-9
+
+
+def test_chrome_trace():
+    t = traced(build)
+    f = StringIO.StringIO()
+    t.write_chrome_trace(f)
+    d = json.loads(f.getvalue())
+    assert len(d['traceEvents']) == len(t.events)
+    e = d['traceEvents'][0]
+    assert e['ph'] == 'X' and e['dur'] >= 0 and e['ts'] >= 0
+    assert sum(d['otherData']['get_data'].values()) == \
+        sum(t.lookups.values())
+
+
+def test_summary(capsys):
+    t = traced(build)
+    capsys.readouterr()
+    m.print_trace_summary(t, top=3)
+    out = capsys.readouterr()[0].split('\n')
+    assert out[0].split() == ['what', 'class', 'calls', 'total', 'self',
+                              'max']
+    assert 'SFU1204ScrewAssembly' in ' '.join(out)
+    node_rows = out[out.index('') + 2:]
+    assert len([l for l in node_rows[:4] if l]) == 3